@@ -249,7 +249,8 @@ class MLService {
             const response = await axios.post(
                 `${ML_SERVICE_URL}/recommend-crop`,
                 params,
-                { timeout: 5000 }
+                // The ML service drops requests still queued when we stop waiting
+                { timeout: 5000, headers: { 'X-Request-Timeout-Ms': '5000' } }
             );
             return response.data;
         } catch (error) {
@@ -504,7 +505,8 @@ class MLService {
             const response = await axios.post(
                 `${ML_SERVICE_URL}/recommend-fertilizer`,
                 params,
-                { timeout: 5000 }
+                // The ML service drops requests still queued when we stop waiting
+                { timeout: 5000, headers: { 'X-Request-Timeout-Ms': '5000' } }
             );
             return response.data;
         } catch (error) {
@@ -0,0 +1,157 @@
+"""
+Admission control for the inference routes.
+
+Without it every request that reaches Flask starts scoring at once. Past
+the CPU's capacity they all slow down together, until none of them finishes
+within the caller's timeout (the backend gives up after 5 s and answers from
+its own rules). The work done for those requests is wasted.
+
+An AdmissionGate lets `concurrency` requests run and queues up to
+`max_queue` more, first come first served. Anything beyond that is refused
+at once with 429. A queued request whose deadline passes while it waits,
+or that waits longer than `max_wait`, is dropped with 503. So is a request
+that arrives after its deadline. Both answers carry a Retry-After
+estimated from the queue length and the recent time per request.
+
+Deadlines come from the request:
+  X-Request-Timeout-Ms: 5000         the caller waits this long from now
+  X-Request-Deadline: 1718000000000  the caller gives up at this Unix time (ms)
+
+Configured in app.py with ML_MAX_CONCURRENCY (0 disables it), ML_MAX_QUEUE
+and ML_MAX_QUEUE_WAIT_MS.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Rejected(Exception):
+    """A request refused by the gate: HTTP `status`, with Retry-After `retry_after` seconds."""
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('event', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+def deadline_from_headers(headers, now: float = None):
+    """time.monotonic() deadline of a request's deadline headers, or None."""
+    timeout = headers.get('X-Request-Timeout-Ms')
+    deadline = headers.get('X-Request-Deadline')
+    try:
+        if timeout is not None:
+            return (time.monotonic() if now is None else now) + float(timeout) / 1000
+        if deadline is not None:
+            remaining = float(deadline) / 1000 - time.time()
+            return (time.monotonic() if now is None else now) + remaining
+    except ValueError:
+        pass
+    return None
+
+
+class AdmissionGate:
+    """At most `concurrency` holders at a time, `max_queue` waiting in line."""
+
+    def __init__(self, concurrency: int, max_queue: int = 16, max_wait: float = 1.0):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self.running = 0
+        self.admitted = self.queued = self.rejected = self.expired = 0
+        # Moving average of how long a request holds its slot (seconds)
+        self._hold = 0.01
+
+    @property
+    def enabled(self) -> bool:
+        return self.concurrency > 0
+
+    def retry_after(self) -> int:
+        """Seconds until the queue is likely to have room (at least 1)."""
+        backlog = (len(self._waiters) + 1) * self._hold / max(self.concurrency, 1)
+        return max(1, math.ceil(backlog))
+
+    def acquire(self, deadline: float = None):
+        """Take a slot, waiting in line if need be; raises Rejected instead.
+
+        `deadline` is a time.monotonic() time after which the caller no
+        longer wants the answer.
+        """
+        now = time.monotonic()
+        if deadline is not None and deadline <= now:
+            with self._lock:
+                self.expired += 1
+            raise Rejected(503, 'Deadline already passed', self.retry_after())
+        with self._lock:
+            if self.running < self.concurrency and not self._waiters:
+                self.running += 1
+                self.admitted += 1
+                return
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise Rejected(429, 'Too many requests in flight', self.retry_after())
+            waiter = _Waiter()
+            self._waiters.append(waiter)
+            self.queued += 1
+
+        limit = now + self.max_wait
+        if deadline is not None:
+            limit = min(limit, deadline)
+        waiter.event.wait(max(0.0, limit - now))
+        with self._lock:
+            if waiter.granted:
+                self.admitted += 1
+                return
+            self._waiters.remove(waiter)
+            self.expired += 1
+            retry_after = self.retry_after()
+        raise Rejected(503, 'Timed out waiting for capacity', retry_after)
+
+    def release(self, held: float = None):
+        """Give the slot back (to the first in line, if anyone waits)."""
+        with self._lock:
+            if held is not None:
+                self._hold += 0.1 * (held - self._hold)
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.event.set()
+            else:
+                self.running -= 1
+
+    @contextmanager
+    def slot(self, deadline: float = None):
+        self.acquire(deadline)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'concurrency': self.concurrency,
+                'max_queue': self.max_queue,
+                'max_wait_ms': round(self.max_wait * 1000),
+                'running': self.running,
+                'waiting': len(self._waiters),
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'hold_ms': round(self._hold * 1000, 2),
+            }
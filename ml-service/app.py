@@ -1,108 +1,911 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, has_request_context, request, jsonify, stream_with_context
 from flask_cors import CORS
 import numpy as np
+import atexit
+import cProfile
+import hmac
 import os
-import joblib
-import pandas as pd
+import threading
+import time
+from collections import namedtuple
 from dotenv import load_dotenv
 
+from admission import AdmissionGate, Rejected, deadline_from_headers
+from batcher import CoalescingScorer
+from columnar import MSGPACK, NPY, TYPES as COLUMNAR_TYPES, PayloadError, PayloadTooLarge, UnsupportedPayload
+from columnar import classes_header, feature_matrix, input_rows, max_body_bytes, read_body, read_payload, top_k_body
+from feature_codec import CROP_FIELDS, FERTILIZER_FIELDS, FeatureCodec
+from forecast_state import ForecastStateStore, SeriesState, series_key
+from forecaster import ForecastError, forecast, forecast_many
+from metrics import Metrics
+from model_bundle import BundleError, bundle_path, load_bundle, read_manifest
+from prediction_cache import PredictionCache
+from price_ingest import BATCH_ROWS, ingest
+from profiler import ProfileStore, format_collapsed, profile_report, sample_stacks
+from response_body import ResponseFragments, batch_body, dumps
+from response_table import ResponseTable
+from scoring import XGB_THREADS, make_scorer, needs_booster, top_k_arrays
+from warmup import WARMUP_BATCHES, synthetic_rows, touch_pages
+
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
-# ── Load model artifacts at startup ──────────────────────────────────────────
+# ── Model artifacts ──────────────────────────────────────────────────────────
 MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
 
-_model = None
-_label_encoders = None
-_target_encoder = None
-_feature_names = None
+# When the models are loaded (ML_LOAD_MODE):
+#   background (default) start serving at once, load both models in a thread
+#   lazy       load each model on the first request that needs it
+#   eager      load both before the module finishes importing (pre-fork master)
+# A request for a model that is still loading waits for it.
+LOAD_MODE = os.getenv('ML_LOAD_MODE', 'background')
 
-_crop_model = None
-_crop_label_encoder = None
+# Everything needed to serve one model, built once per load and never mutated
+# (`model` is None with ML_SCORING_BACKEND=numpy, which only needs the trees)
+ServedModel = namedtuple('ServedModel', ['name', 'version', 'model', 'codec', 'scorer', 'table', 'responses'])
 
+# The models being served. Reloads build a new ServedModel next to the old one
+# and swap a new ModelSet in with one assignment; handlers read `_models` once
+# per request, so a request in flight finishes on the version it started with.
+ModelSet = namedtuple('ModelSet', ['fertilizer', 'crop'])
+_models = ModelSet(fertilizer=None, crop=None)
+_swap_lock = threading.Lock()
 
-def load_artifacts():
-    global _model, _label_encoders, _target_encoder, _feature_names
-    global _crop_model, _crop_label_encoder
-
-    # Fertilizer model artifacts
-    model_path   = os.path.join(MODELS_DIR, 'fertilizer_model.pkl')
-    enc_path     = os.path.join(MODELS_DIR, 'label_encoders.pkl')
-    target_path  = os.path.join(MODELS_DIR, 'target_encoder.pkl')
-    feature_path = os.path.join(MODELS_DIR, 'feature_names.pkl')
-
-    if all(os.path.exists(p) for p in [model_path, enc_path, target_path, feature_path]):
-        _model          = joblib.load(model_path)
-        _label_encoders = joblib.load(enc_path)
-        _target_encoder = joblib.load(target_path)
-        _feature_names  = joblib.load(feature_path)
-        print("[ML] Fertilizer model loaded successfully.")
+# Per model: not_loaded → loading → ready | missing | failed
+_load_state = {'fertilizer': 'not_loaded', 'crop': 'not_loaded'}
+_load_seconds = {'fertilizer': None, 'crop': None}
+_warmup_seconds = {'fertilizer': None, 'crop': None, 'forecaster': None}
+_started_at = time.time()
+
+# Run every model through its scoring paths with synthetic batches before it
+# is installed, and the forecaster once at startup (warmup.py); 0 scores a
+# single row. Readiness (/health/ready) waits for it.
+WARMUP = os.getenv('ML_WARMUP', '1') != '0'
+_load_locks = {'fertilizer': threading.Lock(), 'crop': threading.Lock()}
+
+# Seconds between checks of models/ for retrained bundles (0 disables; a
+# reload can always be requested with POST /admin/reload)
+RELOAD_POLL = float(os.getenv('ML_RELOAD_POLL', 0))
+_reload_lock = threading.Lock()
+
+# Required in the X-Admin-Token header of /admin/* requests; when unset those
+# endpoints only answer requests from this machine that no proxy forwarded.
+# ML_ADMIN_LOCAL=0 refuses local requests too, for a proxy that doesn't add
+# forwarding headers.
+ADMIN_TOKEN = os.getenv('ML_ADMIN_TOKEN')
+ADMIN_LOCAL = os.getenv('ML_ADMIN_LOCAL', '1') != '0'
+# Headers a reverse proxy adds: a request carrying one came from elsewhere
+FORWARDED_HEADERS = ('Forwarded', 'X-Forwarded-For', 'X-Forwarded-Host', 'X-Real-IP')
+
+# Top-3 answers per encoded input row. ML_CACHE_SIZE=0 disables it;
+# ML_CACHE_QUANTUM > 0 rounds numeric inputs so near-identical readings share
+# an entry; ML_CACHE_SNAPSHOT names a file to persist the cache across restarts.
+_cache = PredictionCache(
+    maxsize=int(os.getenv('ML_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('ML_CACHE_TTL', 600)),
+    quantum=float(os.getenv('ML_CACHE_QUANTUM', 0)),
+)
+CACHE_SNAPSHOT = os.getenv('ML_CACHE_SNAPSHOT')
+
+# Precomputed fertilizer answers for on-grid inputs (build_fertilizer_table.py);
+# set ML_FERTILIZER_TABLE to an empty string to always ask the model.
+FERTILIZER_TABLE = os.getenv('ML_FERTILIZER_TABLE', os.path.join(MODELS_DIR, 'fertilizer_table'))
+
+# Micro-batching of concurrent model calls (batcher.py); 0 ms disables it
+COALESCE_WAIT_MS = float(os.getenv('ML_COALESCE_WAIT_MS', 0))
+COALESCE_MAX_ROWS = int(os.getenv('ML_COALESCE_MAX_ROWS', 256))
+
+# Upper bound on rows accepted by the /batch endpoints in one request
+MAX_BATCH_ROWS = int(os.getenv('ML_MAX_BATCH_ROWS', 10000))
+# ... and by the /batch endpoints in one columnar binary body (columnar.py)
+MAX_BINARY_ROWS = int(os.getenv('ML_MAX_BINARY_ROWS', 1_000_000))
+
+# Admission control for the inference routes (admission.py): at most
+# ML_MAX_CONCURRENCY of them run at once (default: CPUs / ML_XGB_THREADS,
+# doubled and at least 2 with micro-batching on, so the coalescer has
+# concurrent calls to batch; 0 disables it), ML_MAX_QUEUE more wait up to
+# ML_MAX_QUEUE_WAIT_MS for a slot, and the rest get 429 with Retry-After
+_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+_concurrency = max(1, _cpus // XGB_THREADS)
+if COALESCE_WAIT_MS > 0:
+    _concurrency = max(2, 2 * _concurrency)
+_admission = AdmissionGate(
+    concurrency=int(os.getenv('ML_MAX_CONCURRENCY', _concurrency)),
+    max_queue=int(os.getenv('ML_MAX_QUEUE', 16)),
+    max_wait=float(os.getenv('ML_MAX_QUEUE_WAIT_MS', 1000)) / 1000,
+)
+INFERENCE_ENDPOINTS = {
+    'recommend_fertilizer', 'recommend_fertilizer_batch', 'recommend_crop', 'recommend_crop_batch',
+    'predict_price', 'predict_price_batch',
+}
+
+# Worker processes /predict/batch spreads a request of at least
+# ML_FORECAST_POOL_MIN_SERIES series over (forecaster.py); 0 forecasts in the
+# request thread
+FORECAST_PROCESSES = int(os.getenv('ML_FORECAST_PROCESSES', 0))
+FORECAST_POOL_MIN_SERIES = int(os.getenv('ML_FORECAST_POOL_MIN_SERIES', 2000))
+
+# Incremental forecasting state per crop:location series (forecast_state.py):
+# /predict then only processes the days it hasn't seen. ML_FORECAST_STATE_SIZE
+# series at most (0 disables it); ML_FORECAST_STATE_CHECKPOINT names a file the
+# state is written to every ML_FORECAST_STATE_CHECKPOINT_SECONDS and at exit.
+_forecast_state = ForecastStateStore(maxsize=int(os.getenv('ML_FORECAST_STATE_SIZE', 0)))
+FORECAST_STATE_CHECKPOINT = os.getenv('ML_FORECAST_STATE_CHECKPOINT')
+FORECAST_STATE_CHECKPOINT_SECONDS = float(os.getenv('ML_FORECAST_STATE_CHECKPOINT_SECONDS', 300))
+
+# Worker processes serving the app (set by gunicorn.conf.py). Each has its own
+# forecast state, so /ingest/prices refuses to run under more than one: a
+# stream would only update the worker that happened to receive it.
+WORKERS = int(os.getenv('ML_WORKERS', 1))
+
+# Leave the static category lists out of recommendation responses by default
+# (clients fetch them from /<route>/metadata); `?lean=0|1` overrides per request
+LEAN_RESPONSES = os.getenv('ML_LEAN_RESPONSES', '0') == '1'
+
+# Served in Prometheus text format at /metrics (metrics.py)
+_metrics = Metrics()
+_metrics.describe('ml_requests_total', 'counter', 'Requests handled, by route, method and status')
+_metrics.describe('ml_request_errors_total', 'counter', 'Requests answered with a 5xx status, by route')
+_metrics.describe('ml_requests_in_flight', 'gauge', 'Requests being handled, by route')
+_metrics.describe('ml_request_seconds', 'histogram', 'Time to handle a request, by route')
+_metrics.describe('ml_stage_seconds', 'histogram',
+                  'Time per request stage (parse, state, encode, predict, topk, decode, serialize), by route')
+_metrics.describe('ml_ingested_rows_total', 'counter',
+                  'Price rows received by /ingest/prices, by outcome (accepted, stale, rejected)')
+_metrics.describe('ml_admission_total', 'counter',
+                  'Inference requests by admission outcome (admitted, rejected, expired), by route')
+_metrics.describe('ml_predictions_total', 'counter',
+                  'Rows answered, by model and source (table, cache or model)')
+
+# Profiling (profiler.py): idents of the threads handling a request, which
+# /admin/profile samples; reports of requests sent with an X-Profile header
+_request_threads = set()
+_profiles = ProfileStore()
+_profile_lock = threading.Lock()
+PROFILE_MAX_SECONDS = 60
+
+
+def load_fertilizer(path: str) -> ServedModel:
+    bundle = load_bundle(path, booster=needs_booster())
+    codec = FeatureCodec.from_bundle(FERTILIZER_FIELDS, bundle)
+    return ServedModel(
+        name='fertilizer',
+        version=bundle.version,
+        model=bundle.model,
+        codec=codec,
+        scorer=coalesce(make_scorer(bundle.model, ensemble=bundle.ensemble), 'fertilizer'),
+        table=load_table(bundle.version),
+        responses=response_fragments('fertilizer', codec, bundle.version),
+    )
+
+
+def load_crop(path: str) -> ServedModel:
+    bundle = load_bundle(path, booster=needs_booster())
+    codec = FeatureCodec.from_bundle(CROP_FIELDS, bundle)
+    return ServedModel(
+        name='crop',
+        version=bundle.version,
+        model=bundle.model,
+        codec=codec,
+        scorer=coalesce(make_scorer(bundle.model, ensemble=bundle.ensemble), 'crop'),
+        table=None,
+        responses=response_fragments('crop', codec, bundle.version),
+    )
+
+
+def response_fragments(name: str, codec: FeatureCodec, version: str, encode=None) -> ResponseFragments:
+    """The precomputed parts of model `name`'s responses (response_body.py)."""
+    if name == 'fertilizer':
+        return ResponseFragments('fertilizer', codec.classes.tolist(), {
+            'available_soil_types': codec.categories['Soil Type'].tolist(),
+            'available_crop_types': codec.categories['Crop Type'].tolist(),
+        }, version, encode)
+    return ResponseFragments('crop', [str(c).capitalize() for c in codec.classes.tolist()], {}, version, encode)
+
+
+LOADERS = {'fertilizer': load_fertilizer, 'crop': load_crop}
+MODEL_TITLES = {'fertilizer': 'Fertilizer', 'crop': 'Crop Recommendation'}
+TRAIN_SCRIPTS = {'fertilizer': 'train_model.py', 'crop': 'train_crop_model.py'}
+
+
+def warm(served: ServedModel, batches=WARMUP_BATCHES):
+    """Get a freshly loaded model ready for traffic, then warm the prediction
+    cache from the snapshot.
+
+    With ML_WARMUP on, page in its memory-mapped arrays and run synthetic
+    batches of each size through every path a request can take: scoring,
+    top-3, the response table, JSON bodies and binary answers. Nothing is
+    cached or counted. Otherwise only one default row is scored.
+    """
+    start = time.perf_counter()
+    # The scorer under a CoalescingScorer, so the warm-up stays out of its stats
+    scorer = getattr(served.scorer, 'scorer', served.scorer)
+    if not WARMUP:
+        scorer.predict_proba(served.codec.encode({}))
     else:
-        print("[ML] WARNING: Fertilizer model files not found. Run train_model.py first.")
+        ensemble = getattr(scorer, 'ensemble', None)
+        touch_pages(*(getattr(ensemble, name) for name in ensemble.ARRAYS) if ensemble is not None else ())
+        if served.table is not None:
+            touch_pages(served.table.top3, served.table.conf)
+        X = synthetic_rows(served.codec, max(batches))
+        for n in batches:
+            rows = X[:n]
+            served.codec.encode_rows(input_rows(served.codec, rows))
+            proba = scorer.predict_proba(rows)
+            idx, conf = top_k(proba)
+            if served.table is not None:
+                served.table.lookup(rows)
+            if served.name == 'fertilizer':
+                bodies = [fertilizer_result(served, d, i, c) for d, i, c in zip(input_rows(served.codec, rows), idx, conf)]
+            else:
+                bodies = [crop_result(served, r, i, c) for r, i, c in zip(rows.tolist(), idx, conf)]
+            batch_body(bodies)
+            idx, top = top_k_arrays(proba)
+            top_k_body(NPY, idx, np.round(top, 1), served.responses.labels)
+    _warmup_seconds[served.name] = round(time.perf_counter() - start, 3)
+    warm_cache(f'{served.name}:{served.version}')
+
+
+def warm_forecaster():
+    """Forecast synthetic series once, one by one, as a panel and from
+    incremental state, so /predict's first call doesn't pay for it."""
+    if not WARMUP:
+        return
+    start = time.perf_counter()
+    first = np.datetime64('today') - 400
+    rng = np.random.default_rng(0)
+    series = []
+    for n in (30, 120, 400):
+        prices = 50 + np.cumsum(rng.normal(0, 1, n))
+        series.append(([{'date': str(first + i), 'price': float(p)} for i, p in enumerate(prices)], 7, None))
+    forecast(series[-1][0], 7)
+    forecast_many(series)
+    state = SeriesState.from_daily(int(first.astype(np.int64)), 50 + rng.normal(0, 1, 400))
+    state.forecast(7)
+    _warmup_seconds['forecaster'] = round(time.perf_counter() - start, 3)
 
-    # Crop model artifacts
-    crop_model_path = os.path.join(MODELS_DIR, 'crop_model.pkl')
-    crop_enc_path   = os.path.join(MODELS_DIR, 'crop_label_encoder.pkl')
 
-    if os.path.exists(crop_model_path) and os.path.exists(crop_enc_path):
-        _crop_model = joblib.load(crop_model_path)
-        _crop_label_encoder = joblib.load(crop_enc_path)
-        print("[ML] Crop Recommendation model loaded successfully.")
+def warm_up():
+    """Warm every loaded model and the forecaster again, e.g. in a freshly
+    forked worker whose thread pools don't exist yet."""
+    for served in _models:
+        if served is not None:
+            warm(served)
+    warm_forecaster()
+
+
+def readiness() -> dict:
+    """Whether the service should get traffic: every model loaded and warmed
+    (in ML_LOAD_MODE=lazy, not loaded yet is fine) and the forecaster warmed."""
+    models = _models
+    states = {
+        name: {
+            'status': _load_state[name],
+            'version': served.version if served is not None else None,
+            'load_seconds': _load_seconds[name],
+            'warmup_seconds': _warmup_seconds[name],
+        }
+        for name, served in models._asdict().items()
+    }
+    waiting = ('not_loaded', 'loading') if LOAD_MODE != 'lazy' else ('loading',)
+    if any(s['status'] in ('missing', 'failed') for s in states.values()):
+        status = 'unavailable'
+    elif any(s['status'] in waiting for s in states.values()):
+        status = 'starting'
+    elif WARMUP and LOAD_MODE != 'lazy' and _warmup_seconds['forecaster'] is None:
+        status = 'warming'
     else:
-        print("[ML] WARNING: Crop model files not found. Run train_crop_model.py first.")
+        status = 'ready'
+    return {
+        'ready': status == 'ready',
+        'status': status,
+        'models': states,
+        'forecaster': {'warmup_seconds': _warmup_seconds['forecaster']},
+    }
+
+
+def install(served: ServedModel):
+    """Swap `served` into the model set in place of the model of the same name."""
+    global _models
+    with _swap_lock:
+        previous = getattr(_models, served.name)
+        _models = _models._replace(**{served.name: served})
+    # Requests still holding the old model score directly once its queue is closed
+    if previous is not None and isinstance(previous.scorer, CoalescingScorer):
+        previous.scorer.close()
+
+
+def _load(name: str) -> bool:
+    """Load, warm and install model `name` from its bundle. Caller holds its
+    lock. On failure the model already being served (if any) stays."""
+    serving = getattr(_models, name) is not None
+    path = bundle_path(MODELS_DIR, name)
+    if not os.path.isdir(path):
+        print(f"[ML] WARNING: {MODEL_TITLES[name]} model bundle not found. Run {TRAIN_SCRIPTS[name]} "
+              "(or convert_models.py for old .pkl files) first.")
+        if not serving:
+            _load_state[name] = 'missing'
+        return False
+
+    if not serving:
+        _load_state[name] = 'loading'
+    start = time.perf_counter()
+    try:
+        served = LOADERS[name](path)
+        warm(served)
+    except Exception as e:
+        print(f"[ML] ERROR: {MODEL_TITLES[name]} model failed to load: {e}")
+        if not serving:
+            _load_state[name] = 'failed'
+        return False
+    install(served)
+    _load_seconds[name] = round(time.perf_counter() - start, 3)
+    _load_state[name] = 'ready'
+    print(f"[ML] {MODEL_TITLES[name]} model {served.version} loaded successfully "
+          f"({_load_seconds[name]:.2f}s).")
+    return True
+
+
+def ensure_loaded(name: str):
+    """The served model `name`, loading it first if nothing has tried yet
+    (waiting if another thread is loading it); None when it's unavailable."""
+    served = getattr(_models, name)
+    if served is None:
+        with _load_locks[name]:
+            if _load_state[name] == 'not_loaded':
+                _load(name)
+        served = getattr(_models, name)
+    return served
+
+
+def load_artifacts():
+    """(Re)load every model now."""
+    _cache.clear()
+    for name in LOADERS:
+        with _load_locks[name]:
+            _load(name)
+    return any(_models)
+
+
+def bundle_version(name: str):
+    """Version of the bundle currently on disk for model `name`, or None."""
+    try:
+        return read_manifest(bundle_path(MODELS_DIR, name))['version']
+    except (BundleError, OSError, ValueError):
+        return None
+
+
+def reload_models(force: bool = False) -> dict:
+    """Reload every model whose bundle on disk differs from the one being
+    served (all of them with `force`). Returns {name: outcome}."""
+    outcome = {}
+    with _reload_lock:
+        for name in LOADERS:
+            with _load_locks[name]:
+                served = getattr(_models, name)
+                if served is None and _load_state[name] == 'not_loaded':
+                    outcome[name] = 'not_loaded'   # its first use loads the new bundle anyway
+                elif not force and served is not None and bundle_version(name) == served.version:
+                    outcome[name] = 'unchanged'
+                else:
+                    outcome[name] = 'reloaded' if _load(name) else 'failed'
+    return outcome
+
+
+def _watch_models():
+    while True:
+        time.sleep(RELOAD_POLL)
+        if any(served is not None and bundle_version(served.name) not in (None, served.version)
+               for served in _models):
+            reload_models()
+
+
+def _start_watcher():
+    if RELOAD_POLL > 0:
+        threading.Thread(target=_watch_models, name='model-watcher', daemon=True).start()
+
+
+def _load_in_background():
+    for name in LOADERS:
+        ensure_loaded(name)
+    warm_forecaster()
+
+
+def coalesce(scorer, name: str):
+    """Put a micro-batching queue in front of `scorer` when enabled."""
+    if COALESCE_WAIT_MS <= 0:
+        return scorer
+    return CoalescingScorer(scorer, COALESCE_WAIT_MS, COALESCE_MAX_ROWS, name)
+
 
-    return _model is not None or _crop_model is not None
+def load_table(model_version: str):
+    """The fertilizer response table, if one was built for this model version."""
+    if not FERTILIZER_TABLE or not os.path.isdir(FERTILIZER_TABLE):
+        return None
+    table = ResponseTable.load(FERTILIZER_TABLE)
+    if table.model_version != model_version:
+        print("[ML] WARNING: Fertilizer table is stale (built for another model). "
+              "Run build_fertilizer_table.py.")
+        return None
+    print(f"[ML] Fertilizer table loaded ({table.n_cells:,} cells).")
+    return table
 
 
-load_artifacts()
+def warm_cache(namespace: str):
+    """Warm the prediction cache with one model's entries from the snapshot."""
+    if CACHE_SNAPSHOT and _cache.enabled:
+        warmed = _cache.load(CACHE_SNAPSHOT, [namespace])
+        print(f"[ML] Prediction cache warmed with {warmed} {namespace.split(':')[0]} entries "
+              f"from {CACHE_SNAPSHOT}.")
+
+
+def save_cache_snapshot():
+    # Skip empty caches so a process that never served (e.g. a pre-fork
+    # master) doesn't overwrite the snapshot its workers wrote.
+    if CACHE_SNAPSHOT and len(_cache):
+        _cache.save(CACHE_SNAPSHOT)
+
+
+def load_forecast_state():
+    if FORECAST_STATE_CHECKPOINT and _forecast_state.enabled:
+        try:
+            loaded = _forecast_state.load(FORECAST_STATE_CHECKPOINT)
+        except (OSError, ValueError) as e:
+            print(f"[ML] WARNING: Forecast state not loaded: {e}")
+            return
+        print(f"[ML] Forecast state loaded for {loaded} series from {FORECAST_STATE_CHECKPOINT}.")
+
+
+def save_forecast_state():
+    # Like the cache snapshot: a process that never forecast leaves the file
+    # alone. Workers merge their series into the same file (forecast_state.py).
+    if FORECAST_STATE_CHECKPOINT and _forecast_state.dirty:
+        try:
+            _forecast_state.save(FORECAST_STATE_CHECKPOINT)
+        except (OSError, ValueError) as e:
+            print(f"[ML] WARNING: Could not checkpoint forecast state: {e}")
+
+
+def _checkpoint_forecast_state():
+    while True:
+        time.sleep(FORECAST_STATE_CHECKPOINT_SECONDS)
+        save_forecast_state()
+
+
+def _start_checkpointer():
+    if FORECAST_STATE_CHECKPOINT and _forecast_state.enabled and FORECAST_STATE_CHECKPOINT_SECONDS > 0:
+        threading.Thread(target=_checkpoint_forecast_state, name='forecast-checkpointer', daemon=True).start()
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
-def encode_input(data: dict) -> np.ndarray:
-    """Encode raw input dict → numpy array matching training feature order."""
-    soil_type = data.get('soilType', 'Sandy')
-    crop_type = data.get('cropType', 'Maize')
-
-    soil_le = _label_encoders['Soil Type']
-    crop_le = _label_encoders['Crop Type']
-
-    # Handle unseen labels gracefully
-    if soil_type not in soil_le.classes_:
-        soil_type = soil_le.classes_[0]
-    if crop_type not in crop_le.classes_:
-        crop_type = crop_le.classes_[0]
-
-    soil_enc = int(soil_le.transform([soil_type])[0])
-    crop_enc = int(crop_le.transform([crop_type])[0])
-
-    row = [
-        float(data.get('temperature', 28)),
-        float(data.get('humidity', 55)),
-        float(data.get('moisture', 45)),
-        float(data.get('nitrogen', 20)),
-        float(data.get('potassium', 10)),
-        float(data.get('phosphorous', 15)),
-        soil_enc,
-        crop_enc,
-    ]
-    return np.array([row])
+def route_label() -> str:
+    """Route template of the current request (bounded label cardinality)."""
+    if not has_request_context():
+        return 'none'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def stage(name: str):
+    """Time one step of handling the current request into ml_stage_seconds."""
+    return _metrics.timer('ml_stage_seconds', (('route', route_label()), ('stage', name)))
+
+
+def top_k(proba: np.ndarray, k: int = 3):
+    """Row-wise top-k of a (n, n_classes) probability matrix.
+
+    Returns (indices, confidences) as (n, k) arrays; confidences are
+    percentages rounded to one decimal, exactly as the single-row routes did.
+    """
+    idx, top = top_k_arrays(proba, k)
+    conf = [[round(v, 1) for v in row] for row in top.tolist()]
+    return idx, conf
+
+
+def predict_top3(X: np.ndarray, served: ServedModel, use_table: bool = True):
+    """Top-3 (indices, confidences) per row of X.
+
+    Rows on the model's response table grid are looked up there; the rest
+    are answered from the prediction cache where possible, and only cache
+    misses reach the model.
+    """
+    if use_table and served.table is not None:
+        hit, table_idx, table_conf = served.table.lookup(X)
+        _metrics.inc('ml_predictions_total', (('model', served.name), ('source', 'table')), len(table_idx))
+        if hit.all():
+            return table_idx, table_conf
+        if hit.any():
+            idx, conf = predict_top3(X[~hit], served, use_table=False)
+            return _merge(hit, (table_idx, table_conf), (idx, conf))
+
+    if not _cache.enabled:
+        return score_top3(X, served)
+
+    X = _cache.quantize(X, served.codec.numeric_mask)
+    keys = _cache.keys(f'{served.name}:{served.version}', X)
+    results = [_cache.get(key) for key in keys]
+    missing = [i for i, hit in enumerate(results) if hit is None]
+    _metrics.inc('ml_predictions_total', (('model', served.name), ('source', 'cache')), len(X) - len(missing))
+    if missing:
+        idx, conf = score_top3(X[missing], served)
+        for i, row_idx, row_conf in zip(missing, idx.tolist(), conf):
+            results[i] = [row_idx, row_conf]
+            _cache.put(keys[i], results[i])
+    return [r[0] for r in results], [r[1] for r in results]
+
+
+def score_top3(X: np.ndarray, served: ServedModel):
+    """Top-3 (indices, confidences) per row of X straight from the model."""
+    with stage('predict'):
+        proba = served.scorer.predict_proba(X)
+    _metrics.inc('ml_predictions_total', (('model', served.name), ('source', 'model')), len(X))
+    with stage('topk'):
+        return top_k(proba)
+
+
+def _merge(mask, when_true, when_false):
+    """Interleave two (idx, conf) row lists back into input order."""
+    true_rows, false_rows = zip(*when_true), zip(*when_false)
+    rows = [next(true_rows) if m else next(false_rows) for m in mask]
+    return [r[0] for r in rows], [r[1] for r in rows]
+
+
+def fertilizer_result(served: ServedModel, data: dict, idx, conf, lean: bool = False) -> bytes:
+    """Response body of /recommend-fertilizer for one input row, as JSON bytes."""
+    echo = dumps({
+        'soilType': data.get('soilType'),
+        'cropType': data.get('cropType'),
+        'nitrogen': data.get('nitrogen'),
+        'phosphorous': data.get('phosphorous'),
+        'potassium': data.get('potassium'),
+    })
+    return served.responses.body(echo, served.responses.recommendations(idx, conf), lean)
+
+
+def crop_result(served: ServedModel, row, idx, conf, lean: bool = False) -> bytes:
+    """Response body of /recommend-crop for one feature row, as JSON bytes."""
+    echo = dumps({f.key: value for f, value in zip(served.codec.fields, row)})
+    return served.responses.body(echo, served.responses.recommendations(idx, conf), lean)
+
+
+def lean_response() -> bool:
+    """Whether this request gets a lean body (`?lean=1`, default ML_LEAN_RESPONSES)."""
+    lean = request.args.get('lean')
+    return LEAN_RESPONSES if lean is None else lean in ('1', 'true')
+
+
+def json_response(body: bytes) -> Response:
+    return Response(body, mimetype='application/json')
+
+
+def price_result(data, result) -> dict:
+    """/predict response for request body `data` and its forecast() result."""
+    first = result['predictions'][0]
+    return {
+        'crop': data.get('crop'),
+        'location': data.get('location'),
+        'predicted_price': first['predicted_price'],
+        'confidence': first['confidence'],
+        **result,
+    }
+
+
+def batch_items(data):
+    """Pull the list of row dicts out of a batch body (`{"inputs": [...]}` or a bare list).
+
+    Returns (items, error_response) — exactly one of them is None.
+    """
+    items = data.get('inputs') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({'error': 'Body must contain a non-empty "inputs" list'}), 400)
+    if len(items) > MAX_BATCH_ROWS:
+        return None, (jsonify({
+            'error': f'Batch too large: {len(items)} rows (max {MAX_BATCH_ROWS})'
+        }), 413)
+    if not all(isinstance(d, dict) for d in items):
+        return None, (jsonify({'error': 'Every input must be a JSON object'}), 400)
+    return items, None
+
+
+def columnar_batch(served: ServedModel, results):
+    """Answer a /batch request whose body is a columnar binary payload (columnar.py).
+
+    The rows skip the response table and the cache and go to the model in
+    one call. The answer is JSON, built by results(X, idx, conf) as for JSON
+    bodies, unless the Accept header asks for .npy or msgpack. A body longer
+    than MAX_BINARY_ROWS rows can be gets 413 before it is read.
+    """
+    try:
+        with stage('parse'):
+            limit = max_body_bytes(MAX_BINARY_ROWS, len(served.codec.fields))
+            body = read_body(request.stream, limit, request.content_length)
+            names, M = read_payload(request.mimetype, body, request.headers.get('X-Features'))
+            if len(M) > MAX_BINARY_ROWS:
+                return jsonify({'error': f'Batch too large: {len(M)} rows (max {MAX_BINARY_ROWS})'}), 413
+            if not len(M):
+                return jsonify({'error': 'Body must contain at least one row'}), 400
+        with stage('encode'):
+            X = feature_matrix(served.codec, names, M)
+    except UnsupportedPayload as e:
+        return jsonify({'error': str(e)}), 415
+    except PayloadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except PayloadError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with stage('predict'):
+        proba = served.scorer.predict_proba(X)
+    _metrics.inc('ml_predictions_total', (('model', served.name), ('source', 'model')), len(X))
+    answer = request.accept_mimetypes.best_match(('application/json', NPY) + MSGPACK, 'application/json')
+    with stage('topk'):
+        if answer == 'application/json':
+            idx, conf = top_k(proba)
+        else:
+            idx, top = top_k_arrays(proba)
+            conf = np.round(top, 1)
+
+    if answer == 'application/json':
+        with stage('decode'):
+            bodies = results(X, idx, conf)
+        with stage('serialize'):
+            return json_response(batch_body(bodies))
+    labels = served.responses.labels
+    try:
+        with stage('serialize'):
+            body = top_k_body(answer, idx, conf, labels)
+    except UnsupportedPayload as e:
+        return jsonify({'error': str(e)}), 406
+    return Response(body, mimetype=answer, headers={'X-Classes': classes_header(labels)})
+
+
+def admin_denied():
+    """Error response for an unauthorized /admin request, else None."""
+    if ADMIN_TOKEN:
+        if hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return None
+    elif (ADMIN_LOCAL and request.remote_addr in ('127.0.0.1', '::1')
+          and not any(header in request.headers for header in FORWARDED_HEADERS)):
+        return None
+    return jsonify({'error': 'Forbidden'}), 403
+
+
+# ── Request metrics ──────────────────────────────────────────────────────────
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = route = route_label()
+    g.metrics_start = time.perf_counter()
+    _metrics.inc('ml_requests_in_flight', (('route', route),))
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = g.get('metrics_route')
+    if route is not None:
+        labels = (('route', route),)
+        _metrics.observe('ml_request_seconds', labels, time.perf_counter() - g.metrics_start)
+        status = (('method', request.method), ('status', str(response.status_code)))
+        _metrics.inc('ml_requests_total', labels + status)
+        if response.status_code >= 500:
+            _metrics.inc('ml_request_errors_total', labels)
+    return response
+
+
+@app.teardown_request
+def end_request_metrics(_exc):
+    route = g.pop('metrics_route', None)
+    if route is not None:
+        _metrics.inc('ml_requests_in_flight', (('route', route),), -1)
+
+
+# ── Admission control ────────────────────────────────────────────────────────
+
+@app.before_request
+def admit_request():
+    if request.endpoint not in INFERENCE_ENDPOINTS or not _admission.enabled:
+        return None
+    labels = (('route', g.get('metrics_route') or route_label()),)
+    try:
+        _admission.acquire(deadline_from_headers(request.headers))
+    except Rejected as e:
+        outcome = 'rejected' if e.status == 429 else 'expired'
+        _metrics.inc('ml_admission_total', labels + (('outcome', outcome),))
+        response = jsonify({'error': e.reason, 'retry_after': e.retry_after})
+        response.status_code = e.status
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    _metrics.inc('ml_admission_total', labels + (('outcome', 'admitted'),))
+    g.admitted_at = time.monotonic()
+    return None
+
+
+@app.teardown_request
+def release_admission(_exc):
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is not None:
+        _admission.release(time.monotonic() - admitted_at)
+
+
+# ── Profiling ────────────────────────────────────────────────────────────────
+
+@app.before_request
+def start_request_profile():
+    _request_threads.add(threading.get_ident())
+    if 'X-Profile' in request.headers and admin_denied() is None:
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:   # another profiler is active in this thread
+            return
+        g.profile = profile
+
+
+@app.after_request
+def finish_request_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+        response.headers['X-Profile-Id'] = _profiles.add(profile_report(profile))
+    return response
+
+
+@app.teardown_request
+def untrack_request_thread(_exc):
+    _request_threads.discard(threading.get_ident())
 
 
 # ── Routes ───────────────────────────────────────────────────────────────────
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    model_ready = _model is not None
+    models = _models
     return jsonify({
         'status': 'healthy',
+        'ready': readiness()['ready'],
         'service': 'ml-service',
-        'model_loaded': model_ready,
-        'model': 'XGBoost Fertilizer Recommender'
+        'model_loaded': models.fertilizer is not None,
+        'scoring_backend': models.fertilizer.scorer.backend if models.fertilizer is not None else None,
+        'model': 'XGBoost Fertilizer Recommender',
+        'load_mode': LOAD_MODE,
+        'models': {
+            name: {
+                'status': _load_state[name],
+                'version': served.version if served is not None else None,
+                'load_seconds': _load_seconds[name],
+            }
+            for name, served in models._asdict().items()
+        },
+    })
+
+
+@app.route('/health/live', methods=['GET'])
+def liveness():
+    """GET /health/live — 200 while the process can answer at all, with the
+    versions being served (None until a model loads)."""
+    return jsonify({
+        'status': 'alive',
+        'uptime_seconds': round(time.time() - _started_at, 1),
+        'models': {name: served.version if served is not None else None
+                   for name, served in _models._asdict().items()},
     })
 
 
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """GET /health/ready — 200 once every model is loaded and warmed up,
+    503 before (status starting or warming) or when one can't be loaded
+    (unavailable)."""
+    state = readiness()
+    return jsonify(state), 200 if state['ready'] else 503
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters of the prediction cache."""
+    return jsonify(_cache.stats())
+
+
+@app.route('/forecast-state/stats', methods=['GET'])
+def forecast_state_stats():
+    """Series held, hits, evictions and days added of the incremental forecast state."""
+    return jsonify(_forecast_state.stats())
+
+
+@app.route('/admission/stats', methods=['GET'])
+def admission_stats():
+    """Slots, queue and admission counters of the inference routes."""
+    return jsonify(_admission.stats())
+
+
+@app.route('/coalescer/stats', methods=['GET'])
+def coalescer_stats():
+    """Batch-size histograms of the micro-batching queues (empty when disabled)."""
+    return jsonify({
+        served.name: served.scorer.stats()
+        for served in _models
+        if served is not None and isinstance(served.scorer, CoalescingScorer)
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request, stage and prediction metrics in the Prometheus text format."""
+    lines = ['# HELP ml_model_info Model version being served', '# TYPE ml_model_info gauge']
+    lines += [f'ml_model_info{{model="{served.name}",version="{served.version}"}} 1'
+              for served in _models if served is not None]
+    return Response(_metrics.render() + '\n'.join(lines) + '\n',
+                    mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    POST /admin/reload[?force=1][&wait=1]
+
+    Reloads every model whose bundle in models/ changed (all of them with
+    force=1). The new models are loaded and warmed next to the ones being
+    served and swapped in atomically. Returns 202 at once, or with wait=1 the
+    outcome per model once the reload is done.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    force = request.args.get('force') == '1'
+    if request.args.get('wait') == '1':
+        return jsonify({'success': True, 'models': reload_models(force)})
+    if _reload_lock.locked():
+        return jsonify({'error': 'A reload is already running'}), 409
+    threading.Thread(target=reload_models, args=(force,), name='model-reload', daemon=True).start()
+    return jsonify({'success': True, 'status': 'reloading'}), 202
+
+
+@app.route('/admin/profile', methods=['GET'])
+def admin_profile():
+    """
+    GET /admin/profile?seconds=10[&interval_ms=5][&threads=all]
+
+    Samples the stacks of the threads handling requests (every thread with
+    threads=all, e.g. to include micro-batching workers) for `seconds` and
+    returns them as collapsed stacks, ready for flamegraph.pl or speedscope.
+    """
+    denied = admin_denied()
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or interval <= 0:
+        return jsonify({'error': f'seconds must be in (0, {PROFILE_MAX_SECONDS}] '
+                                 'and interval_ms positive'}), 400
+    if not _profile_lock.acquire(blocking=False):
+        return jsonify({'error': 'A profile is already being taken'}), 409
+    try:
+        threads = None if request.args.get('threads') == 'all' else (lambda: _request_threads)
+        stacks, ticks = sample_stacks(seconds, interval, threads)
+    finally:
+        _profile_lock.release()
+    return Response(format_collapsed(stacks), mimetype='text/plain', headers={
+        'X-Profile-Samples': str(sum(stacks.values())),
+        'X-Profile-Ticks': str(ticks),
+    })
+
+
+@app.route('/admin/profile/requests/<profile_id>', methods=['GET'])
+def admin_request_profile(profile_id):
+    """cProfile report of a request sent with `X-Profile: 1` (id from its
+    X-Profile-Id response header); the last 20 are kept."""
+    denied = admin_denied()
+    if denied:
+        return denied
+    report = _profiles.get(profile_id)
+    if report is None:
+        return jsonify({'error': 'Unknown or expired profile id'}), 404
+    return Response(report, mimetype='text/plain')
+
+
 @app.route('/recommend-fertilizer', methods=['POST'])
 def recommend_fertilizer():
     """
@@ -119,50 +922,108 @@ def recommend_fertilizer():
         "cropType": "Maize"
     }
 
-    Returns top-3 fertilizer recommendations with confidence scores.
+    Returns top-3 fertilizer recommendations with confidence scores. With
+    ?lean=1 the soil and crop type lists are left out (see
+    /recommend-fertilizer/metadata).
     """
     try:
-        if _model is None:
+        served = ensure_loaded('fertilizer')
+        if served is None:
             return jsonify({
                 'error': 'Model not loaded. Please run train_model.py first.'
             }), 503
 
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         if not data:
             return jsonify({'error': 'No JSON body provided'}), 400
 
-        X = encode_input(data)
-        proba = _model.predict_proba(X)[0]
-        top3_idx = np.argsort(proba)[::-1][:3]
-
-        recommendations = []
-        for rank, idx in enumerate(top3_idx):
-            fertilizer_name = _target_encoder.inverse_transform([idx])[0]
-            recommendations.append({
-                'rank': rank + 1,
-                'fertilizer': fertilizer_name,
-                'confidence': round(float(proba[idx]) * 100, 1),
-            })
-
-        return jsonify({
-            'success': True,
-            'input': {
-                'soilType': data.get('soilType'),
-                'cropType': data.get('cropType'),
-                'nitrogen': data.get('nitrogen'),
-                'phosphorous': data.get('phosphorous'),
-                'potassium': data.get('potassium'),
-            },
-            'recommendations': recommendations,
-            'available_soil_types': list(_label_encoders['Soil Type'].classes_),
-            'available_crop_types': list(_label_encoders['Crop Type'].classes_),
-        })
+        with stage('encode'):
+            X = served.codec.encode(data)
+        idx, conf = predict_top3(X, served)
+
+        with stage('decode'):
+            body = fertilizer_result(served, data, idx[0], conf[0], lean_response())
+        with stage('serialize'):
+            return json_response(body)
 
     except Exception as e:
         print(f"[ML] Error in recommend_fertilizer: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/recommend-fertilizer/batch', methods=['POST'])
+def recommend_fertilizer_batch():
+    """
+    POST /recommend-fertilizer/batch
+    Body: {"inputs": [<recommend-fertilizer body>, ...]}
+          or a columnar binary payload (columnar.py)
+
+    Scores every input with a single predict_proba call. `results[i]` is
+    exactly what /recommend-fertilizer returns for `inputs[i]`.
+    """
+    try:
+        served = ensure_loaded('fertilizer')
+        if served is None:
+            return jsonify({
+                'error': 'Model not loaded. Please run train_model.py first.'
+            }), 503
+
+        if request.mimetype in COLUMNAR_TYPES:
+            lean = lean_response()
+            return columnar_batch(served, lambda X, idx, conf: [
+                fertilizer_result(served, d, i, c, lean)
+                for d, i, c in zip(input_rows(served.codec, X), idx, conf)
+            ])
+
+        with stage('parse'):
+            items, error = batch_items(request.get_json(silent=True))
+        if error:
+            return error
+
+        with stage('encode'):
+            X = served.codec.encode_rows(items)
+        idx, conf = predict_top3(X, served)
+
+        with stage('decode'):
+            lean = lean_response()
+            results = [fertilizer_result(served, d, i, c, lean) for d, i, c in zip(items, idx, conf)]
+        with stage('serialize'):
+            return json_response(batch_body(results))
+
+    except Exception as e:
+        print(f"[ML] Error in recommend_fertilizer_batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/recommend-fertilizer/metadata', methods=['GET'])
+def fertilizer_metadata():
+    """
+    GET /recommend-fertilizer/metadata
+
+    Model version, fertilizer labels and the accepted soil and crop types.
+    Changes only with the model version, which is its ETag.
+    """
+    return metadata_response('fertilizer')
+
+
+@app.route('/recommend-crop/metadata', methods=['GET'])
+def crop_metadata():
+    """GET /recommend-crop/metadata — model version and crop labels, with an ETag."""
+    return metadata_response('crop')
+
+
+def metadata_response(name: str):
+    served = ensure_loaded(name)
+    if served is None:
+        return jsonify({'error': f'{MODEL_TITLES[name]} model not loaded.'}), 503
+    response = json_response(served.responses.metadata)
+    response.set_etag(f'{name}-{served.version}')
+    # Cacheable, but revalidated so a reloaded model is picked up at once
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/recommend-crop', methods=['POST'])
 def recommend_crop():
     """
@@ -179,75 +1040,231 @@ def recommend_crop():
     }
     """
     try:
-        if _crop_model is None:
+        served = ensure_loaded('crop')
+        if served is None:
             return jsonify({
                 'error': 'Crop model not loaded. Please run train_crop_model.py first.'
             }), 503
 
-        data = request.get_json()
+        with stage('parse'):
+            data = request.get_json()
         if not data:
             return jsonify({'error': 'No JSON body provided'}), 400
 
-        # Features order: N, P, K, temperature, humidity, ph, rainfall
-        row = [
-            float(data.get('nitrogen', 50)),
-            float(data.get('phosphorous', 50)),
-            float(data.get('potassium', 50)),
-            float(data.get('temperature', 25)),
-            float(data.get('humidity', 60)),
-            float(data.get('ph', 6.5)),
-            float(data.get('rainfall', 100))
-        ]
-        
-        X = np.array([row])
-        proba = _crop_model.predict_proba(X)[0]
-        top3_idx = np.argsort(proba)[::-1][:3]
-
-        recommendations = []
-        for rank, idx in enumerate(top3_idx):
-            crop_name = _crop_label_encoder.inverse_transform([idx])[0]
-            recommendations.append({
-                'rank': rank + 1,
-                'crop': str(crop_name).capitalize(),
-                'confidence': round(float(proba[idx]) * 100, 1),
-            })
-
-        return jsonify({
-            'success': True,
-            'input': {
-                'nitrogen': row[0],
-                'phosphorous': row[1],
-                'potassium': row[2],
-                'temperature': row[3],
-                'humidity': row[4],
-                'ph': row[5],
-                'rainfall': row[6]
-            },
-            'recommendations': recommendations
-        })
+        with stage('encode'):
+            X = served.codec.encode(data)
+        idx, conf = predict_top3(X, served)
+
+        with stage('decode'):
+            body = crop_result(served, X[0].tolist(), idx[0], conf[0])
+        with stage('serialize'):
+            return json_response(body)
 
     except Exception as e:
         print(f"[ML] Error in recommend_crop: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/recommend-crop/batch', methods=['POST'])
+def recommend_crop_batch():
+    """
+    POST /recommend-crop/batch
+    Body: {"inputs": [<recommend-crop body>, ...]}
+          or a columnar binary payload (columnar.py)
+
+    Scores every input with a single predict_proba call. `results[i]` is
+    exactly what /recommend-crop returns for `inputs[i]`.
+    """
+    try:
+        served = ensure_loaded('crop')
+        if served is None:
+            return jsonify({
+                'error': 'Crop model not loaded. Please run train_crop_model.py first.'
+            }), 503
+
+        if request.mimetype in COLUMNAR_TYPES:
+            return columnar_batch(served, lambda X, idx, conf: [
+                crop_result(served, r, i, c) for r, i, c in zip(X.tolist(), idx, conf)
+            ])
+
+        with stage('parse'):
+            items, error = batch_items(request.get_json(silent=True))
+        if error:
+            return error
+
+        with stage('encode'):
+            X = served.codec.encode_rows(items)
+        idx, conf = predict_top3(X, served)
+
+        with stage('decode'):
+            results = [crop_result(served, r, i, c) for r, i, c in zip(X.tolist(), idx, conf)]
+        with stage('serialize'):
+            return json_response(batch_body(results))
+
+    except Exception as e:
+        print(f"[ML] Error in recommend_crop_batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/predict', methods=['POST'])
 def predict_price():
-    """Legacy price prediction endpoint (mock)."""
+    """
+    POST /predict
+    Body (as sent by the backend's mlService.prepareFeatures):
+    {
+        "crop": "tomato",
+        "location": "Pune",
+        "days": 7,
+        "historical_prices": [{"date": "2024-01-05", "price": 42.5}, ...],
+        "market_holidays": [{"date": "2024-01-26", "name": "Republic Day"}]
+    }
+
+    Forecasts the next `days` daily prices with intervals (forecaster.py).
+    `predicted_price` and `confidence` repeat the first day's forecast for
+    clients of the old single-price response.
+
+    With ML_FORECAST_STATE_SIZE set, the series (crop and location) is kept
+    as incremental state (forecast_state.py): only days newer than the ones
+    it has are processed, so `historical_prices` can hold just those.
+    """
     try:
-        data = request.get_json()
-        crop = data.get('crop')
-        base_price = 50.0
-        prediction = base_price + np.random.normal(0, 5)
-        return jsonify({
-            'crop': crop,
-            'predicted_price': round(prediction, 2),
-            'confidence': 0.85
-        })
+        with stage('parse'):
+            data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'No JSON body provided'}), 400
+
+        history = data.get('historical_prices') or []
+        days = int(data.get('days', 7))
+        holidays = data.get('market_holidays') or ()
+        state = None
+        if _forecast_state.enabled and data.get('crop'):
+            with stage('state'):
+                state = _forecast_state.observe(series_key(data.get('crop'), data.get('location')), history)
+        with stage('predict'):
+            if state is not None:
+                result = state.forecast(days, holidays)
+            else:
+                result = forecast(history, days=days, holidays=holidays)
+        with stage('serialize'):
+            return json_response(dumps(price_result(data, result)))
+    except (ForecastError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        print(f"[ML] Error in predict_price: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_price_batch():
+    """
+    POST /predict/batch
+    Body: {
+        "days": 7,                      (default for every input)
+        "market_holidays": [...],       (default for every input)
+        "inputs": [{"id": "tomato/Pune", <predict body>}, ...]
+    }
+    (or a bare list of inputs)
+
+    Forecasts every series in one pass (forecaster.forecast_many). Results
+    are keyed by each input's `id`, or "crop:location" without one;
+    `results[key]` is exactly what /predict returns for that input, and a
+    series that can't be read gets `errors[key]` instead.
+    """
+    try:
+        with stage('parse'):
+            data = request.get_json(silent=True)
+            items, error = batch_items(data)
+            if error:
+                return error
+            defaults = data if isinstance(data, dict) else {}
+            days = int(defaults.get('days', 7))
+            holidays = defaults.get('market_holidays') or ()
+            keys = [str(d['id']) if d.get('id') is not None else series_key(d.get('crop'), d.get('location'))
+                    for d in items]
+            if len(set(keys)) < len(keys):
+                return jsonify({'error': 'Every input needs a distinct "id" (or crop and location)'}), 400
+            # An item's own days and holidays are checked with its history, so
+            # a bad one only fails that item
+            series = [(d.get('historical_prices') or [], d.get('days', days),
+                       d.get('market_holidays') or holidays) for d in items]
+
+        with stage('predict'):
+            processes = FORECAST_PROCESSES if len(series) >= FORECAST_POOL_MIN_SERIES else 0
+            forecasts = forecast_many(series, processes=processes)
+
+        with stage('serialize'):
+            results, errors = {}, {}
+            for key, d, result in zip(keys, items, forecasts):
+                if isinstance(result, ForecastError):
+                    errors[key] = str(result)
+                else:
+                    results[key] = price_result(d, result)
+            return json_response(dumps({
+                'success': True, 'count': len(results), 'results': results, 'errors': errors,
+            }))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ML] Error in predict_price_batch: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/ingest/prices', methods=['POST'])
+def ingest_prices():
+    """
+    POST /ingest/prices[?batch=5000]
+    Body (application/x-ndjson), one PriceHistory record per line:
+        {"cropName": "tomato", "region": "Pune", "price": 42.5, "date": "2024-01-05"}
+
+    Adds the prices to the incremental forecast state (price_ingest.py) as
+    the body arrives; 503 when that state is off or split over several
+    worker processes. Answers NDJSON as well: one acknowledgement per batch
+    of records ({"batch", "rows", "accepted", "stale", "rejected", "errors"})
+    and a summary ({"done": true, ..., "rows_per_second"}).
+    """
+    if not _forecast_state.enabled:
+        return jsonify({'error': 'Forecast state is disabled (set ML_FORECAST_STATE_SIZE)'}), 503
+    if WORKERS > 1:
+        return jsonify({'error': f'Ingestion needs a single worker (ML_WORKERS=1), not {WORKERS}: '
+                                 'every worker has its own forecast state'}), 503
+    try:
+        batch_rows = min(max(int(request.args.get('batch', BATCH_ROWS)), 1), MAX_BATCH_ROWS)
+    except ValueError:
+        return jsonify({'error': 'batch must be an integer'}), 400
+
+    def acknowledgements():
+        for ack in ingest(request.stream.read, _forecast_state, batch_rows):
+            for outcome in ('accepted', 'stale', 'rejected'):
+                if 'batch' in ack and ack[outcome]:
+                    _metrics.inc('ml_ingested_rows_total', (('outcome', outcome),), ack[outcome])
+            if 'error' in ack:
+                print(f"[ML] Ingestion stopped: {ack['error']}")
+            yield dumps(ack) + b'\n'
+
+    return Response(stream_with_context(acknowledgements()), mimetype='application/x-ndjson')
+
+
+# ── Startup ──────────────────────────────────────────────────────────────────
+# Last, so a loader (or warm-up) never runs ahead of the definitions it needs
+if LOAD_MODE == 'eager':
+    load_artifacts()
+    warm_forecaster()
+elif LOAD_MODE == 'background':
+    threading.Thread(target=_load_in_background, name='model-loader', daemon=True).start()
+load_forecast_state()
+if WORKERS > 1 and _forecast_state.enabled:
+    print(f"[ML] WARNING: {WORKERS} workers each keep their own forecast state; "
+          "/ingest/prices answers 503 (set ML_WORKERS=1 to stream prices in).")
+_start_watcher()
+_start_checkpointer()
+# Threads don't survive fork(): pre-fork workers need their own watcher
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_start_watcher)
+    os.register_at_fork(after_in_child=_start_checkpointer)
+atexit.register(save_cache_snapshot)
+atexit.register(save_forecast_state)
+
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5001))
     app.run(host='0.0.0.0', port=port, debug=True)
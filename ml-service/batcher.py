@@ -0,0 +1,153 @@
+"""
+Micro-batching in front of a scorer.
+
+Under load many request threads each want `predict_proba` on one or two rows.
+A CoalescingScorer queues those calls, and one worker thread per model drains
+the queue: it waits up to `max_wait_ms` after the first call (or until
+`max_rows` rows are queued), scores everything as one matrix and hands each
+caller its own slice. Calls that are already `max_rows` or larger skip the
+queue.
+
+Threads don't survive fork(), so after a fork (e.g. gunicorn workers forked
+from a preloaded master) every live CoalescingScorer starts a fresh queue and
+worker in the child.
+
+Configured in app.py with ML_COALESCE_WAIT_MS (0 disables) and
+ML_COALESCE_MAX_ROWS.
+"""
+import os
+import queue
+import threading
+import time
+import weakref
+
+import numpy as np
+
+
+class _Call:
+    __slots__ = ('X', 'done', 'result', 'error')
+
+    def __init__(self, X):
+        self.X = X
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_live = weakref.WeakSet()
+
+
+def _restart_after_fork():
+    for scorer in list(_live):
+        scorer._start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+class CoalescingScorer:
+    """Wraps a scorer so concurrent predict_proba calls are scored together."""
+
+    def __init__(self, scorer, max_wait_ms: float = 2.0, max_rows: int = 256, name: str = ''):
+        self.scorer = scorer
+        self.backend = scorer.backend
+        self.max_wait = max_wait_ms / 1000
+        self.max_rows = max_rows
+        self.name = name
+        # batch size → number of batches (sizes bucketed to powers of two)
+        self._histogram = {}
+        self.batches = self.rows = 0
+        self._closed = False
+        self._start()
+        _live.add(self)
+
+    def _start(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        # Orders submissions against close() so nothing is queued behind the stop marker
+        self._submit_lock = threading.Lock()
+        if not self._closed:
+            self._worker = threading.Thread(target=self._run, name=f'coalescer-{self.name}', daemon=True)
+            self._worker.start()
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        call = None
+        if len(X) < self.max_rows:
+            with self._submit_lock:
+                if not self._closed:
+                    call = _Call(X)
+                    self._queue.put(call)
+        if call is None:
+            self._record(len(X))
+            return self.scorer.predict_proba(X)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def close(self):
+        """Stop the worker once the queued calls are scored; later calls score directly."""
+        with self._submit_lock:
+            self._closed = True
+            self._queue.put(None)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            calls = [first]
+            rows = len(first.X)
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    call = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if call is None:
+                    self._queue.put(None)
+                    break
+                calls.append(call)
+                rows += len(call.X)
+            self._score(calls, rows)
+
+    def _score(self, calls, rows):
+        self._record(rows)
+        try:
+            X = calls[0].X if len(calls) == 1 else np.vstack([c.X for c in calls])
+            proba = self.scorer.predict_proba(X)
+        except Exception as e:
+            for c in calls:
+                c.error = e
+                c.done.set()
+            return
+        start = 0
+        for c in calls:
+            c.result = proba[start:start + len(c.X)]
+            start += len(c.X)
+            c.done.set()
+
+    def _record(self, rows):
+        bucket = 1 << (rows - 1).bit_length()
+        with self._lock:
+            self._histogram[bucket] = self._histogram.get(bucket, 0) + 1
+            self.batches += 1
+            self.rows += rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            histogram = dict(sorted(self._histogram.items()))
+            batches, rows = self.batches, self.rows
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_rows': self.max_rows,
+            'batches': batches,
+            'rows': rows,
+            'mean_batch_rows': round(rows / batches, 2) if batches else 0.0,
+            # "≤N": batches of more than N/2 and at most N rows
+            'batch_size_histogram': {f'<={size}': n for size, n in histogram.items()},
+        }
@@ -0,0 +1,217 @@
+"""
+Shared helpers for the ml-service benchmarks.
+
+Every script in this folder is meant to be run from `ml-service/`:
+
+    python benchmarks/<script>.py
+"""
+import contextlib
+import csv
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from io import StringIO
+
+ML_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ML_SERVICE_DIR not in sys.path:
+    sys.path.insert(0, ML_SERVICE_DIR)
+# The benchmarks use the loaded models directly, so load them at import
+os.environ.setdefault('ML_LOAD_MODE', 'eager')
+
+# Request keys ← dataset columns
+FERTILIZER_KEYS = {
+    'temperature': 'Temparature',
+    'humidity': 'Humidity',
+    'moisture': 'Moisture',
+    'nitrogen': 'Nitrogen',
+    'potassium': 'Potassium',
+    'phosphorous': 'Phosphorous',
+    'soilType': 'Soil Type',
+    'cropType': 'Crop Type',
+}
+CROP_KEYS = {
+    'nitrogen': 'N',
+    'phosphorous': 'P',
+    'potassium': 'K',
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'ph': 'ph',
+    'rainfall': 'rainfall',
+}
+
+
+def fertilizer_requests():
+    """/recommend-fertilizer bodies built from the embedded training dataset."""
+    from train_model import EMBEDDED_DATA
+    rows = csv.DictReader(StringIO(EMBEDDED_DATA))
+    return [
+        {key: (r[col] if key in ('soilType', 'cropType') else float(r[col]))
+         for key, col in FERTILIZER_KEYS.items()}
+        for r in rows
+    ]
+
+
+def crop_requests():
+    """/recommend-crop bodies built from Crop_recommendation.csv."""
+    with open(os.path.join(ML_SERVICE_DIR, 'Crop_recommendation.csv'), newline='') as f:
+        return [
+            {key: float(r[col]) for key, col in CROP_KEYS.items()}
+            for r in csv.DictReader(f)
+        ]
+
+
+def cycle(rows, n):
+    """First n items of rows repeated end to end."""
+    return [rows[i % len(rows)] for i in range(n)]
+
+
+def best_of(fn, repeat=5, number=1):
+    """Best wall-clock seconds per call of fn() over `repeat` runs of `number` calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for r in rows:
+        print('  '.join(str(v).rjust(w) for v, w in zip(r, widths)))
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of a list of numbers, nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(host, port, timeout=60.0, path='/health/ready'):
+    """Wait for `path` (/health on builds without /health/ready) to answer 200."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request('GET', path)
+            status = conn.getresponse().status
+            if status == 200:
+                return
+            if status == 404:
+                path = '/health'
+            else:
+                time.sleep(0.05)
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'ml-service did not come up on {host}:{port}')
+
+
+@contextlib.contextmanager
+def serve(env=None, command=None, ready_path='/health/ready'):
+    """Run the service in a subprocess on a free port; yields (host, port, process)
+    once `ready_path` answers 200.
+
+    By default it runs Flask's threaded server; pass `command` (with a
+    `{port}` placeholder) to launch something else, e.g. gunicorn.
+    """
+    port = free_port()
+    if command is None:
+        command = [sys.executable, '-c',
+                   'import app; app.app.run(host="127.0.0.1", port={port}, threaded=True)']
+    command = [part.format(port=port) for part in command]
+    proc = subprocess.Popen(
+        command, cwd=ML_SERVICE_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up('127.0.0.1', port, path=ready_path)
+        yield '127.0.0.1', port, proc
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def run_load(host, port, requests, concurrency, duration, headers=None):
+    """Closed-loop load: `concurrency` keep-alive clients POST
+    `requests` = [(path, body), ...] round-robin for `duration` seconds.
+
+    Returns {'requests', 'errors', 'error_rate', 'status', 'throughput',
+    'latency_ms': {...}, 'routes': {path: same fields}}.
+    """
+    payloads = [(path, json.dumps(body).encode()) for path, body in requests]
+    base_headers = {'Content-Type': 'application/json', **(headers or {})}
+    samples = []   # (path, status, seconds)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset):
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine, i = [], offset
+        while time.monotonic() < stop_at:
+            path, body = payloads[i % len(payloads)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                conn.request('POST', path, body=body, headers=base_headers)
+                res = conn.getresponse()
+                res.read()
+                status = res.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                status = 'error'
+            mine.append((path, status, time.perf_counter() - start))
+        with lock:
+            samples.extend(mine)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    result = summarize(samples, elapsed)
+    result['routes'] = {
+        path: summarize([s for s in samples if s[0] == path], elapsed)
+        for path in sorted({s[0] for s in samples})
+    }
+    return result
+
+
+def summarize(samples, elapsed):
+    """Throughput, status counts and latency percentiles of (path, status, seconds) samples."""
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = len(samples) - statuses.get('200', 0)
+    ms = [s[2] * 1000 for s in samples]
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'status': statuses,
+        'throughput': round(len(samples) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(ms, 50), 2),
+            'p95': round(percentile(ms, 95), 2),
+            'p99': round(percentile(ms, 99), 2),
+            'max': round(max(ms), 2) if ms else 0.0,
+        },
+    }
@@ -0,0 +1,101 @@
+"""
+Goodput under overload with and without admission control (admission.py).
+
+    python benchmarks/bench_admission.py [--clients 200] [--rows 1000] [--duration 30]
+
+Starts the service twice, with ML_MAX_CONCURRENCY=0 (no admission control)
+and with the default gate, and overloads each with --clients closed-loop
+clients. Each POSTs a --rows-row /recommend-crop/batch request, waits at
+most --timeout seconds (the backend's axios timeout) and sends its budget
+as X-Request-Timeout-Ms. A client that gets 429 or 503 waits the
+Retry-After, as a well-behaved caller would. A client that times out drops
+the connection and goes on, like the backend falling back to its rules.
+
+Goodput counts the answers that arrived within the timeout. Abandoned
+requests are still computed when nothing stops them, and that work is lost.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import crop_requests, cycle, percentile, print_table, serve
+
+
+def overload(host, port, body, clients, duration, timeout):
+    samples = []   # (outcome, seconds)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+    headers = {'Content-Type': 'application/json', 'X-Request-Timeout-Ms': str(int(timeout * 1000))}
+
+    def client():
+        mine = []
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            wait = 0
+            try:
+                conn.request('POST', '/recommend-crop/batch', body=body, headers=headers)
+                res = conn.getresponse()
+                res.read()
+                outcome = res.status
+                if res.status in (429, 503):
+                    wait = float(res.headers.get('Retry-After', 1))
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=timeout)
+                outcome = 'timeout'
+            mine.append((outcome, time.perf_counter() - start))
+            if wait:
+                time.sleep(min(wait, max(0.0, stop_at - time.monotonic())))
+        conn.close()
+        with lock:
+            samples.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=1000, help='rows per batch request')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--timeout', type=float, default=5.0, help='client timeout in seconds')
+    args = parser.parse_args()
+
+    body = json.dumps({'inputs': cycle(crop_requests(), args.rows)}).encode()
+    table = []
+    for label, env in (('off', {'ML_MAX_CONCURRENCY': '0'}), ('on', {})):
+        with serve({'ML_CACHE_SIZE': '0', **env}) as (host, port, _):
+            # Capacity first: one client, nothing queued
+            single, elapsed = overload(host, port, body, 1, 5, args.timeout)
+            capacity = len(single) / elapsed
+            samples, elapsed = overload(host, port, body, args.clients, args.duration, args.timeout)
+        # The socket timeout applies per read, so check the whole wait too
+        ok = [s for outcome, s in samples if outcome == 200 and s <= args.timeout]
+        late = sum(1 for outcome, s in samples if outcome == 200 and s > args.timeout)
+        counts = {key: sum(1 for outcome, _ in samples if outcome == key) for key in (429, 503, 'timeout')}
+        counts['timeout'] += late
+        table.append([
+            label, f'{capacity:.1f}', f'{len(ok) / elapsed:.1f}',
+            f'{len(ok) / elapsed / capacity:.0%}',
+            counts['timeout'], counts[429], counts[503],
+            f'{percentile([s * 1000 for s in ok], 50):.0f}' if ok else '-',
+            f'{percentile([s * 1000 for s in ok], 99):.0f}' if ok else '-',
+        ])
+    print_table(['admission', 'capacity req/s', 'goodput req/s', 'of capacity', 'timeouts', '429', '503',
+                 'p50 ms', 'p99 ms'], table)
+    print(f'\n{args.clients} clients for {args.duration:.0f} s, {args.rows}-row crop batches, '
+          f'{args.timeout:.0f} s client timeout')
+
+
+if __name__ == '__main__':
+    main()
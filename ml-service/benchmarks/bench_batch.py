@@ -0,0 +1,46 @@
+"""
+Throughput of /recommend-*/batch versus one /recommend-* call per row.
+
+    python benchmarks/bench_batch.py [--sizes 1 64 1000 10000]
+
+Requests go through Flask's test client, so the numbers include JSON parsing,
+encoding, predict_proba, top-3 selection and serialization but no network.
+"""
+import argparse
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, crop_requests, cycle, fertilizer_requests, print_table
+
+import app
+
+# Per-row loops get slow quickly; above this size they are measured on a sample
+SINGLE_SAMPLE = 1000
+
+
+def bench(client, route, rows, sizes):
+    table = []
+    for size in sizes:
+        items = cycle(rows, size)
+        batch_s = best_of(lambda: client.post(f'{route}/batch', json={'inputs': items}),
+                          repeat=3 if size >= 1000 else 5)
+        sample = items[:SINGLE_SAMPLE]
+        single_s = best_of(lambda: [client.post(route, json=d) for d in sample], repeat=1)
+        single_rps = len(sample) / single_s
+        batch_rps = size / batch_s
+        table.append([size, f'{single_rps:,.0f}', f'{batch_rps:,.0f}', f'{batch_rps / single_rps:.1f}x'])
+    print(f'\n{route}')
+    print_table(['rows', 'single rows/s', 'batch rows/s', 'speedup'], table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 64, 1000, 10000])
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    bench(client, '/recommend-fertilizer', fertilizer_requests(), args.sizes)
+    bench(client, '/recommend-crop', crop_requests(), args.sizes)
+
+
+if __name__ == '__main__':
+    main()
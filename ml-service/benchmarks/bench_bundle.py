@@ -0,0 +1,91 @@
+"""
+Load time and size on disk: model bundles versus the joblib pickles they replaced.
+
+    python benchmarks/bench_bundle.py
+
+The pickles are recreated in a temporary directory from the loaded models
+(the same objects train_model.py used to dump), so both formats hold the
+same model. Load times are best-of-N in a warm process (xgboost and sklearn
+already imported), i.e. the cost a reload pays. "numpy ready" adds building
+the numpy scorer: compiling the trees after unpickling, versus reusing the
+bundle's precompiled, memory-mapped trees.
+"""
+import os
+import tempfile
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, print_table
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+import app
+from model_bundle import bundle_path, load_bundle
+from scoring import make_scorer
+
+
+def label_encoder(classes):
+    le = LabelEncoder()
+    le.classes_ = np.asarray(classes)
+    return le
+
+
+def dump_pickles(directory):
+    """Write the pre-bundle artifacts; returns {model: [pickle paths]}."""
+    fertilizer, crop = app._models
+    artifacts = {
+        'fertilizer': {
+            'fertilizer_model.pkl': fertilizer.model,
+            'label_encoders.pkl': {col: label_encoder(v) for col, v in fertilizer.codec.categories.items()},
+            'target_encoder.pkl': label_encoder(fertilizer.codec.classes),
+            'feature_names.pkl': fertilizer.codec.feature_names,
+        },
+        'crop': {
+            'crop_model.pkl': crop.model,
+            'crop_label_encoder.pkl': label_encoder(crop.codec.classes),
+        },
+    }
+    paths = {}
+    for name, files in artifacts.items():
+        paths[name] = []
+        for filename, obj in files.items():
+            path = os.path.join(directory, filename)
+            joblib.dump(obj, path)
+            paths[name].append(path)
+    return paths
+
+
+def size(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def bundle_files(path):
+    return [os.path.join(root, f) for root, _, files in os.walk(path) for f in files]
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pickles = dump_pickles(tmp)
+        for name, paths in pickles.items():
+            bundle = bundle_path(app.MODELS_DIR, name)
+            pickle_s = best_of(lambda: [joblib.load(p) for p in paths], repeat=10)
+            bundle_s = best_of(lambda: load_bundle(bundle), repeat=10)
+            unverified_s = best_of(lambda: load_bundle(bundle, verify=False), repeat=10)
+            pickle_ready = best_of(lambda: make_scorer(joblib.load(paths[0]), 'numpy'), repeat=10)
+            bundle_ready = best_of(lambda: (lambda b: make_scorer(b.model, 'numpy', b.ensemble))(
+                load_bundle(bundle)), repeat=10)
+            rows.append([
+                name,
+                f'{size(paths) / 1e6:.2f}', f'{size(bundle_files(bundle)) / 1e6:.2f}',
+                f'{pickle_s * 1e3:.1f}', f'{bundle_s * 1e3:.1f}', f'{unverified_s * 1e3:.1f}',
+                f'{pickle_ready * 1e3:.1f}', f'{bundle_ready * 1e3:.1f}',
+            ])
+    print_table(['model', 'pickles MB', 'bundle MB', 'pickle load ms',
+                 'bundle load ms', 'bundle, no hash check',
+                 'numpy ready: pickle ms', 'numpy ready: bundle ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
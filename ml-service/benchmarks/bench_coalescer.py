@@ -0,0 +1,42 @@
+"""
+Load test: per-request scoring versus the micro-batching coalescer.
+
+    python benchmarks/bench_coalescer.py [--concurrency 1 16 64] [--wait-ms 2] [--duration 10]
+
+Starts the service (Flask threaded server) once per configuration with the
+prediction cache and response table off, so every request reaches the model,
+and drives /recommend-crop with concurrent keep-alive clients.
+"""
+import argparse
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import crop_requests, print_table, run_load, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--wait-ms', type=float, default=2.0)
+    parser.add_argument('--max-rows', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+
+    requests = [('/recommend-crop', body) for body in crop_requests()]
+    base_env = {'ML_CACHE_SIZE': '0', 'ML_FERTILIZER_TABLE': ''}
+    modes = [
+        ('per-request', {'ML_COALESCE_WAIT_MS': '0'}),
+        (f'coalesced {args.wait_ms:g}ms', {'ML_COALESCE_WAIT_MS': str(args.wait_ms),
+                                          'ML_COALESCE_MAX_ROWS': str(args.max_rows)}),
+    ]
+    table = []
+    for name, env in modes:
+        with serve({**base_env, **env}) as (host, port, _):
+            for concurrency in args.concurrency:
+                r = run_load(host, port, requests, concurrency, args.duration)
+                table.append([name, concurrency, f"{r['throughput']:,.0f}", r['latency_ms']['p50'],
+                              r['latency_ms']['p99'], r['errors']])
+    print_table(['mode', 'clients', 'req/s', 'p50 ms', 'p99 ms', 'errors'], table)
+
+
+if __name__ == '__main__':
+    main()
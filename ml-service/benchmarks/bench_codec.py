@@ -0,0 +1,78 @@
+"""
+Per-request encode/decode overhead: FeatureCodec versus the LabelEncoder calls
+the service used to make on every request.
+
+    python benchmarks/bench_codec.py
+"""
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, cycle, fertilizer_requests, print_table
+
+import numpy as np
+from sklearn.preprocessing import LabelEncoder
+
+import app
+
+
+def label_encoder(classes):
+    """A fitted LabelEncoder like the ones the service used to unpickle."""
+    le = LabelEncoder()
+    le.classes_ = np.asarray(classes)
+    return le
+
+
+LABEL_ENCODERS = {col: label_encoder(v) for col, v in app._models.fertilizer.codec.categories.items()}
+TARGET_ENCODER = label_encoder(app._models.fertilizer.codec.classes)
+
+
+def legacy_encode_input(data):
+    """encode_input as it was before FeatureCodec (classes_ scan + transform per field)."""
+    soil_le = LABEL_ENCODERS['Soil Type']
+    crop_le = LABEL_ENCODERS['Crop Type']
+    soil_type = data.get('soilType', 'Sandy')
+    crop_type = data.get('cropType', 'Maize')
+    if soil_type not in soil_le.classes_:
+        soil_type = soil_le.classes_[0]
+    if crop_type not in crop_le.classes_:
+        crop_type = crop_le.classes_[0]
+    return np.array([[
+        float(data.get('temperature', 28)),
+        float(data.get('humidity', 55)),
+        float(data.get('moisture', 45)),
+        float(data.get('nitrogen', 20)),
+        float(data.get('potassium', 10)),
+        float(data.get('phosphorous', 15)),
+        int(soil_le.transform([soil_type])[0]),
+        int(crop_le.transform([crop_type])[0]),
+    ]])
+
+
+def legacy_decode(top3_idx):
+    return [TARGET_ENCODER.inverse_transform([idx])[0] for idx in top3_idx]
+
+
+def main():
+    codec = app._models.fertilizer.codec
+    requests = fertilizer_requests()
+    data = requests[0]
+    top3 = np.array([6, 2, 3])
+    column_rows = cycle(requests, 10000)
+
+    assert np.array_equal(legacy_encode_input(data), codec.encode(data))
+    assert legacy_decode(top3) == codec.decode(top3).tolist()
+
+    cases = [
+        ('encode one row', lambda: legacy_encode_input(data), lambda: codec.encode(data), 2000),
+        ('decode top-3', lambda: legacy_decode(top3), lambda: codec.decode(top3), 2000),
+        ('encode 10k rows', lambda: [legacy_encode_input(d) for d in column_rows],
+         lambda: codec.encode_rows(column_rows), 1),
+    ]
+    table = []
+    for name, legacy, fast, number in cases:
+        before = best_of(legacy, number=number)
+        after = best_of(fast, number=number)
+        table.append([name, f'{before * 1e6:,.1f}', f'{after * 1e6:,.1f}', f'{before / after:.0f}x'])
+    print_table(['step', 'LabelEncoder µs', 'codec µs', 'speedup'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Parse + score time of columnar binary /batch bodies (columnar.py) against JSON.
+
+    python benchmarks/bench_columnar.py [--sizes 1000 100000 1000000] [--model crop]
+
+Per size it times, in process, turning the body into the feature matrix
+(parse) and scoring it (parse + score): JSON rows through json.loads and
+FeatureCodec.encode_rows, a .npy body through read_npy and feature_matrix.
+Then whole requests through Flask's test client, which add the top-3
+selection and the response: JSON in and out, .npy in with a JSON answer,
+and .npy or raw float32 columns in with a .npy answer. Bodies are encoded
+once, before timing. The prediction cache and response table are off.
+"""
+import argparse
+import io
+import json
+import os
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, crop_requests, cycle, fertilizer_requests, print_table
+
+import numpy as np
+
+# Every row goes to the model, whatever the body format
+os.environ.setdefault('ML_CACHE_SIZE', '0')
+os.environ.setdefault('ML_FERTILIZER_TABLE', '')
+
+import app  # noqa: E402
+from columnar import feature_matrix, read_npy  # noqa: E402
+
+
+def npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def bench(client, name, rows, size):
+    served = app.ensure_loaded(name)
+    route = f'/recommend-{name}/batch'
+    items = cycle(rows, size)
+    X = served.codec.encode_rows(items).astype(np.float32)
+    json_body = json.dumps({'inputs': items}).encode()
+    npy_body = npy(X)
+    raw_body = X.T.tobytes()
+    keys = ','.join(f.key for f in served.codec.fields)
+    repeat = 1 if size >= 100_000 else 3
+
+    def parse_json():
+        return served.codec.encode_rows(json.loads(json_body)['inputs'])
+
+    def parse_npy():
+        return feature_matrix(served.codec, None, read_npy(npy_body))
+
+    steps = [
+        ('parse JSON', best_of(parse_json, repeat)),
+        ('parse .npy', best_of(parse_npy, repeat)),
+        ('parse + score JSON', best_of(lambda: served.scorer.predict_proba(parse_json()), repeat)),
+        ('parse + score .npy', best_of(lambda: served.scorer.predict_proba(parse_npy()), repeat)),
+    ]
+    requests = [
+        ('POST JSON -> JSON', json_body, 'application/json', {}),
+        ('POST .npy -> JSON', npy_body, 'application/x-npy', {}),
+        ('POST .npy -> .npy', npy_body, 'application/x-npy', {'Accept': 'application/x-npy'}),
+        ('POST raw -> .npy', raw_body, 'application/octet-stream',
+         {'Accept': 'application/x-npy', 'X-Features': keys}),
+    ]
+    for label, body, content_type, headers in requests:
+        def post():
+            res = client.post(route, data=body, content_type=content_type, headers=headers)
+            assert res.status_code == 200, res.data[:200]
+        steps.append((label, best_of(post, repeat)))
+
+    table = [[size, label, f'{seconds * 1e3:,.1f}', f'{size / seconds:,.0f}'] for label, seconds in steps]
+    sizes = f'JSON {len(json_body) / 1e6:.1f} MB, .npy {len(npy_body) / 1e6:.1f} MB'
+    return table, sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    parser.add_argument('--model', choices=['crop', 'fertilizer'], default='crop')
+    args = parser.parse_args()
+
+    # Let JSON batches as large as the binary ones through
+    app.MAX_BATCH_ROWS = app.MAX_BINARY_ROWS = max(args.sizes)
+    client = app.app.test_client()
+    rows = crop_requests() if args.model == 'crop' else fertilizer_requests()
+    table, notes = [], []
+    for size in args.sizes:
+        more, sizes = bench(client, args.model, rows, size)
+        table += more
+        notes.append(f'{size:,} rows: {sizes}')
+    print_table(['rows', 'step', 'ms', 'rows/s'], table)
+    print('\n' + '\n'.join(notes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Latency of the /predict price forecaster against history length.
+
+    python benchmarks/bench_forecast.py [--days 7]
+
+Per history length: reading the posted points into a daily series, the
+fit (least squares plus the multi-day error sweep over every origin), the
+forecast itself, the backtest refit, the whole forecast() call, and the
+whole request through Flask's test client.
+"""
+import argparse
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, print_table
+
+import numpy as np
+
+import app
+from forecaster import Panel, _weekday, backtest_many, daily_series, forecast, model_terms
+
+LENGTHS = (7, 14, 30, 90, 180, 365, 730, 1095)
+TODAY = '2025-12-31'
+
+
+def history(n, seed=0, end=TODAY):
+    rng = np.random.default_rng(seed)
+    days = np.datetime64(end) - np.arange(n)[::-1]
+    t = np.arange(n)
+    prices = 40 + 0.02 * t + 3 * np.sin(2 * np.pi * t / 365) + rng.normal(0, 1, n)
+    return [{'date': f'{d}T00:00:00.000Z', 'price': round(float(p), 2)} for d, p in zip(days, prices)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=7, help='forecast length')
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    table = []
+    for n in LENGTHS:
+        points = history(n)
+        first, y = daily_series(points)
+        dow0 = _weekday(first)
+        terms = model_terms(len(y))
+        panel = Panel([y], [dow0], terms) if terms else None
+        coef, scale, _ = panel.fit(args.days) if terms else (None, None, None)
+        body = {'crop': 'tomato', 'days': args.days, 'historical_prices': points}
+        number = 200 if n <= 365 else 50
+        steps = [
+            best_of(lambda: daily_series(points), number=number),
+            best_of(lambda: panel.fit(args.days), number=number) if terms else 0.0,
+            best_of(lambda: panel.predict(coef, scale, args.days), number=number) if terms else 0.0,
+            best_of(lambda: backtest_many([y], [dow0], [args.days]), number=number),
+            best_of(lambda: forecast(points, args.days, today=TODAY), number=number),
+            best_of(lambda: client.post('/predict', json=body), number=number // 4),
+        ]
+        table.append([n, ','.join(terms) or 'naive', *(f'{s * 1e3:.3f}' for s in steps)])
+    print_table(['history days', 'terms', 'series ms', 'fit ms', 'predict ms', 'backtest ms',
+                 'forecast() ms', 'POST /predict ms'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Scaling of multi-series forecasting (/predict/batch) from 10 to 10k series.
+
+    python benchmarks/bench_forecast_batch.py [--series 10 100 1000 10000] [--processes 4]
+
+Per panel size: forecast() called once per series, forecast_many() over all
+of them in one pass, forecast_many() sharded over --processes worker
+processes (when given), and the whole request through Flask's test client.
+Series have random lengths between --min-days and --max-days, so panels
+are ragged, and a random start weekday; the loop and the panel results
+are checked to be identical first.
+"""
+import argparse
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import print_table
+
+import numpy as np
+
+import app
+import forecaster
+from forecaster import forecast, forecast_many
+
+TODAY = '2025-12-31'
+
+
+def panel(n, min_days, max_days, days, seed=0):
+    """n (history, days, holidays) series ending at TODAY."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for length in rng.integers(min_days, max_days + 1, n):
+        t = np.arange(length)
+        dates = (np.datetime64(TODAY) - t[::-1]).astype(str)
+        level = rng.uniform(10, 200)
+        prices = level * (1 + 0.0005 * t + 0.05 * np.sin(2 * np.pi * (t + rng.integers(7)) / 7)
+                          + rng.normal(0, 0.02, length))
+        out.append(([{'date': d, 'price': round(float(p), 2)} for d, p in zip(dates, prices)], days, ()))
+    return out
+
+
+def seconds(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--series', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--days', type=int, default=7, help='forecast length')
+    parser.add_argument('--min-days', type=int, default=60)
+    parser.add_argument('--max-days', type=int, default=365)
+    parser.add_argument('--processes', type=int, default=0, help='also time a pool of this many workers')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    table = []
+    for n in args.series:
+        series = panel(n, args.min_days, args.max_days, args.days)
+        assert forecast_many(series, today=TODAY) == [forecast(*s, today=TODAY) for s in series]
+        repeat = args.repeat if n <= 1000 else 1
+        loop = seconds(lambda: [forecast(*s, today=TODAY) for s in series], repeat)
+        together = seconds(lambda: forecast_many(series, today=TODAY), repeat)
+        row = [n, f'{loop * 1e3:,.1f}', f'{together * 1e3:,.1f}', f'{loop / together:.1f}x']
+        if args.processes:
+            forecast_many(series[:2 * args.processes], today=TODAY, processes=args.processes)  # start workers
+            pooled = seconds(lambda: forecast_many(series, today=TODAY, processes=args.processes), repeat)
+            row.append(f'{pooled * 1e3:,.1f}')
+        body = {'days': args.days, 'inputs': [{'id': str(i), 'historical_prices': h}
+                                               for i, (h, _, _) in enumerate(series)]}
+        request = seconds(lambda: client.post('/predict/batch', json=body), repeat)
+        row += [f'{request * 1e3:,.1f}', f'{request / n * 1e3:.3f}']
+        table.append(row)
+        print(f'[bench] {n} series done')
+
+    headers = ['series', 'loop ms', 'panel ms', 'speedup']
+    if args.processes:
+        headers.append(f'{args.processes} processes ms')
+    print_table(headers + ['POST /predict/batch ms', 'ms per series'], table)
+    print(f'\npanel budget {forecaster.PANEL_BUDGET:,} values, {args.min_days}-{args.max_days} days per series')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Cost per /predict call of refitting the whole history against updating the
+incremental forecast state (forecast_state.py) with the newest day.
+
+    python benchmarks/bench_forecast_state.py [--days 7]
+
+Per history length, for a call that brings one new day:
+- refit: forecast() of the whole history, what /predict does without state;
+- resent: the state takes the same whole history but only adds the new day;
+- new day only: the client sends just the new point;
+- add(): the O(1) update alone, and forecasting from the state alone;
+and the whole request through Flask's test client for the first three.
+Every call starts from a copy of the state of the day before.
+"""
+import argparse
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, print_table
+
+import numpy as np
+
+import app
+from forecast_state import ForecastStateStore
+from forecaster import forecast
+
+from bench_forecast import TODAY, history
+
+LENGTHS = (30, 90, 365, 1095)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=7, help='forecast length')
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    # The state is off by default; give the app one to measure
+    app._forecast_state = ForecastStateStore(maxsize=100)
+    table = []
+    for n in LENGTHS:
+        points = history(n + 1)
+        old, new = points[:-1], points[-1:]
+        store = ForecastStateStore()
+        store.observe('tomato:Pune', old)
+        before = store.get('tomato:Pune')
+
+        def observe(posted):
+            # Every call starts from the state of the day before
+            store.put('tomato:Pune', before.copy())
+            return store.observe('tomato:Pune', posted)
+
+        day = int(np.datetime64(TODAY, 'D').astype(np.int64)) + 1
+        steps = [
+            best_of(lambda: forecast(points, args.days, today=TODAY), number=50),
+            best_of(lambda: observe(points).forecast(args.days, today=TODAY), number=50),
+            best_of(lambda: observe(new).forecast(args.days, today=TODAY), number=50),
+            best_of(lambda: before.copy().add(day, 42.0), number=500),
+            best_of(lambda: before.forecast(args.days, today=TODAY), number=200),
+        ]
+
+        body = {'crop': 'tomato', 'location': 'Pune', 'days': args.days}
+        requests = []
+        for posted, stateful in ((points, False), (points, True), (new, True)):
+            app._forecast_state.maxsize = 100 if stateful else 0
+
+            def post():
+                if stateful:
+                    app._forecast_state.put('tomato:Pune', before.copy())
+                return client.post('/predict', json={**body, 'historical_prices': posted})
+            requests.append(best_of(post, number=20))
+        table.append([n, *(f'{s * 1e3:.3f}' for s in steps), *(f'{s * 1e3:.2f}' for s in requests)])
+
+    print_table(['history days', 'refit ms', 'resent ms', 'new day ms', 'add() ms', 'state forecast ms',
+                 'POST refit ms', 'POST resent ms', 'POST new day ms'], table)
+
+
+if __name__ == '__main__':
+    main()
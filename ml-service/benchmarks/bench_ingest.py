@@ -0,0 +1,157 @@
+"""
+Throughput of NDJSON price ingestion (/ingest/prices) on million-row replays.
+
+    python benchmarks/bench_ingest.py [--rows 1000000] [--series 1000] [--batch 5000]
+    python benchmarks/bench_ingest.py --url http://127.0.0.1:5001 --rows 1000000
+
+The replay is a date-ordered PriceHistory export: every day, one record per
+series (--series crop/region pairs, two markets each for --markets 2).
+
+In process it times parsing and coercing the records alone, then the whole
+ingest() into a fresh state, and reports rows per second. Over HTTP it
+starts the service (or uses --url), streams the replay as a chunked request
+without building it in memory, and reports the rows per second seen by the
+client, the acknowledgements received and the peak resident memory of the
+server.
+"""
+import argparse
+import http.client
+import io
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import print_table, serve
+
+import numpy as np
+
+from forecast_state import ForecastStateStore
+from price_ingest import coerce, ingest, ndjson_lines
+
+CROPS = ('tomato', 'onion', 'potato', 'rice', 'wheat', 'maize', 'cotton', 'chilli', 'garlic', 'banana')
+
+
+def replay(rows, series, markets, seed=0):
+    """Encoded NDJSON lines of a date-ordered replay, generated as they are consumed."""
+    rng = np.random.default_rng(seed)
+    names = [(CROPS[i % len(CROPS)], f'Region {i // len(CROPS)}') for i in range(series)]
+    levels = rng.uniform(10, 200, series)
+    start = np.datetime64('2023-01-01')
+    n = 0
+    day = 0
+    while n < rows:
+        date = str(start + day)
+        noise = rng.normal(0, 0.03, series)
+        for (crop, region), level, e in zip(names, levels, noise):
+            for market in range(markets):
+                if n == rows:
+                    return
+                price = level * (1 + 0.0003 * day + e)
+                yield (f'{{"cropName":"{crop}","region":"{region}","market_name":"M{market}",'
+                       f'"price":{price:.2f},"date":"{date}T00:00:00.000Z"}}\n').encode()
+                n += 1
+        day += 1
+
+
+def chunks(lines, size=1 << 16):
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def in_process(args):
+    body = b''.join(replay(args.rows, args.series, args.markets))
+    start = time.perf_counter()
+    n = 0
+    for batch in _batches(ndjson_lines(io.BytesIO(body).read), args.batch):
+        n += len(coerce(batch)[0])
+    parse = time.perf_counter() - start
+
+    store = ForecastStateStore(maxsize=args.series)
+    summary = list(ingest(io.BytesIO(body).read, store, args.batch))[-1]
+    return [
+        ['parse + coerce', f'{n:,}', f'{parse:.2f}', f'{n / parse:,.0f}'],
+        ['ingest() into the state', f'{summary["accepted"]:,}', f'{summary["seconds"]:.2f}',
+         f'{summary["rows_per_second"]:,}'],
+    ], len(body)
+
+
+def _batches(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def over_http(args, host, port, proc=None):
+    conn = http.client.HTTPConnection(host, port, timeout=600)
+    start = time.perf_counter()
+    conn.request('POST', f'/ingest/prices?batch={args.batch}',
+                 body=chunks(replay(args.rows, args.series, args.markets)),
+                 headers={'Content-Type': 'application/x-ndjson'}, encode_chunked=True)
+    sent = time.perf_counter() - start
+    res = conn.getresponse()
+    if res.status != 200:
+        raise SystemExit(f'/ingest/prices answered {res.status}: {res.read()[:200]!r}')
+    acks = [json.loads(line) for line in res.read().splitlines()]
+    elapsed = time.perf_counter() - start
+    summary = acks[-1]
+    if 'error' in summary:
+        raise SystemExit(f'ingestion stopped: {summary["error"]}')
+    row = ['POST /ingest/prices', f'{summary["accepted"]:,}', f'{elapsed:.2f}', f'{summary["rows"] / elapsed:,.0f}']
+    notes = [f'{len(acks) - 1} batch acknowledgements; body sent in {sent:.2f} s; '
+             f'server-side {summary["rows_per_second"]:,} rows/s']
+    if proc is not None:
+        notes.append(f'server peak RSS {_peak_rss_mb(proc.pid):.0f} MB')
+    return row, notes
+
+
+def _peak_rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--series', type=int, default=1000, help='crop/region pairs')
+    parser.add_argument('--markets', type=int, default=2, help='records per series and day')
+    parser.add_argument('--batch', type=int, default=5000, help='records per acknowledged batch')
+    parser.add_argument('--url', help='ingest into a running service (with ML_FORECAST_STATE_SIZE set)')
+    args = parser.parse_args()
+
+    table, size = in_process(args)
+    notes = [f'{args.rows:,} rows, {size / 1e6:.0f} MB of NDJSON, {args.series} series, '
+             f'{args.markets} markets per series']
+    if args.url:
+        target = urlsplit(args.url)
+        row, more = over_http(args, target.hostname, target.port or 80)
+    else:
+        with serve({'ML_FORECAST_STATE_SIZE': str(args.series)}) as (host, port, proc):
+            row, more = over_http(args, host, port, proc)
+    table.append(row)
+    print_table(['step', 'rows', 'seconds', 'rows/s'], table)
+    print('\n' + '\n'.join(notes + more))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
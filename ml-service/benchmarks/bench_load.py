@@ -0,0 +1,198 @@
+"""
+Load test of the service: throughput, latency percentiles and error rates
+for a mix of requests, as JSON that can be compared across commits.
+
+    python benchmarks/bench_load.py > before.json
+    python benchmarks/bench_load.py --compare before.json > after.json
+
+Request bodies are drawn from Crop_recommendation.csv (/recommend-crop,
+/predict) and the fertilizer dataset embedded in train_model.py
+(/recommend-fertilizer), in the proportions given by --mix.
+
+By default every configuration starts its own service. `--workers N ...`
+runs it under gunicorn with that many workers (otherwise Flask's threaded
+server), and each configuration is also run for every `--xgb-threads` value
+and every `--concurrency` level. `--url` targets a service that is already
+running instead; then only concurrency is swept.
+
+The table goes to stderr; the JSON on stdout holds the commit, machine and
+arguments of the run and, per configuration, the overall and per-route
+results of run_load.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import ML_SERVICE_DIR, crop_requests, fertilizer_requests, print_table, run_load, serve
+
+GUNICORN = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+            '--bind', '127.0.0.1:{port}', 'app:app']
+
+ROUTES = {
+    'crop': '/recommend-crop',
+    'fertilizer': '/recommend-fertilizer',
+    'predict': '/predict',
+}
+
+
+def parse_mix(text):
+    """'crop=45,fertilizer=45,predict=10' → {'crop': 45.0, ...}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(f'unknown request type {name!r} (expected one of {sorted(ROUTES)})')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def parse_env(text):
+    key, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f'expected KEY=VALUE, got {text!r}')
+    return key, value
+
+
+def request_mix(mix, n, seed):
+    """n (path, body) pairs drawn in the proportions of `mix`."""
+    crops = crop_requests()
+    pools = {
+        'crop': crops,
+        'fertilizer': fertilizer_requests(),
+        'predict': [{'crop': label} for label in _crop_labels()],
+    }
+    rng = random.Random(seed)
+    names = rng.choices(list(mix), weights=list(mix.values()), k=n)
+    return [(ROUTES[name], rng.choice(pools[name])) for name in names]
+
+
+def _crop_labels():
+    with open(os.path.join(ML_SERVICE_DIR, 'Crop_recommendation.csv'), newline='') as f:
+        return sorted({row['label'] for row in csv.DictReader(f)})
+
+
+def run_info(args):
+    def git(*cmd):
+        try:
+            return subprocess.run(['git', *cmd], cwd=ML_SERVICE_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'args': {**{k: v for k, v in vars(args).items() if k != 'compare'}, 'env': dict(args.env)},
+    }
+
+
+def configurations(args):
+    """(config, env, command) per service to start; a single None service with --url."""
+    if args.url:
+        return [({'target': args.url}, None, None)]
+    out = []
+    for workers in args.workers or [None]:
+        for xgb_threads in args.xgb_threads:
+            env = {**dict(args.env), 'ML_XGB_THREADS': str(xgb_threads)}
+            config = {'server': 'gunicorn' if workers else 'flask', 'workers': workers or 1,
+                      'xgb_threads': xgb_threads}
+            if workers:
+                env['ML_WORKERS'] = str(workers)
+            out.append((config, env, GUNICORN if workers else None))
+    return out
+
+
+def sweep(args, requests):
+    runs = []
+    for config, env, command in configurations(args):
+        if args.url:
+            target = urlsplit(args.url)
+            runs += measure(args, requests, config, target.hostname, target.port or 80)
+            continue
+        print(f'[load] starting {config}', file=sys.stderr)
+        with serve(env, command) as (host, port, _):
+            runs += measure(args, requests, config, host, port)
+    return runs
+
+
+def measure(args, requests, config, host, port):
+    runs = []
+    for concurrency in args.concurrency:
+        if args.warmup:
+            run_load(host, port, requests, concurrency, args.warmup)
+        result = run_load(host, port, requests, concurrency, args.duration)
+        runs.append({'config': {**config, 'concurrency': concurrency}, 'result': result})
+        print(f'[load] {runs[-1]["config"]}: {result["throughput"]} req/s, '
+              f'p99 {result["latency_ms"]["p99"]} ms, {result["errors"]} errors', file=sys.stderr)
+    return runs
+
+
+def config_key(config):
+    return tuple(sorted((k, str(v)) for k, v in config.items()))
+
+
+def report(runs, baseline=None):
+    previous = {config_key(r['config']): r['result'] for r in (baseline or {}).get('runs', [])}
+    headers = ['server', 'workers', 'xgb', 'clients', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors']
+    if previous:
+        headers += ['Δ req/s', 'Δ p99']
+    table = []
+    for run in runs:
+        c, r = run['config'], run['result']
+        lat = r['latency_ms']
+        row = [c.get('server', c.get('target')), c.get('workers', '-'), c.get('xgb_threads', '-'),
+               c['concurrency'], f'{r["throughput"]:,.0f}', lat['p50'], lat['p95'], lat['p99'],
+               f'{r["error_rate"]:.2%}']
+        if previous:
+            old = previous.get(config_key(c))
+            row += ([f'{r["throughput"] / old["throughput"] - 1:+.1%}',
+                     f'{lat["p99"] / old["latency_ms"]["p99"] - 1:+.1%}']
+                    if old and old['throughput'] and old['latency_ms']['p99'] else ['', ''])
+        table.append(row)
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        print_table(headers, table)
+    finally:
+        sys.stdout = stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='load a running service (e.g. http://127.0.0.1:5001) instead of starting one')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('crop=45,fertilizer=45,predict=10'),
+                        help='request types and weights (default: crop=45,fertilizer=45,predict=10)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--workers', type=int, nargs='+',
+                        help='gunicorn worker counts (default: one Flask server process)')
+    parser.add_argument('--xgb-threads', type=int, nargs='+', default=[1])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds measured per run')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds of unmeasured load before each run')
+    parser.add_argument('--requests', type=int, default=5000, help='distinct requests in the replayed mix')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--env', type=parse_env, action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for started services, e.g. ML_CACHE_SIZE=0')
+    parser.add_argument('--compare', type=argparse.FileType(), metavar='RESULTS.json',
+                        help='print changes against an earlier run of the same configurations')
+    args = parser.parse_args()
+    if args.url and (args.workers or args.xgb_threads != [1] or args.env):
+        parser.error('--workers, --xgb-threads and --env only apply to services started by this script')
+
+    info = run_info(args)
+    runs = sweep(args, request_mix(args.mix, args.requests, args.seed))
+    report(runs, json.load(args.compare) if args.compare else None)
+    json.dump({**info, 'runs': runs}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Cost of recording metrics: the sharded registry versus one global lock.
+
+    python benchmarks/bench_metrics.py [--threads 1 8 32] [--records 200000]
+
+Each thread records `--records` histogram observations plus counter
+increments, the work one request stage does. The locked baseline is the
+usual dict-of-lists registry guarded by a single threading.Lock.
+"""
+import argparse
+import bisect
+import threading
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import print_table
+
+from metrics import DEFAULT_BUCKETS, Metrics
+
+
+class LockedMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.values, self.histograms = {}, {}
+        self.lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        with self.lock:
+            self.values[(name, labels)] = self.values.get((name, labels), 0) + value
+
+    def observe(self, name, labels, seconds):
+        with self.lock:
+            slot = self.histograms.get((name, labels))
+            if slot is None:
+                slot = self.histograms[(name, labels)] = [0] * (len(self.buckets) + 1) + [0.0]
+            slot[bisect.bisect_left(self.buckets, seconds)] += 1
+            slot[-1] += seconds
+
+
+def run(metrics, threads, records):
+    labels = (('route', '/recommend-crop'), ('stage', 'predict'))
+    counter = (('model', 'crop'), ('source', 'model'))
+
+    def work():
+        for i in range(records):
+            metrics.observe('ml_stage_seconds', labels, (i % 100) * 1e-4)
+            metrics.inc('ml_predictions_total', counter)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return elapsed / (threads * records) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    table = []
+    for threads in args.threads:
+        records = args.records // threads
+        sharded = min(run(Metrics(), threads, records) for _ in range(3))
+        locked = min(run(LockedMetrics(), threads, records) for _ in range(3))
+        table.append([threads, f'{locked:.0f}', f'{sharded:.0f}', f'{locked / sharded:.2f}x'])
+    print_table(['threads', 'single lock ns/record', 'sharded ns/record', 'speedup'], table)
+
+
+if __name__ == '__main__':
+    main()
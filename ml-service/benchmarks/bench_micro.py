@@ -0,0 +1,218 @@
+"""
+Micro-benchmarks of each step of the request path, with a stored baseline.
+
+    python benchmarks/bench_micro.py                  # run and print
+    python benchmarks/bench_micro.py --save           # run and store as the baseline
+    python benchmarks/bench_micro.py --compare        # run, compare, exit 1 on regressions
+    python benchmarks/bench_micro.py --filter predict --compare --threshold 0.4
+
+Steps: request encoding (fertilizer and crop rows), predict_proba of the
+served scorer at several batch sizes, top-3 selection, label decoding and
+building the response body. Each is timed in process as the best of several
+repeats.
+
+Shared and virtual machines change speed from one minute to the next (we
+measured the same build 2x apart on consecutive runs), so every step is
+also timed relative to a fixed reference workload measured right before
+it. Comparisons use that ratio, which stays put when the whole machine
+slows down but moves when the step itself does. The raw microseconds are
+printed too, and are what to quote.
+
+The baseline (benchmarks/micro_baseline.json by default) records the commit
+and machine it was taken on. Ratios carry across similar machines much
+better than raw times, but a baseline from the machine at hand is best.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import ML_SERVICE_DIR, best_of, crop_requests, cycle, fertilizer_requests, print_table
+
+import numpy as np
+
+import app
+from response_body import batch_body
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'micro_baseline.json')
+BATCH_SIZES = (1, 8, 64, 512)
+
+# Target wall time of one repeat, used to pick how many calls it makes
+REPEAT_SECONDS = 0.02
+
+
+def cases():
+    """{name: zero-argument callable} for every benchmarked step."""
+    fertilizer, crop = app._models.fertilizer, app._models.crop
+    fertilizer_rows = cycle(fertilizer_requests(), max(BATCH_SIZES))
+    crop_rows = cycle(crop_requests(), max(BATCH_SIZES))
+    out = {
+        'encode/fertilizer/1': lambda: fertilizer.codec.encode(fertilizer_rows[0]),
+        'encode/crop/1': lambda: crop.codec.encode(crop_rows[0]),
+        'encode/fertilizer/64': lambda: fertilizer.codec.encode_rows(fertilizer_rows[:64]),
+        'encode/crop/64': lambda: crop.codec.encode_rows(crop_rows[:64]),
+    }
+    for served, rows in ((fertilizer, fertilizer_rows), (crop, crop_rows)):
+        X = served.codec.encode_rows(rows)
+        for n in BATCH_SIZES:
+            out[f'predict_proba/{served.name}/{n}'] = (lambda X=X[:n], s=served: s.scorer.predict_proba(X))
+        proba = served.scorer.predict_proba(X)
+        for n in (1, 64):
+            out[f'top3/{served.name}/{n}'] = (lambda p=proba[:n]: app.top_k(p))
+        out[f'decode/{served.name}/1'] = (lambda i=app.top_k(proba[:1])[0][0], s=served: s.codec.decode(i))
+
+    X = fertilizer.codec.encode_rows(fertilizer_rows)
+    f_idx, f_conf = app.top_k(fertilizer.scorer.predict_proba(X))
+    out['serialize/fertilizer/1'] = lambda: app.fertilizer_result(fertilizer, fertilizer_rows[0], f_idx[0], f_conf[0])
+    out['serialize/fertilizer/64'] = lambda: batch_body([
+        app.fertilizer_result(fertilizer, d, i, c) for d, i, c in zip(fertilizer_rows[:64], f_idx, f_conf)])
+
+    X = crop.codec.encode_rows(crop_rows)
+    c_idx, c_conf = app.top_k(crop.scorer.predict_proba(X))
+    row = X[0].tolist()
+    out['serialize/crop/1'] = lambda: app.crop_result(crop, row, c_idx[0], c_conf[0])
+    return out
+
+
+def reference():
+    """Fixed mix of interpreter and NumPy work the steps are timed against."""
+    total = 0
+    for i in range(2000):
+        total += i * i
+    _REFERENCE_MATRIX.sum(axis=1).argmax()
+    return total
+
+
+_REFERENCE_MATRIX = np.arange(64 * 24, dtype=np.float64).reshape(64, 24)
+
+
+def measure(fn, repeat):
+    """Best seconds per call of fn, with enough calls per repeat to be timeable.
+
+    Garbage collection is off while timing, as in timeit, so a collection
+    triggered by earlier steps doesn't land in this one.
+    """
+    start = time.perf_counter()
+    fn()
+    once = max(time.perf_counter() - start, 1e-7)
+    number = max(1, int(REPEAT_SECONDS / once))
+    gc.disable()
+    try:
+        return best_of(fn, repeat=repeat, number=number)
+    finally:
+        gc.enable()
+
+
+def machine():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ML_SERVICE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import xgboost
+    return {
+        'commit': commit,
+        'taken_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'host': platform.node(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'xgboost': xgboost.__version__,
+        'scoring_backend': app._models.fertilizer.scorer.backend,
+    }
+
+
+def run(steps, repeat, rounds):
+    """{name: {'seconds': ..., 'relative': seconds / reference seconds}}
+
+    Every step is measured once per round, the rounds one after the other so
+    a slow spell of the machine hits one round rather than all of them, and
+    the fastest of its rounds is kept.
+    """
+    results = {}
+    for _ in range(rounds):
+        for name, fn in steps:
+            ref = measure(reference, 5)
+            seconds = measure(fn, repeat)
+            best = results.setdefault(name, {'seconds': seconds, 'relative': seconds / ref})
+            best['seconds'] = min(best['seconds'], seconds)
+            best['relative'] = min(best['relative'], seconds / ref)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Table rows against the baseline and the names whose relative time grew by more than threshold."""
+    rows, regressions = [], []
+    for name, now in results.items():
+        old = baseline.get(name)
+        seconds = now['seconds']
+        if old is None:
+            rows.append([name, '', f'{seconds * 1e6:,.2f}', 'new'])
+            continue
+        change = now['relative'] / old['relative'] - 1
+        flag = ''
+        if change > threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = 'faster'
+        rows.append([name, f'{old["seconds"] * 1e6:,.2f}', f'{seconds * 1e6:,.2f}',
+                     f'{change:+.1%} {flag}'.rstrip()])
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filter', default='', help='only run steps whose name contains this')
+    parser.add_argument('--repeat', type=int, default=15, help='timed repeats per step and round')
+    parser.add_argument('--rounds', type=int, default=3, help='passes over all steps; the best is kept')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--save', action='store_true', help='store the results as the baseline')
+    mode.add_argument('--compare', action='store_true', help='compare with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='growth of the relative time reported as a regression (default 0.25 = 25%%)')
+    args = parser.parse_args()
+
+    steps = [(name, fn) for name, fn in cases().items() if args.filter in name]
+    results = run(steps, args.repeat, args.rounds)
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"baseline: commit {baseline['machine']['commit']} on {baseline['machine']['host']}, "
+              f"{baseline['machine']['taken_at']}")
+        rows, regressions = compare(results, baseline['steps'], args.threshold)
+        if regressions:
+            # Measure suspects again before failing: one slow spell shouldn't fail a run
+            retry = run([(name, fn) for name, fn in steps if name in regressions], args.repeat, args.rounds)
+            for name, again in retry.items():
+                results[name] = {k: min(v, again[k]) for k, v in results[name].items()}
+            rows, regressions = compare(results, baseline['steps'], args.threshold)
+        print_table(['step', 'baseline µs', 'now µs', 'relative change'], rows)
+        if regressions:
+            print(f'\n{len(regressions)} step(s) slower than the baseline by more than '
+                  f'{args.threshold:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+        return
+
+    print_table(['step', 'µs', 'x reference'],
+                [[name, f'{r["seconds"] * 1e6:,.2f}', f'{r["relative"]:.3f}'] for name, r in results.items()])
+    if args.save:
+        steps = results
+        if args.filter and os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                steps = {**json.load(f)['steps'], **results}
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': machine(), 'steps': steps}, f, indent=2)
+            f.write('\n')
+        print(f'\nbaseline written to {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Memory per worker and throughput of the gunicorn launcher (gunicorn.conf.py).
+
+    python benchmarks/bench_prefork.py [--workers 1 2 4 8] [--duration 8]
+
+For each worker count the service is started with the models preloaded in
+the master (copy-on-write sharing) and, for comparison, loaded in every
+worker. Memory is read from /proc after the load phase:
+
+  RSS  resident pages, shared ones counted in full in every process
+  PSS  resident pages with shared ones split evenly between their users
+  USS  pages private to the worker (what each extra worker really costs)
+"""
+import argparse
+import os
+import sys
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import crop_requests, print_table, run_load, serve
+
+GUNICORN = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+            '--bind', '127.0.0.1:{port}', 'app:app']
+
+
+def children(pid):
+    out = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        out.append(int(entry))
+            except OSError:
+                pass
+    return out
+
+
+def memory_mb(pid):
+    """(RSS, PSS, USS) of a process in MB."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    return tuple(round(v / 1024, 1) for v in (fields['Rss'], fields['Pss'], uss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=8.0)
+    args = parser.parse_args()
+
+    requests = [('/recommend-crop', body) for body in crop_requests()]
+    table = []
+    for workers in args.workers:
+        for preload in ('1', '0'):
+            env = {'ML_WORKERS': str(workers), 'ML_PRELOAD': preload,
+                   'ML_CACHE_SIZE': '0', 'ML_FERTILIZER_TABLE': ''}
+            with serve(env, command=GUNICORN) as (host, port, proc):
+                result = run_load(host, port, requests, args.concurrency, args.duration)
+                mem = [memory_mb(pid) for pid in children(proc.pid)]
+            rss, pss, uss = (round(sum(m[i] for m in mem) / len(mem), 1) for i in range(3))
+            table.append([workers, 'master' if preload == '1' else 'per worker', rss, pss, uss,
+                          round(sum(m[1] for m in mem), 1), f"{result['throughput']:,.0f}",
+                          result['latency_ms']['p99']])
+    print_table(['workers', 'models loaded in', 'RSS MB/worker', 'PSS MB/worker',
+                 'USS MB/worker', 'total PSS MB', 'req/s', 'p99 ms'], table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Overhead of the profiling hooks: off, while sampling, and per profiled request.
+
+    python benchmarks/bench_profiler.py [--duration 6] [--concurrency 16]
+
+off         in-process /recommend-crop latency with the profiling hooks
+            registered versus removed from the app (what every request pays
+            when nobody is profiling)
+sampling    served throughput while /admin/profile samples at 5 ms and 1 ms
+            intervals, versus no profile running
+X-Profile   in-process latency of a request profiled with cProfile
+"""
+import argparse
+import http.client
+import threading
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, crop_requests, print_table, run_load, serve
+
+import app
+
+HOOKS = (
+    (app.app.before_request_funcs, app.start_request_profile),
+    (app.app.after_request_funcs, app.finish_request_profile),
+    (app.app.teardown_request_funcs, app.untrack_request_thread),
+)
+
+
+def request_latency(client, body, headers=None, number=500):
+    return best_of(lambda: client.post('/recommend-crop', json=body, headers=headers),
+                   repeat=7, number=number)
+
+
+def in_process(table):
+    client = app.app.test_client()
+    body = crop_requests()[0]
+    with_hooks = request_latency(client, body)
+    for registry, hook in HOOKS:
+        registry[None].remove(hook)
+    try:
+        without = request_latency(client, body)
+    finally:
+        for registry, hook in HOOKS:
+            registry[None].append(hook)
+    profiled = request_latency(client, body, {'X-Profile': '1'}, number=100)
+    table.append(['off: hooks removed', f'{without * 1e6:.1f} µs/request', ''])
+    table.append(['off: hooks registered', f'{with_hooks * 1e6:.1f} µs/request',
+                  f'{(with_hooks - without) * 1e6:+.1f} µs'])
+    table.append(['X-Profile: 1', f'{profiled * 1e6:.1f} µs/request',
+                  f'{(profiled - with_hooks) * 1e6:+.1f} µs'])
+
+
+def profile_while(host, port, seconds, interval_ms, out):
+    conn = http.client.HTTPConnection(host, port, timeout=seconds + 30)
+    conn.request('GET', f'/admin/profile?seconds={seconds}&interval_ms={interval_ms}')
+    res = conn.getresponse()
+    out.append((res.status, int(res.getheader('X-Profile-Ticks', 0)), len(res.read().splitlines())))
+
+
+def under_load(table, duration, concurrency):
+    requests = [('/recommend-crop', body) for body in crop_requests()]
+    with serve({'ML_CACHE_SIZE': '0'}) as (host, port, _):
+        base = run_load(host, port, requests, concurrency, duration)['throughput']
+        table.append(['no profile running', f'{base:,.0f} req/s', ''])
+        for interval_ms in (5, 1):
+            out = []
+            sampler = threading.Thread(target=profile_while,
+                                       args=(host, port, duration, interval_ms, out))
+            sampler.start()
+            rps = run_load(host, port, requests, concurrency, duration)['throughput']
+            sampler.join()
+            status, ticks, stacks = out[0]
+            assert status == 200, status
+            table.append([f'sampling every {interval_ms} ms ({ticks} ticks, {stacks} stacks)',
+                          f'{rps:,.0f} req/s', f'{(rps / base - 1) * 100:+.1f}%'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=6.0)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    table = []
+    in_process(table)
+    under_load(table, args.duration, args.concurrency)
+    print_table(['configuration', 'cost', 'difference'], table)
+
+
+if __name__ == '__main__':
+    main()
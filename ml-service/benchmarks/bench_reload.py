@@ -0,0 +1,61 @@
+"""
+Load test across hot reloads: latency and errors before, during and after.
+
+    python benchmarks/bench_reload.py [--concurrency 16] [--duration 8] [--interval 0.5]
+
+Drives /recommend-crop and /recommend-fertilizer (cache and table off, so
+every request reaches a model) for three equal phases. During the middle
+one a client keeps forcing full reloads through POST /admin/reload, one
+after another with `--interval` seconds between them.
+"""
+import argparse
+import http.client
+import threading
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import crop_requests, fertilizer_requests, print_table, run_load, serve
+
+
+def keep_reloading(host, port, interval, stop, durations):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.request('POST', '/admin/reload?force=1&wait=1')
+        res = conn.getresponse()
+        res.read()
+        assert res.status == 200, res.status
+        durations.append(time.perf_counter() - start)
+        stop.wait(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=8.0, help='seconds per phase')
+    parser.add_argument('--interval', type=float, default=0.5)
+    args = parser.parse_args()
+
+    requests = ([('/recommend-crop', body) for body in crop_requests()[:500]]
+                + [('/recommend-fertilizer', body) for body in fertilizer_requests()[:500]])
+    table, durations = [], []
+    with serve({'ML_CACHE_SIZE': '0', 'ML_FERTILIZER_TABLE': ''}) as (host, port, _):
+        for phase in ('before', 'reloading', 'after'):
+            stop = threading.Event()
+            reloader = None
+            if phase == 'reloading':
+                reloader = threading.Thread(target=keep_reloading,
+                                            args=(host, port, args.interval, stop, durations))
+                reloader.start()
+            r = run_load(host, port, requests, args.concurrency, args.duration)
+            stop.set()
+            if reloader:
+                reloader.join()
+            table.append([phase, r['requests'], f"{r['throughput']:,.0f}", r['latency_ms']['p50'],
+                          r['latency_ms']['p99'], r['latency_ms']['max'], r['errors']])
+    print_table(['phase', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'max ms', 'errors'], table)
+    print(f"\n{len(durations)} full reloads, {sum(durations) / len(durations) * 1000:.0f} ms each on average")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Rows per second of offline file scoring (score_file.py) by worker count.
+
+    python benchmarks/bench_score_file.py [--rows 1000000] [--workers 1 2 4 0] [--model crop]
+
+Writes a CSV of --rows soil tests (Crop_recommendation.csv repeated with a
+little noise, or the fertilizer dataset) to a temporary directory, scores it
+with each worker count (0 scores in process) and reports rows per second,
+the speedup over one worker and the peak resident memory of the reading
+process and of the largest worker. Reading the CSV alone is timed too: the
+reading process is the serial part, so workers scale until they score
+faster than it reads. The default worker counts go up to the
+CPUs this process may use.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import ML_SERVICE_DIR, print_table
+
+import numpy as np
+import pandas as pd
+
+from score_file import read_chunks, score_file
+
+
+def write_input(path, model, rows, seed=0):
+    if model == 'crop':
+        base = pd.read_csv(os.path.join(ML_SERVICE_DIR, 'Crop_recommendation.csv')).drop(columns='label')
+    else:
+        from io import StringIO
+        from train_model import EMBEDDED_DATA
+        base = pd.read_csv(StringIO(EMBEDDED_DATA))
+    rng = np.random.default_rng(seed)
+    with open(path, 'w', newline='') as f:
+        for start in range(0, rows, 100_000):
+            part = base.sample(min(100_000, rows - start), replace=True, random_state=rng.integers(1 << 31))
+            numeric = part.select_dtypes('number').columns
+            part[numeric] = part[numeric] * rng.normal(1, 0.05, (len(part), len(numeric)))
+            part.to_csv(f, header=start == 0, index=False, float_format='%.3f')
+    return os.path.getsize(path)
+
+
+def _status_kb(pid, field):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _descendants(root):
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rpartition(')')[2].split()[1])
+            except OSError:
+                pass
+    found, frontier = set(), {root}
+    while frontier:
+        frontier = {pid for pid, parent in parents.items() if parent in frontier} - found
+        found |= frontier
+    return found
+
+
+class PeakWorkerMemory:
+    """Largest resident memory of any process below this one while active."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            for pid in _descendants(os.getpid()):
+                self.peak_kb = max(self.peak_kb, _status_kb(pid, 'VmRSS:'))
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main():
+    cpus = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[*sorted({1, *(2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus), cpus}), 0],
+                        help='0 loads the model into this process, so run it last for a fair reader peak')
+    parser.add_argument('--model', choices=['crop', 'fertilizer'], default='crop')
+    parser.add_argument('--chunk-rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'input.csv')
+        size = write_input(source, args.model, args.rows)
+        table, one = [], None
+        for workers in args.workers:
+            # Reset this process's peak RSS (VmHWM) so each run reports its own
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            with PeakWorkerMemory() as workers_peak:
+                report = score_file(args.model, source, os.path.join(tmp, 'output.csv'), workers, args.chunk_rows)
+            rate = report['rows_per_second']
+            if workers == 1:
+                one = rate
+            table.append([workers, f'{report["rows"]:,}', f'{report["seconds"]:.1f}', f'{rate:,}',
+                          f'{rate / one:.2f}x' if one else '-',
+                          f'{_status_kb("self", "VmHWM:") / 1024:.0f}',
+                          f'{workers_peak.peak_kb / 1024:.0f}' if workers else '-'])
+        # The reading process is the serial part: it bounds the speedup
+        start = time.perf_counter()
+        for _ in read_chunks(source, pd.read_csv(source, nrows=0).columns, args.chunk_rows):
+            pass
+        read_rate = args.rows / (time.perf_counter() - start)
+    print_table(['workers', 'rows', 'seconds', 'rows/s', 'vs 1 worker', 'reader peak MB', 'worker peak MB'], table)
+    print(f'\n{args.rows:,} {args.model} rows, {size / 1e6:.0f} MB of CSV, {args.chunk_rows:,}-row chunks, '
+          f'{cpus} CPUs')
+    print(f'reading the CSV alone: {read_rate:,.0f} rows/s ({read_rate / one:.0f}x one worker)' if one else
+          f'reading the CSV alone: {read_rate:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+predict_proba latency per scoring backend (see scoring.py).
+
+    python benchmarks/bench_scoring.py [--sizes 1 64 1000 10000] [--threads 1]
+"""
+import argparse
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, crop_requests, cycle, fertilizer_requests, print_table
+
+import app
+from scoring import BoosterScorer, NumpyScorer, SklearnScorer
+
+
+def bench(name, model, X_all, sizes, threads):
+    scorers = [SklearnScorer(model), BoosterScorer(model, n_threads=threads), NumpyScorer(model)]
+    table = []
+    for size in sizes:
+        X = X_all[:size]
+        number = max(1, 2000 // size)
+        times = [best_of(lambda: s.predict_proba(X), number=number) for s in scorers]
+        table.append([size] + [f'{t * 1e6:,.1f}' for t in times])
+    print(f'\n{name}')
+    print_table(['rows', 'sklearn µs', 'booster µs', 'numpy µs'], table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 64, 1000, 10000])
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    n = max(args.sizes)
+    fertilizer, crop = app._models
+    bench('fertilizer model', fertilizer.model,
+          fertilizer.codec.encode_rows(cycle(fertilizer_requests(), n)), args.sizes, args.threads)
+    bench('crop model', crop.model,
+          crop.codec.encode_rows(cycle(crop_requests(), n)), args.sizes, args.threads)
+
+
+if __name__ == '__main__':
+    main()
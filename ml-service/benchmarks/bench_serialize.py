@@ -0,0 +1,107 @@
+"""
+Per-request cost of building the response body: the dict + jsonify path the
+routes used to take versus the precomputed fragments of response_body.py.
+
+    python benchmarks/bench_serialize.py
+
+Covers decode and serialization only (labels → JSON bytes), on the top-3 the
+model returns for each request; stdlib rows are the fallback used when
+orjson isn't installed.
+"""
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import best_of, crop_requests, cycle, fertilizer_requests, print_table
+
+from flask import jsonify
+
+import app
+import response_body
+from response_body import batch_body
+
+
+def legacy_fertilizer(served, data, idx, conf):
+    """fertilizer_result as it was: a dict rebuilt per request."""
+    names = served.codec.decode(idx)
+    return {
+        'success': True,
+        'input': {key: data.get(key) for key in ('soilType', 'cropType', 'nitrogen', 'phosphorous', 'potassium')},
+        'recommendations': [
+            {'rank': rank + 1, 'fertilizer': str(name), 'confidence': c}
+            for rank, (name, c) in enumerate(zip(names, conf))
+        ],
+        'available_soil_types': served.codec.categories['Soil Type'].tolist(),
+        'available_crop_types': served.codec.categories['Crop Type'].tolist(),
+        'model_version': served.version,
+    }
+
+
+def legacy_crop(served, row, idx, conf):
+    names = served.codec.decode(idx)
+    return {
+        'success': True,
+        'input': {f.key: value for f, value in zip(served.codec.fields, row)},
+        'recommendations': [
+            {'rank': rank + 1, 'crop': str(name).capitalize(), 'confidence': c}
+            for rank, (name, c) in enumerate(zip(names, conf))
+        ],
+        'model_version': served.version,
+    }
+
+
+def with_stdlib(served):
+    """`served` with its fragments encoded by the json module."""
+    responses = app.response_fragments(served.name, served.codec, served.version,
+                                       encode=response_body.stdlib_dumps)
+    return served._replace(responses=responses)
+
+
+def cases(served, legacy, result, rows, echoes):
+    """(name, before, after) callables for one row and a batch of 100."""
+    X = served.codec.encode_rows(rows)
+    idx, conf = app.score_top3(X, served)
+    echo = echoes(rows, X)
+    one = (echo[0], idx[0], conf[0])
+    batch = list(zip(echo, idx, conf))[:100]
+    return [
+        (f'{served.name}: one row',
+         lambda: jsonify(legacy(served, *one)).get_data(),
+         lambda: app.json_response(result(served, *one)).get_data()),
+        (f'{served.name}: batch of 100',
+         lambda: jsonify({'success': True, 'count': len(batch),
+                          'results': [legacy(served, *r) for r in batch]}).get_data(),
+         lambda: app.json_response(batch_body([result(served, *r) for r in batch])).get_data()),
+    ]
+
+
+def main():
+    models = app._models
+    fertilizer_rows = cycle(fertilizer_requests(), 100)
+    crop_rows = cycle(crop_requests(), 100)
+    table = []
+    with app.app.test_request_context():
+        for label, dumps in (('orjson', response_body.dumps), ('stdlib', response_body.stdlib_dumps)):
+            if label == 'orjson' and response_body.orjson is None:
+                continue
+            app.dumps = dumps
+            fertilizer = models.fertilizer if label == 'orjson' else with_stdlib(models.fertilizer)
+            crop = models.crop if label == 'orjson' else with_stdlib(models.crop)
+            runs = cases(fertilizer, legacy_fertilizer, app.fertilizer_result,
+                         fertilizer_rows, lambda rows, X: rows)
+            runs += cases(crop, legacy_crop, app.crop_result, crop_rows, lambda rows, X: X.tolist())
+            runs.append(('fertilizer: one row, lean', runs[0][1],
+                         lambda: app.json_response(app.fertilizer_result(
+                             fertilizer, fertilizer_rows[0], [0, 1, 2], [50.0, 30.0, 20.0], lean=True)).get_data()))
+            for name, before, after in runs:
+                number = 20 if 'batch' in name else 2000
+                b = best_of(before, number=number)
+                a = best_of(after, number=number)
+                table.append([f'{name} ({label})', f'{b * 1e6:,.1f}', f'{a * 1e6:,.1f}', f'{b / a:.1f}x'])
+        app.dumps = response_body.dumps
+    print_table(['response', 'dict + jsonify µs', 'fragments µs', 'speedup'], table)
+
+    full, lean = (len(app.fertilizer_result(models.fertilizer, fertilizer_rows[0], [0, 1, 2],
+                                            [50.0, 30.0, 20.0], lean=lean)) for lean in (False, True))
+    print(f'\n/recommend-fertilizer body: {full} bytes full, {lean} bytes lean')
+
+
+if __name__ == '__main__':
+    main()
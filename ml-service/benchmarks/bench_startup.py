@@ -0,0 +1,90 @@
+"""
+Cold-start cost of the service in each ML_LOAD_MODE.
+
+    python benchmarks/bench_startup.py [--repeat 3] [--service-dir DIR]
+
+import:  seconds for `import app` in a fresh interpreter
+health:  seconds from spawning the server to the first 200 from /health
+first prediction: seconds from spawning the server to the first 200 from
+         /recommend-crop and then /recommend-fertilizer
+
+--service-dir points at another checkout of ml-service (e.g. a git worktree
+of an older commit) to measure a "before" build with the same harness.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import ML_SERVICE_DIR, free_port, print_table
+
+IMPORT_SCRIPT = ('import time; start = time.perf_counter(); import app; '
+                 'import sys; print(time.perf_counter() - start, '
+                 '",".join(m for m in ("pandas", "sklearn", "xgboost") if m in sys.modules))')
+SERVER_SCRIPT = 'import app; app.app.run(host="127.0.0.1", port={port}, threaded=True)'
+
+
+def time_import(service_dir, env):
+    out = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=service_dir, env=env,
+                         capture_output=True, text=True, check=True).stdout.splitlines()[-1].split()
+    return float(out[0]), out[1] if len(out) > 1 else '-'
+
+
+def request(port, method, path, body=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={'Content-Type': 'application/json'})
+    return conn.getresponse().status
+
+
+def time_first_responses(service_dir, env):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT.format(port=port)], cwd=service_dir,
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if request(port, 'GET', '/health') == 200:
+                    break
+            except OSError:
+                time.sleep(0.01)
+        health = time.perf_counter() - start
+        assert request(port, 'POST', '/recommend-crop', {'ph': 6.5}) == 200
+        crop = time.perf_counter() - start
+        assert request(port, 'POST', '/recommend-fertilizer', {'nitrogen': 20}) == 200
+        both = time.perf_counter() - start
+        return health, crop, both
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', default=['eager', 'lazy', 'background'])
+    parser.add_argument('--service-dir', default=ML_SERVICE_DIR)
+    args = parser.parse_args()
+
+    table = []
+    for mode in args.modes:
+        env = {**os.environ, 'ML_LOAD_MODE': mode, 'ML_CACHE_SNAPSHOT': ''}
+        imports = [time_import(args.service_dir, env) for _ in range(args.repeat)]
+        firsts = [time_first_responses(args.service_dir, env) for _ in range(args.repeat)]
+        table.append([
+            mode,
+            round(min(t for t, _ in imports), 3),
+            imports[0][1],
+            *(round(min(f[i] for f in firsts), 3) for i in range(3)),
+        ])
+    print_table(['mode', 'import s', 'heavy modules at import', 'health s',
+                 'first crop s', 'first crop+fertilizer s'], table)
+
+
+if __name__ == '__main__':
+    main()
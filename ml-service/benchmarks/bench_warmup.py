@@ -0,0 +1,104 @@
+"""
+First-request latency after startup, with and without the warm-up (ML_WARMUP).
+
+    python benchmarks/bench_warmup.py [--repeat 5] [--load-mode background]
+
+Three settings, each started --repeat times:
+- traffic once /health answers, no warm-up: how the service was deployed
+  before readiness existed;
+- traffic once /health/ready answers, no warm-up (ML_WARMUP=0: a model is
+  scored on one default row at load, and the forecaster not at all);
+- traffic once /health/ready answers, with the warm-up.
+Each start sends the first request of every route in turn and times it,
+then each route again for the latency once warm. The prediction cache is
+off, so repeated requests are scored again.
+"""
+import argparse
+import http.client
+import io
+import json
+import statistics
+import time
+
+import _common  # noqa: F401  (puts ml-service on sys.path)
+from _common import crop_requests, cycle, fertilizer_requests, print_table, serve
+
+import numpy as np
+
+from bench_forecast import history
+
+
+def npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def route_requests():
+    """(label, path, body bytes, headers) of one request per code path."""
+    crops, fertilizers = crop_requests(), fertilizer_requests()
+    json_headers = {'Content-Type': 'application/json'}
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(20, 120, 512) for _ in range(7)]).astype(np.float32)
+    return [
+        ('POST /recommend-crop', '/recommend-crop', crops[0], json_headers),
+        ('POST /recommend-fertilizer', '/recommend-fertilizer', fertilizers[0], json_headers),
+        ('POST /recommend-crop/batch (64)', '/recommend-crop/batch', {'inputs': cycle(crops, 64)}, json_headers),
+        ('POST /recommend-fertilizer/batch (64)', '/recommend-fertilizer/batch',
+         {'inputs': cycle(fertilizers, 64)}, json_headers),
+        ('POST /recommend-crop/batch (512, .npy)', '/recommend-crop/batch', npy(X),
+         {'Content-Type': 'application/x-npy', 'Accept': 'application/x-npy'}),
+        ('POST /predict', '/predict', {'crop': 'tomato', 'location': 'Pune', 'days': 7,
+                                       'historical_prices': history(365, end=np.datetime64('today'))}, json_headers),
+    ]
+
+
+def timed(conn, path, body, headers):
+    start = time.perf_counter()
+    conn.request('POST', path, body=body, headers=headers)
+    res = conn.getresponse()
+    res.read()
+    elapsed = time.perf_counter() - start
+    if res.status != 200:
+        raise SystemExit(f'{path} answered {res.status}')
+    return elapsed
+
+
+def run(env, ready_path, requests, warm_repeat=20):
+    start = time.perf_counter()
+    with serve(env, ready_path=ready_path) as (host, port, _):
+        ready = time.perf_counter() - start
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        first = [timed(conn, path, body, headers) for _, path, body, headers in requests]
+        warm = [statistics.median(timed(conn, path, body, headers) for _ in range(warm_repeat))
+                for _, path, body, headers in requests]
+    return ready, first, warm
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='service starts per setting')
+    parser.add_argument('--load-mode', default='background')
+    args = parser.parse_args()
+
+    requests = [(label, path, body if isinstance(body, bytes) else json.dumps(body).encode(), headers)
+                for label, path, body, headers in route_requests()]
+    settings = [('/health', '/health', '0'), ('ready', '/health/ready', '0'), ('ready + warm-up', '/health/ready', '1')]
+    results = []
+    for _, ready_path, warmup in settings:
+        env = {'ML_WARMUP': warmup, 'ML_LOAD_MODE': args.load_mode, 'ML_CACHE_SIZE': '0', 'ML_CACHE_SNAPSHOT': ''}
+        results.append([run(env, ready_path, requests) for _ in range(args.repeat)])
+
+    def median_ms(runs, i, which=1):
+        return f'{statistics.median(r[which][i] for r in runs) * 1e3:.1f}'
+
+    table = []
+    for i, (label, *_) in enumerate(requests):
+        table.append([label, *(median_ms(runs, i) for runs in results), median_ms(results[-1], i, 2)])
+    table.append(['(start to traffic, s)', *(f'{statistics.median(r[0] for r in runs):.2f}' for runs in results), ''])
+    print_table(['request', *(f'first ms, {name}' for name, *_ in settings), 'warm ms'], table)
+    print(f'\nmedian of {args.repeat} starts, ML_LOAD_MODE={args.load_mode}, routes in the order shown')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Build the fertilizer response table (see response_table.py).
+
+    python build_fertilizer_table.py [--range nitrogen=0:60 ...] [--out models/fertilizer_table]
+
+Run after train_model.py: the table is tied to the model file it was built
+from and the service ignores it once the model changes. Prints the table's
+size, build time, lookup latency and how often it disagrees with the live
+model, and stores the same report in the table's meta.json.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import app
+from model_bundle import bundle_path, load_bundle
+from response_table import META_FILE, build_table
+from scoring import SCORERS, make_scorer, needs_booster
+
+# Integer range of each agronomic reading covered by the grid (request keys)
+DEFAULT_RANGES = {
+    'temperature': (20, 40),
+    'humidity': (40, 80),
+    'moisture': (20, 80),
+    'nitrogen': (0, 50),
+    'potassium': (0, 30),
+    'phosphorous': (0, 50),
+}
+
+
+def parse_range(text):
+    key, _, bounds = text.partition('=')
+    lo, _, hi = bounds.partition(':')
+    return key, (int(lo), int(hi))
+
+
+def feature_ranges(codec, ranges):
+    """(lo, hi) per model feature; categorical features span all their codes."""
+    out = []
+    for f in codec.fields:
+        if f.column in codec.categories:
+            out.append((0, len(codec.categories[f.column]) - 1))
+        else:
+            out.append(ranges[f.key])
+    return out
+
+
+def sample_grid(ranges, n, rng):
+    return np.column_stack([rng.integers(lo, hi + 1, size=n) for lo, hi in ranges]).astype(np.float64)
+
+
+def disagreement(table, X):
+    """Fraction of rows whose table answer differs from the live model's."""
+    hit, idx, conf = table.lookup(X)
+    live_idx, live_conf = app.top_k(app._models.fertilizer.scorer.predict_proba(X[hit]))
+    differs = [a != b or c != d for a, b, c, d in zip(idx, live_idx.tolist(), conf, live_conf)]
+    return int(hit.sum()), sum(differs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the fertilizer response table.')
+    parser.add_argument('--range', type=parse_range, action='append', default=[],
+                        metavar='KEY=LO:HI', help='override the integer range of one reading')
+    parser.add_argument('--out', default=app.FERTILIZER_TABLE or os.path.join(app.MODELS_DIR, 'fertilizer_table'))
+    parser.add_argument('--backend', choices=sorted(SCORERS),
+                        help='scoring backend used to fill the table (default: the serving backend)')
+    parser.add_argument('--samples', type=int, default=100000,
+                        help='random on-grid rows used to measure disagreement')
+    args = parser.parse_args()
+
+    fertilizer = app.ensure_loaded('fertilizer')
+    if fertilizer is None:
+        raise SystemExit('Fertilizer model not found. Run train_model.py first.')
+
+    ranges = feature_ranges(fertilizer.codec, {**DEFAULT_RANGES, **dict(args.range)})
+    # The served model's bundle, read again for its compiled trees (and the
+    # booster, if --backend scores with it)
+    bundle = load_bundle(bundle_path(app.MODELS_DIR, 'fertilizer'),
+                         booster=args.backend is not None and needs_booster(args.backend))
+    scorer = make_scorer(bundle.model, args.backend, bundle.ensemble) if args.backend else fertilizer.scorer
+    table = build_table(bundle.ensemble, scorer, ranges, fertilizer.version, args.out)
+
+    rng = np.random.default_rng(0)
+    X = sample_grid(ranges, args.samples, rng)
+    n_hit, n_diff = disagreement(table, X)
+
+    row = X[:1]
+    single = min(_time(lambda: table.lookup(row), 2000) for _ in range(5))
+    model_single = min(_time(lambda: app.top_k(fertilizer.scorer.predict_proba(row)), 200) for _ in range(5))
+    batch = X[:10000]
+    batch_time = min(_time(lambda: table.lookup(batch), 1) for _ in range(5))
+
+    report = {
+        'cells': table.n_cells,
+        'bytes': table.nbytes,
+        'build_seconds': table.meta['build_seconds'],
+        'lookup_us_single_row': round(single * 1e6, 2),
+        'model_us_single_row': round(model_single * 1e6, 2),
+        'lookup_ms_10k_rows': round(batch_time * 1e3, 2),
+        'sampled_rows': n_hit,
+        'disagreements': n_diff,
+        'disagreement_rate': round(n_diff / n_hit, 6) if n_hit else 0.0,
+    }
+    table.meta['report'] = report
+    with open(os.path.join(args.out, META_FILE), 'w') as f:
+        json.dump(table.meta, f)
+    print(json.dumps(report, indent=2))
+
+
+def _time(fn, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - start) / number
+
+
+if __name__ == '__main__':
+    main()
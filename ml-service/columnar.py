@@ -0,0 +1,209 @@
+"""
+Binary columnar payloads for the /batch recommendation endpoints.
+
+JSON rows cost a string key and a boxed float per value on both sides. For
+bulk scoring the batch endpoints also take the feature matrix as numbers:
+
+  application/x-npy         one 2-D .npy array, a row per input and a column
+                            per feature (C or Fortran order, any float or
+                            integer dtype of up to 64 bits)
+  application/octet-stream  raw little-endian float32 columns, back to back
+  application/msgpack       {"features": [...], "columns": [...]}, each column
+                            raw little-endian float32 bytes or a list of numbers
+
+Features are named by their request keys (`nitrogen`, `soilType`, ...): in
+the X-Features header (comma-separated) for .npy and raw bodies, and in
+`features` for msgpack. A .npy body without the header is taken to be in
+the model's feature order (FeatureCodec.fields). Features left out get the
+JSON defaults. Categorical features are sent as codes: positions in the
+lists of /recommend-fertilizer/metadata.
+
+The arrays are views of the request body, not copies. When the features
+come in the model's order, row-major, the matrix handed to the scorer is
+that view. Other orders cost one copy into a new float32 matrix.
+
+Answers are JSON by default. With `Accept: application/x-npy` they are one
+structured array with `class` (int16) and `confidence` (float32, percent)
+fields of shape (k,), and the class labels in the X-Classes header (JSON).
+With `Accept: application/msgpack` they are {"classes", "k", "class",
+"confidence"}, the last two raw little-endian bytes.
+
+msgpack is optional: without the package, msgpack bodies get 415.
+
+A body is read only up to the size the allowed number of rows could take
+(max_body_bytes), so an oversized one is refused before it is in memory.
+"""
+import io
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+NPY = 'application/x-npy'
+RAW = 'application/octet-stream'
+MSGPACK = ('application/msgpack', 'application/x-msgpack')
+TYPES = (NPY, RAW) + MSGPACK
+# Most bytes a body spends per value (a msgpack float64) and on everything else
+MAX_VALUE_BYTES = 9
+MAX_HEADER_BYTES = 1 << 16
+READ_BYTES = 1 << 20
+
+
+class PayloadError(ValueError):
+    """The body can't be read as a feature matrix."""
+
+
+class UnsupportedPayload(PayloadError):
+    """The body's format needs a package that isn't installed."""
+
+
+class PayloadTooLarge(PayloadError):
+    """The body is longer than a payload of the allowed number of rows can be."""
+
+
+def max_body_bytes(rows: int, n_features: int) -> int:
+    """Longest body of a payload of at most `rows` rows of `n_features` features."""
+    return rows * n_features * MAX_VALUE_BYTES + MAX_HEADER_BYTES
+
+
+def read_body(stream, limit: int, length=None) -> bytes:
+    """The whole request body, read from `stream`. Raises PayloadTooLarge
+    when its Content-Length (`length`) or, for a chunked body, the bytes
+    read exceed `limit`; no more than limit + 1 bytes are read."""
+    if length is not None and length > limit:
+        raise PayloadTooLarge(f'Body too large: {length} bytes (max {limit})')
+    chunks, size = [], 0
+    while size <= limit:
+        chunk = stream.read(min(READ_BYTES, limit + 1 - size))
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+        size += len(chunk)
+    raise PayloadTooLarge(f'Body too large: over {limit} bytes')
+
+
+def read_npy(body: bytes) -> np.ndarray:
+    """The 2-D array of a .npy body, as a view of the body."""
+    buffer = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(buffer)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(buffer)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(buffer)
+    except ValueError as e:
+        raise PayloadError(f'Not a .npy body: {e}') from e
+    if len(shape) != 2 or dtype.kind not in 'fiu' or dtype.itemsize > 8:
+        raise PayloadError(f'Expected a 2-D numeric array, got shape {shape} of {dtype}')
+    count = shape[0] * shape[1]
+    if len(body) - buffer.tell() < count * dtype.itemsize:
+        raise PayloadError('The .npy body is shorter than its header says')
+    array = np.frombuffer(body, dtype, count=count, offset=buffer.tell())
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def read_raw(body: bytes, n_features: int) -> np.ndarray:
+    """(n, n_features) view of raw little-endian float32 columns."""
+    if not n_features or len(body) % (4 * n_features):
+        raise PayloadError(f'A raw body must hold {n_features} float32 columns of equal length')
+    return np.frombuffer(body, '<f4').reshape(n_features, -1).T
+
+
+def read_msgpack(body: bytes):
+    """(feature names, (n, k) matrix) of a msgpack body."""
+    if msgpack is None:
+        raise UnsupportedPayload('msgpack bodies need the msgpack package')
+    try:
+        payload = msgpack.unpackb(body)
+        names, columns = payload['features'], payload['columns']
+    except (TypeError, KeyError, ValueError, msgpack.UnpackException) as e:
+        raise PayloadError(f'Expected {{"features": [...], "columns": [...]}}: {e}') from e
+    if len(names) != len(columns):
+        raise PayloadError('"features" and "columns" must have the same length')
+    columns = [np.frombuffer(c, '<f4') if isinstance(c, bytes) else np.asarray(c, dtype=np.float32)
+               for c in columns]
+    if len({len(c) for c in columns}) > 1:
+        raise PayloadError('Every column must have the same length')
+    return names, np.column_stack(columns) if columns else np.empty((0, 0), dtype=np.float32)
+
+
+def read_payload(mimetype: str, body: bytes, header_features):
+    """(feature names or None for the model's order, (n, k) matrix) of a binary body."""
+    names = [name.strip() for name in header_features.split(',')] if header_features else None
+    if mimetype == NPY:
+        return names, read_npy(body)
+    if mimetype == RAW:
+        if names is None:
+            raise PayloadError('Raw bodies need an X-Features header naming their columns')
+        return names, read_raw(body, len(names))
+    return read_msgpack(body)
+
+
+def feature_matrix(codec, names, M: np.ndarray) -> np.ndarray:
+    """The model's (n, n_features) matrix from columns `names` of M.
+
+    M itself when it already is that matrix; otherwise a float32 copy with
+    the columns put in order and the missing features set to their defaults.
+    """
+    keys = [f.key for f in codec.fields]
+    if names is None:
+        names = keys
+    if M.shape[1] != len(names):
+        raise PayloadError(f'{len(names)} features named for {M.shape[1]} columns')
+    unknown = sorted(set(names) - set(keys))
+    if unknown or len(set(names)) < len(names):
+        raise PayloadError(f'Unknown or repeated features {unknown or names}; expected some of {keys}')
+    if names == keys and M.flags.c_contiguous:
+        X = M
+    else:
+        X = np.empty((len(M), len(keys)), dtype=np.float32)
+        column = {name: j for j, name in enumerate(names)}
+        defaults = codec.encode({})[0]
+        for i, key in enumerate(keys):
+            X[:, i] = M[:, column[key]] if key in column else defaults[i]
+    for i, f in enumerate(codec.fields):
+        values = codec.categories.get(f.column)
+        if values is not None:
+            codes = X[:, i]
+            if not ((codes >= 0) & (codes < len(values)) & (codes == np.floor(codes))).all():
+                raise PayloadError(f'{f.key} takes codes 0 to {len(values) - 1}')
+    return X
+
+
+def input_rows(codec, X: np.ndarray) -> list:
+    """Request dicts of the rows of X, categorical codes back as labels."""
+    columns = []
+    for i, f in enumerate(codec.fields):
+        values = codec.categories.get(f.column)
+        column = X[:, i]
+        columns.append(values[column.astype(np.intp)].tolist() if values is not None else column.tolist())
+    keys = [f.key for f in codec.fields]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def top_k_body(mimetype: str, idx: np.ndarray, conf: np.ndarray, labels) -> bytes:
+    """Encoded top-k classes (n, k) and confidences (n, k) for an Accept type."""
+    k = idx.shape[1]
+    if mimetype == NPY:
+        out = np.empty(len(idx), dtype=[('class', '<i2', (k,)), ('confidence', '<f4', (k,))])
+        out['class'] = idx
+        out['confidence'] = conf
+        buffer = io.BytesIO()
+        np.save(buffer, out)
+        return buffer.getvalue()
+    if msgpack is None:
+        raise UnsupportedPayload('msgpack answers need the msgpack package')
+    return msgpack.packb({
+        'classes': list(labels),
+        'k': k,
+        'class': np.ascontiguousarray(idx, dtype='<i2').tobytes(),
+        'confidence': np.ascontiguousarray(conf, dtype='<f4').tobytes(),
+    })
+
+
+def classes_header(labels) -> str:
+    return json.dumps(list(labels))
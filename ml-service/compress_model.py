@@ -0,0 +1,275 @@
+"""
+Compress the fertilizer model and report what each candidate costs and buys.
+
+    python compress_model.py [--folds 5] [--prune-gamma 1 2 4] [--students 2x15 2x30 3x30]
+                             [--json report.json] [--save CANDIDATE]
+
+train_model.py always fits 300 rounds of depth-7 trees (7 per round, one
+per class). Scoring cost grows with the number of trees and their depth.
+The candidates:
+
+  baseline        train_model.py's model
+  early_stopped   as many rounds as it takes the mean validation log loss
+                  over the CV folds to stop improving (--patience rounds
+                  without a new best)
+  pruned_g<G>     early_stopped without the splits whose loss reduction is
+                  below G (XGBoost's `prune` updater), so fewer nodes
+  student_<D>x<N> a depth-D model of N rounds trained on early_stopped's
+                  probabilities instead of the labels (distillation). Each
+                  training row and --augment jittered copies of it appear
+                  once per class, weighted by the teacher's probability
+
+Accuracy, log loss and MAP@3 are measured out of fold: every candidate, and
+the teacher of every student, is fit again on each fold's training rows.
+The early-stopping rounds are picked on those same folds, so those scores
+are slightly optimistic. Latency is the time per row of the candidate fit
+on all the data, through the service's scorer (--backend, default
+ML_SCORING_BACKEND), for one row at a time and for 512-row batches.
+
+A candidate is on the Pareto frontier (`*`) when no other one scores at
+least as well on MAP@3 and log loss while being at least as fast one row
+at a time. --save writes a candidate, fit on all the data, as
+models/fertilizer.bundle. Rebuild the response table afterwards
+(build_fertilizer_table.py).
+"""
+import argparse
+import json
+import os
+import timeit
+import warnings
+
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import log_loss
+from sklearn.model_selection import StratifiedKFold
+
+from model_bundle import bundle_path, write_bundle
+from scoring import SCORING_BACKEND, make_scorer
+from train_model import encode_dataset, load_data, xgb_params
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+
+# Students fit soft targets with weights below 1, so they need lighter
+# regularisation than the teacher and a faster learning rate for fewer rounds
+STUDENT_PARAMS = {
+    'learning_rate': 0.3,
+    'min_child_weight': 0.5,
+    'gamma': 0,
+    'subsample': 1.0,
+    'colsample_bytree': 1.0,
+}
+# Rows per batch in the batched latency column
+BATCH_ROWS = 512
+
+
+def map_at_3(y: np.ndarray, proba: np.ndarray) -> float:
+    """Mean average precision at 3 with one true class per row: 1/rank when
+    the class is in the top 3, else 0."""
+    top = np.argsort(-proba, axis=1, kind='stable')[:, :3]
+    return float(((top == y[:, None]) / np.arange(1, 4)).sum(axis=1).mean())
+
+
+def quality(y: np.ndarray, proba: np.ndarray) -> dict:
+    proba = proba / proba.sum(axis=1, keepdims=True)   # float32 sums drift from 1
+    return {
+        'accuracy': float((proba.argmax(axis=1) == y).mean()),
+        'log_loss': float(log_loss(y, proba, labels=np.arange(proba.shape[1]))),
+        'map3': map_at_3(y, proba),
+    }
+
+
+def early_stopping_rounds(curve, patience: int) -> int:
+    """Rounds up to the best point of a validation-loss curve, stopping the
+    search once `patience` rounds pass without a new best."""
+    best = 0
+    for i, loss in enumerate(curve):
+        if loss < curve[best]:
+            best = i
+        elif i - best >= patience:
+            break
+    return best + 1
+
+
+def fit(params: dict, X, y, n_rounds: int, **fit_args):
+    model = xgb.XGBClassifier(**{**params, 'n_estimators': n_rounds})
+    model.fit(X, y, verbose=False, **fit_args)
+    return model
+
+
+def prune(model, X, y, gamma: float):
+    """`model` with every split of loss reduction below `gamma` removed."""
+    booster = model.get_booster().copy()
+    params = {'process_type': 'update', 'updater': 'prune', 'gamma': gamma,
+              'objective': 'multi:softprob', 'num_class': model.n_classes_, 'verbosity': 0}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')   # xgboost warns that updating a model is unusual
+        pruned = xgb.train(params, xgb.DMatrix(X, y), num_boost_round=booster.num_boosted_rounds(),
+                           xgb_model=booster)
+    pruned_model = xgb.XGBClassifier()
+    pruned_model.load_model(bytearray(pruned.save_raw('ubj')))
+    return pruned_model
+
+
+def jitter(X, copies: int, numeric_mask, rng):
+    """X followed by `copies` copies of it with the numeric features moved by
+    a tenth of their spread; categorical codes stay as they are."""
+    if not copies:
+        return X
+    scale = np.where(numeric_mask, 0.1 * X.std(axis=0), 0).astype(np.float32)
+    noisy = [X + rng.normal(0, 1, X.shape).astype(np.float32) * scale for _ in range(copies)]
+    return np.concatenate([X, *noisy])
+
+
+def distill(teacher, params: dict, X, depth: int, n_rounds: int, augment: int, numeric_mask, seed: int):
+    """A depth-`depth`, `n_rounds`-round student fit to the teacher's
+    probabilities on X and `augment` jittered copies of it."""
+    Xs = jitter(X, augment, numeric_mask, np.random.default_rng(seed))
+    proba = teacher.predict_proba(Xs)
+    n_classes = proba.shape[1]
+    # Cross-entropy against soft targets = each row once per class, weighted
+    # by the teacher's probability; negligible weights are dropped
+    weight = proba.reshape(-1)
+    keep = weight > 1e-4
+    X_rep = np.repeat(Xs, n_classes, axis=0)[keep]
+    y_rep = np.tile(np.arange(n_classes), len(Xs))[keep]
+    student_params = {**params, **STUDENT_PARAMS, 'max_depth': depth}
+    return fit(student_params, X_rep, y_rep, n_rounds, sample_weight=weight[keep])
+
+
+def candidates(params: dict, X, y, rounds: int, prune_gammas, students, augment: int, numeric_mask):
+    """(name, fitted model) of every compressed candidate trained on X, y."""
+    teacher = fit(params, X, y, rounds)
+    yield 'early_stopped', teacher
+    for gamma in prune_gammas:
+        yield f'pruned_g{gamma:g}', prune(teacher, X, y, gamma)
+    for depth, n_rounds in students:
+        yield f'student_{depth}x{n_rounds}', distill(teacher, params, X, depth, n_rounds, augment,
+                                                    numeric_mask, params['random_state'])
+
+
+def seconds_per_row(scorers: dict, X, rounds: int = 7) -> dict:
+    """Best time per row of each scorer on X. The scorers take turns each
+    round, so a slow spell on the machine doesn't land on one of them."""
+    timers = {name: timeit.Timer(lambda s=scorer: s.predict_proba(X)) for name, scorer in scorers.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    best = dict.fromkeys(scorers, float('inf'))
+    for _ in range(rounds):
+        for name, timer in timers.items():
+            best[name] = min(best[name], timer.timeit(numbers[name]) / numbers[name] / len(X))
+    return best
+
+
+def size(model):
+    """(trees, nodes) the booster walks, single-leaf trees included."""
+    dump = model.get_booster().get_dump()
+    return len(dump), sum(tree.count('\n') for tree in dump)
+
+
+def pareto_front(rows) -> set:
+    """Names of the rows no other row beats or matches on MAP@3, log loss and
+    one-row latency while strictly beating it on one of them."""
+    def dominates(a, b):
+        no_worse = a['map3'] >= b['map3'] and a['log_loss'] <= b['log_loss'] and a['us_per_row'] <= b['us_per_row']
+        better = a['map3'] > b['map3'] or a['log_loss'] < b['log_loss'] or a['us_per_row'] < b['us_per_row']
+        return no_worse and better
+    return {b['name'] for b in rows if not any(dominates(a, b) for a in rows)}
+
+
+def compress(X, y, numeric_mask, folds=5, patience=20, prune_gammas=(1, 2, 4),
+             students=((2, 15), (2, 30), (3, 30)), augment=16, backend=None):
+    """Fit and score every candidate; returns (report rows, {name: model fit on all of X})."""
+    n_classes = int(y.max()) + 1
+    params = xgb_params(n_classes)
+    skf = StratifiedKFold(n_splits=folds, shuffle=True, random_state=params['random_state'])
+    splits = list(skf.split(X, y))
+
+    oof = {'baseline': np.zeros((len(y), n_classes))}
+    curves = []
+    for train_idx, val_idx in splits:
+        model = fit(params, X[train_idx], y[train_idx], params['n_estimators'],
+                    eval_set=[(X[val_idx], y[val_idx])])
+        curves.append(model.evals_result()['validation_0']['mlogloss'])
+        oof['baseline'][val_idx] = model.predict_proba(X[val_idx])
+    rounds = early_stopping_rounds(np.mean(curves, axis=0), patience)
+
+    for train_idx, val_idx in splits:
+        for name, model in candidates(params, X[train_idx], y[train_idx], rounds, prune_gammas,
+                                      students, augment, numeric_mask):
+            oof.setdefault(name, np.zeros((len(y), n_classes)))[val_idx] = model.predict_proba(X[val_idx])
+
+    models = {'baseline': fit(params, X, y, params['n_estimators'])}
+    models.update(candidates(params, X, y, rounds, prune_gammas, students, augment, numeric_mask))
+    scorers = {name: make_scorer(model, backend) for name, model in models.items()}
+    one = seconds_per_row(scorers, X[:1])
+    batch = seconds_per_row(scorers, X[np.arange(BATCH_ROWS) % len(X)])
+    rows = []
+    for name, model in models.items():
+        trees, nodes = size(model)
+        rows.append({
+            'name': name,
+            'rounds': model.get_booster().num_boosted_rounds(),
+            'trees': trees,
+            'nodes': nodes,
+            **quality(y, oof[name]),
+            'us_per_row': one[name] * 1e6,
+            f'us_per_row_{BATCH_ROWS}': batch[name] * 1e6,
+            'backend': scorers[name].backend,
+        })
+    front = pareto_front(rows)
+    for row in rows:
+        row['pareto'] = row['name'] in front
+    return rows, models
+
+
+def format_report(rows) -> str:
+    header = ['candidate', 'rounds', 'trees', 'nodes', 'accuracy', 'log loss', 'MAP@3',
+              'µs/row (1)', f'µs/row ({BATCH_ROWS})', 'pareto']
+    table = [[r['name'], r['rounds'], r['trees'], r['nodes'], f"{r['accuracy']:.3f}", f"{r['log_loss']:.4f}",
+              f"{r['map3']:.4f}", f"{r['us_per_row']:.1f}", f"{r[f'us_per_row_{BATCH_ROWS}']:.2f}",
+              '*' if r['pareto'] else ''] for r in rows]
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *table)]
+    return '\n'.join('  '.join(str(cell).rjust(w) for cell, w in zip(line, widths)) for line in [header, *table])
+
+
+def parse_student(text: str):
+    depth, _, n_rounds = text.partition('x')
+    return int(depth), int(n_rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--patience', type=int, default=20, help='early-stopping rounds without a new best')
+    parser.add_argument('--prune-gamma', type=float, nargs='*', default=[1, 2, 4],
+                        help='minimum loss reduction a split keeps when pruning (none: no pruned candidates)')
+    parser.add_argument('--students', type=parse_student, nargs='*', default=[(2, 15), (2, 30), (3, 30)],
+                        metavar='DEPTHxROUNDS', help='distilled students to train (none: no students)')
+    parser.add_argument('--augment', type=int, default=16, help='jittered copies of each row for distillation')
+    parser.add_argument('--backend', default=SCORING_BACKEND, help='scorer timed for latency')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--save', metavar='CANDIDATE', help='write this candidate as the fertilizer bundle')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    args = parser.parse_args()
+
+    df = load_data()
+    X, y, codec, label_encoders, target_le = encode_dataset(df, verbose=False)
+    rows, models = compress(X, y, codec.numeric_mask, args.folds, args.patience, args.prune_gamma,
+                            args.students, args.augment, args.backend)
+    print(format_report(rows))
+    print(f'\n{args.folds}-fold out-of-fold scores, {rows[0]["backend"]} backend latency')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+    if args.save:
+        if args.save not in models:
+            parser.error(f'--save: no candidate {args.save!r} (expected one of {", ".join(models)})')
+        path = bundle_path(args.models_dir, 'fertilizer')
+        manifest = write_bundle(path, 'fertilizer', models[args.save], codec.feature_names, target_le.classes_,
+                                {col: le.classes_ for col, le in label_encoders.items()})
+        print(f'\n{args.save} saved to {path} (version {manifest["version"]}). '
+              f'Rebuild the response table: python build_fertilizer_table.py')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Convert the old joblib pickles in models/ into model bundles (model_bundle.py).
+
+    python convert_models.py [--models-dir models] [--remove-pickles]
+
+Only needed once for models trained before the bundle format; the training
+scripts now write bundles directly. Unpickling runs arbitrary code, so only
+convert pickles you produced yourself.
+"""
+import argparse
+import os
+
+import joblib
+
+from feature_codec import CROP_FIELDS
+from model_bundle import bundle_path, write_bundle
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+
+# bundle name → pickles it replaces
+PICKLES = {
+    'fertilizer': ['fertilizer_model.pkl', 'label_encoders.pkl', 'target_encoder.pkl', 'feature_names.pkl'],
+    'crop': ['crop_model.pkl', 'crop_label_encoder.pkl'],
+}
+
+
+def convert(models_dir, name):
+    paths = [os.path.join(models_dir, f) for f in PICKLES[name]]
+    if not all(os.path.exists(p) for p in paths):
+        print(f"[convert] {name}: pickles not found, skipped")
+        return None
+
+    if name == 'fertilizer':
+        model, label_encoders, target_encoder, feature_names = (joblib.load(p) for p in paths)
+        categories = {col: le.classes_ for col, le in label_encoders.items()}
+    else:
+        model, target_encoder = (joblib.load(p) for p in paths)
+        feature_names = getattr(model, 'feature_names_in_', None)
+        if feature_names is None:
+            feature_names = [f.name for f in CROP_FIELDS]
+        categories = None
+
+    path = bundle_path(models_dir, name)
+    manifest = write_bundle(path, name, model, feature_names, target_encoder.classes_, categories)
+    before = sum(os.path.getsize(p) for p in paths)
+    after = sum(os.path.getsize(os.path.join(path, f)) for f in manifest['files'])
+    print(f"[convert] {name}: {len(paths)} pickles ({before:,} bytes) → {path} "
+          f"({after:,} bytes, version {manifest['version']})")
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert joblib model pickles into model bundles.')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--remove-pickles', action='store_true',
+                        help='delete the pickles once their bundle is written')
+    args = parser.parse_args()
+
+    for name in PICKLES:
+        converted = convert(args.models_dir, name)
+        if converted and args.remove_pickles:
+            for p in converted:
+                os.remove(p)
+
+
+if __name__ == '__main__':
+    main()
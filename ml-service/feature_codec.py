@@ -0,0 +1,123 @@
+"""
+Feature codec shared by training and serving.
+
+A FeatureCodec turns raw inputs into the model's feature matrix and model
+class indices back into labels, using plain dict/array lookup tables built
+once from the fitted encoders:
+
+  - request dicts (`{"soilType": "Sandy", "nitrogen": 37, ...}`), one row or many
+  - dataset columns (`df["Soil Type"]`, ...), as used by the training scripts
+
+Feature order comes from the saved feature names (the model bundle's manifest), so a
+model retrained with a different column order is still fed correctly.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# name:    feature name the model was trained with
+# column:  dataset column the feature is read from during training
+# key:     request body key the feature is read from when serving
+# default: value used when the request omits the key
+Field = namedtuple('Field', ['name', 'column', 'key', 'default'])
+
+FERTILIZER_FIELDS = [
+    Field('Temparature', 'Temparature', 'temperature', 28),
+    Field('Humidity', 'Humidity', 'humidity', 55),
+    Field('Moisture', 'Moisture', 'moisture', 45),
+    Field('Nitrogen', 'Nitrogen', 'nitrogen', 20),
+    Field('Potassium', 'Potassium', 'potassium', 10),
+    Field('Phosphorous', 'Phosphorous', 'phosphorous', 15),
+    Field('Soil Type_Encoded', 'Soil Type', 'soilType', 'Sandy'),
+    Field('Crop Type_Encoded', 'Crop Type', 'cropType', 'Maize'),
+]
+
+CROP_FIELDS = [
+    Field('N', 'N', 'nitrogen', 50),
+    Field('P', 'P', 'phosphorous', 50),
+    Field('K', 'K', 'potassium', 50),
+    Field('temperature', 'temperature', 'temperature', 25),
+    Field('humidity', 'humidity', 'humidity', 60),
+    Field('ph', 'ph', 'ph', 6.5),
+    Field('rainfall', 'rainfall', 'rainfall', 100),
+]
+
+
+class FeatureCodec:
+    """Encodes inputs in feature-name order and decodes class indices.
+
+    Categorical columns map label → code through a dict; labels the encoder
+    never saw fall back to code 0 (the first class), like the service always
+    did. Class indices decode through a NumPy array of labels.
+    """
+
+    def __init__(self, fields, feature_names, categories, classes):
+        by_name = {f.name: f for f in fields}
+        unknown = [name for name in feature_names if name not in by_name]
+        if unknown:
+            raise ValueError(f'No codec field for feature(s): {unknown}')
+
+        self.fields = [by_name[name] for name in feature_names]
+        self.feature_names = [f.name for f in self.fields]
+        self.categories = {col: np.asarray(values) for col, values in categories.items()}
+        self.classes = np.asarray(classes)
+        self._lookup = {
+            col: {label: code for code, label in enumerate(values.tolist())}
+            for col, values in self.categories.items()
+        }
+        # (key, default, lookup-or-None) per feature, in model order
+        self._plan = [(f.key, f.default, self._lookup.get(f.column)) for f in self.fields]
+
+    @classmethod
+    def from_encoders(cls, fields, feature_names, label_encoders, target_encoder):
+        """Build from fitted sklearn LabelEncoders (anything with `classes_`)."""
+        categories = {col: le.classes_ for col, le in (label_encoders or {}).items()}
+        return cls(fields, feature_names, categories, target_encoder.classes_)
+
+    @classmethod
+    def from_bundle(cls, fields, bundle):
+        """Build from a loaded model bundle (model_bundle.py)."""
+        return cls(fields, bundle.feature_names, bundle.categories, bundle.classes)
+
+    @property
+    def n_features(self):
+        return len(self.fields)
+
+    @property
+    def numeric_mask(self) -> np.ndarray:
+        """True for features read as numbers, False for categorical codes."""
+        return np.array([lookup is None for _, _, lookup in self._plan])
+
+    def encode(self, data: dict) -> np.ndarray:
+        """Encode one request dict → (1, n_features) matrix."""
+        return self.encode_rows([data])
+
+    def encode_rows(self, items: list) -> np.ndarray:
+        """Encode a list of request dicts → (n, n_features) matrix."""
+        X = np.empty((len(items), self.n_features), dtype=np.float64)
+        for i, d in enumerate(items):
+            X[i] = [
+                float(d.get(key, default)) if lookup is None
+                else lookup.get(d.get(key, default), 0)
+                for key, default, lookup in self._plan
+            ]
+        return X
+
+    def encode_columns(self, columns) -> np.ndarray:
+        """Encode whole dataset columns (a DataFrame or dict of arrays keyed by
+        dataset column name) → (n, n_features) matrix."""
+        encoded = []
+        for f in self.fields:
+            values = columns[f.column]
+            lookup = self._lookup.get(f.column)
+            if lookup is None:
+                encoded.append(np.asarray(values, dtype=np.float64))
+            else:
+                encoded.append(np.fromiter(
+                    (lookup.get(v, 0) for v in values), dtype=np.float64, count=len(values)
+                ))
+        return np.column_stack(encoded)
+
+    def decode(self, idx) -> np.ndarray:
+        """Class indices (any shape) → labels of the same shape."""
+        return self.classes[idx]
@@ -0,0 +1,520 @@
+"""
+Incremental forecasting state per price series, so /predict doesn't refit
+the whole history on every call.
+
+The regression of forecaster.py is fitted by least squares, and least
+squares only needs the sums of products of its inputs and target (the
+normal equations), not the history itself. A SeriesState keeps those sums,
+in one augmented Gram matrix [X y]ᵀ[X y] per term set, together with the
+last eight prices (the lags of the next day) and running sums of the
+day-to-day changes (for the naive fallback). Adding a day is one outer
+product, whatever the length of the history, and a forecast solves an
+11x11 system and runs the regression forward from the last prices.
+
+A refit only uses the last MAX_HISTORY_DAYS days (forecaster.daily_series).
+So the state also keeps the prices of those days, and once it holds that
+many, each new day takes the oldest one's terms back out of the sums.
+
+Point forecasts are those of refitting the same history with forecaster.py.
+Intervals differ slightly: the refit measures its multi-day errors by
+rerunning the model over the history, which the state can't. It takes the
+one-day RMS error from the normal equations instead, and widens it with
+the model's own lag weights (h-day variance = σ² Σ ψ_j²). There is no
+backtest, so `metrics` is None.
+
+States are keyed by series ("crop:location") in a ForecastStateStore, an
+LRU bounded to `maxsize` series (about 1.5 KB plus 8 bytes per day of
+history, at most about 10 KB each) that can write a
+checkpoint to disk and load it on restart. Every gunicorn worker has its own
+store; they all checkpoint into the same file, each merging its series with
+the ones already there.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+import forecaster
+from forecaster import INTERVAL, MAX_HISTORY_DAYS, WEEK, ForecastError, model_terms
+
+try:
+    import fcntl
+except ImportError:   # Windows: checkpoints are written without a lock
+    fcntl = None
+
+# Inputs of the full regression: level, trend, six weekday dummies, lag 1, lag 7
+FULL_TERMS = ('trend', 'weekly', 'lag1', 'lag7')
+FULL_INPUTS = 2 + (WEEK - 1) + 2
+# ... and of the short one: level, trend, lag 1
+SHORT_TERMS = ('trend', 'lag1')
+SHORT_INPUTS = 3
+# Prices kept: the newest day and its 7-day lag
+RECENT = WEEK + 1
+# First size of the buffer of prices in the window (doubled as it fills)
+WINDOW_START = 16
+
+
+def series_key(crop, location) -> str:
+    """Key of a price series: "crop:location", the crop name trimmed and
+    lowercased as the backend stores it (PriceHistory.cropName)."""
+    return f"{str(crop).strip().lower()}:{location or ''}"
+
+
+# Weekday dummies of the full regression, by weekday (Monday has none)
+_WEEKDAYS = tuple(tuple(float(dow == d) for d in range(1, WEEK)) for dow in range(WEEK))
+
+
+def _full_inputs(t, dow0, lag1, lag7):
+    """Full regression inputs for day indices t (arrays of one shape), last axis = inputs."""
+    t = np.asarray(t, dtype=np.float64)
+    dow = (dow0 + t.astype(np.int64)) % WEEK
+    columns = [np.ones(t.shape), t / 365.0]
+    columns.extend((dow == d).astype(np.float64) for d in range(1, WEEK))
+    columns += [lag1, lag7]
+    return np.stack(columns, axis=-1)
+
+
+class SeriesState:
+    """Normal equations and last prices of one daily price series.
+
+    Prices are kept divided by `scale` (the first price seen) to keep the
+    sums well conditioned. Day t counts from `first`, a day number.
+    `window` holds the prices of the last MAX_HISTORY_DAYS days, day t at
+    t % len(window).
+    """
+
+    __slots__ = ('first', 'n', 'scale', 'recent', 'window', 'last_sum', 'last_count', 'full', 'short',
+                 'changes')
+
+    def __init__(self, first: int, price: float):
+        self.first = first
+        self.n = 1
+        self.scale = abs(price) or 1.0
+        self.recent = [price / self.scale]
+        self.window = np.empty(WINDOW_START)
+        self.window[0] = self.recent[0]
+        # Points averaged into the newest day (revisions keep averaging)
+        self.last_sum, self.last_count = price, 1
+        # Augmented Gram matrices [x y]ᵀ[x y], their last row/column being the target
+        self.full = np.zeros((FULL_INPUTS + 1, FULL_INPUTS + 1))
+        self.short = np.zeros((SHORT_INPUTS + 1, SHORT_INPUTS + 1))
+        # count, sum and sum of squares of day-to-day changes
+        self.changes = np.zeros(3)
+
+    @classmethod
+    def from_daily(cls, first: int, y) -> 'SeriesState':
+        """State of the daily prices y (from forecaster.daily_series) starting on day `first`,
+        built with array operations rather than day by day."""
+        if len(y) > MAX_HISTORY_DAYS:
+            first, y = first + len(y) - MAX_HISTORY_DAYS, y[-MAX_HISTORY_DAYS:]
+        state = cls(first, float(y[0]))
+        z = np.asarray(y, dtype=np.float64) / state.scale
+        n = len(z)
+        state.n = n
+        state.recent = z[-RECENT:].tolist()
+        state.window = np.concatenate([z, np.empty(max(WINDOW_START - n, 0))])
+        state.last_sum, state.last_count = float(y[-1]), 1
+        if n > 1:
+            d = np.diff(z)
+            state.changes[:] = (len(d), d.sum(), d @ d)
+            t = np.arange(1, n)
+            v = np.column_stack([np.ones(n - 1), t / 365.0, z[:-1], z[1:]])
+            state.short = v.T @ v
+        if n > WEEK:
+            t = np.arange(WEEK, n)
+            x = _full_inputs(t, state.dow0, z[t - 1], z[t - WEEK])
+            v = np.column_stack([x, z[t]])
+            state.full = v.T @ v
+        return state
+
+    def copy(self) -> 'SeriesState':
+        other = SeriesState.__new__(SeriesState)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.recent = list(self.recent)
+        for name in ('window', 'full', 'short', 'changes'):
+            setattr(other, name, getattr(self, name).copy())
+        return other
+
+    @property
+    def dow0(self) -> int:
+        """Weekday of the first day, Monday = 0."""
+        return (self.first - 4) % WEEK
+
+    @property
+    def last(self) -> int:
+        return self.first + self.n - 1
+
+    def _accumulate(self, sign: float):
+        """Add (sign=1) or take out (sign=-1) the newest day's terms of the sums."""
+        t, z = self.n - 1, self.recent
+        if t >= 1:
+            d = z[-1] - z[-2]
+            self.changes += (sign, sign * d, sign * d * d)
+            v = np.array((1.0, t / 365.0, z[-2], z[-1]))
+            self.short += sign * np.outer(v, v)
+        if t >= WEEK:
+            # Plain tuples: building the inputs with array operations costs more than the update
+            v = np.array((1.0, t / 365.0) + _WEEKDAYS[(self.dow0 + t) % WEEK] + (z[-2], z[-RECENT], z[-1]))
+            self.full += sign * np.outer(v, v)
+
+    def _forget_oldest(self):
+        """Take the oldest day of a full window out of the sums, as a refit
+        of the history with one more day would leave it out."""
+        s = self.n - MAX_HISTORY_DAYS
+        z = [self.window[(s + k) % len(self.window)] for k in range(RECENT)]
+        d = z[1] - z[0]
+        self.changes -= (1.0, d, d * d)
+        v = np.array((1.0, (s + 1) / 365.0, z[0], z[1]))
+        self.short -= np.outer(v, v)
+        t = s + WEEK
+        v = np.array((1.0, t / 365.0) + _WEEKDAYS[(self.dow0 + t) % WEEK] + (z[WEEK - 1], z[0], z[WEEK]))
+        self.full -= np.outer(v, v)
+
+    def _remember(self, z: float):
+        """Keep the price of the next day, n, in the window."""
+        window = self.window
+        if self.n >= len(window) and len(window) < MAX_HISTORY_DAYS:
+            self.window = np.concatenate([window, np.empty(min(len(window), MAX_HISTORY_DAYS - len(window)))])
+            window = self.window
+        window[self.n % len(window)] = z
+
+    def _append(self, z: float):
+        if self.n >= MAX_HISTORY_DAYS:
+            self._forget_oldest()
+        self._remember(z)
+        self.recent.append(z)
+        del self.recent[:-RECENT]
+        self.n += 1
+        self._accumulate(1.0)
+
+    def add(self, day: int, price: float, count: int = 1) -> bool:
+        """Add a price (the mean of `count` prices of that day). Returns False
+        for a day before the newest one, which is ignored.
+
+        More prices for the newest day are averaged with the ones it has.
+        Days missing in between are interpolated, as forecaster.daily_series
+        does.
+        """
+        last = self.last
+        if day < last:
+            return False
+        if day == last:
+            self._accumulate(-1.0)
+            self.last_sum += price * count
+            self.last_count += count
+            self.recent[-1] = self.last_sum / self.last_count / self.scale
+            self.window[(self.n - 1) % len(self.window)] = self.recent[-1]
+            self._accumulate(1.0)
+            return True
+        if day - last > MAX_HISTORY_DAYS:
+            # Nothing of the old history would be used any more: start over
+            fresh = SeriesState(day, price)
+            for name in self.__slots__:
+                setattr(self, name, getattr(fresh, name))
+        else:
+            start, z = self.recent[-1], price / self.scale
+            gap = day - last
+            for k in range(1, gap):
+                self._append(start + (z - start) * k / gap)
+            self._append(z)
+        self.last_sum, self.last_count = price * count, count
+        return True
+
+    def extend(self, first: int, y) -> int:
+        """Add the daily prices y starting on day `first` that are newer than
+        the newest day; returns how many days were added."""
+        skip = max(self.last + 1 - first, 0)
+        for k in range(skip, len(y)):
+            self.add(first + k, float(y[k]))
+        return max(len(y) - skip, 0)
+
+    # ── Forecasts ────────────────────────────────────────────────────────────
+    def _solve(self, gram):
+        A, b = gram[:-1, :-1], gram[:-1, -1]
+        coef = np.linalg.pinv(A, rcond=1e-10) @ b
+        sse = gram[-1, -1] - 2 * coef @ b + coef @ A @ coef
+        return coef, np.sqrt(max(sse, 0.0) / A[0, 0])
+
+    def predict(self, steps: int):
+        """(terms, point forecasts, RMS errors) of the `steps` days after the newest, in price units."""
+        terms = model_terms(self.n)
+        week = np.array(self.recent[-WEEK:])
+        if not terms:
+            count, total, squares = self.changes
+            spread = (np.sqrt(max(squares / count - (total / count) ** 2, 0.0)) if self.n >= 3
+                      else 0.05 * abs(week.mean()))
+            return terms, np.full(steps, week.mean() * self.scale), \
+                spread * self.scale * np.sqrt(np.arange(1, steps + 1))
+
+        full = terms == FULL_TERMS
+        coef, sigma = self._solve(self.full if full else self.short)
+        t = self.n + np.arange(steps)
+        if full:
+            fixed = _full_inputs(t, self.dow0, np.zeros(steps), np.zeros(steps)) @ coef
+            a1, a7 = coef[-2], coef[-1]
+        else:
+            fixed = coef[0] + coef[1] * t / 365.0
+            a1, a7 = coef[-1], 0.0
+        window = list(self.recent)
+        psi = [1.0]
+        for k in range(steps):
+            window.append(fixed[k] + a1 * window[-1] + a7 * window[-WEEK])
+            if k:
+                psi.append(a1 * psi[-1] + (a7 * psi[-WEEK] if k >= WEEK else 0.0))
+        point = np.array(window[len(self.recent):]) * self.scale
+        return terms, point, sigma * self.scale * np.sqrt(np.cumsum(np.square(psi)))
+
+    def forecast(self, days: int = 7, holidays=(), today=None) -> dict:
+        """forecaster.forecast() of this series."""
+        days = forecaster.forecast_days(days)
+        gap = forecaster.stale_gap(self.last, np.datetime64(today or 'today', 'D'))
+        terms, point, sigma = self.predict(gap + days)
+        start = np.datetime64(self.last + gap + 1, 'D')
+        model = {'terms': list(terms), 'history_days': min(self.n, MAX_HISTORY_DAYS), 'interval': INTERVAL,
+                 'incremental': True}
+        recent = np.mean(self.recent[-WEEK:]) * self.scale
+        return forecaster.result(start, recent, point[gap:], sigma[gap:], model, None, holidays)
+
+    # ── Checkpoints ──────────────────────────────────────────────────────────
+    def to_dict(self) -> dict:
+        return {
+            'first': self.first, 'n': self.n, 'scale': self.scale, 'recent': self.recent,
+            'window': self.window[:min(self.n, len(self.window))].tolist(),
+            'last_sum': self.last_sum, 'last_count': self.last_count,
+            'full': self.full.tolist(), 'short': self.short.tolist(), 'changes': self.changes.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'SeriesState':
+        state = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(state, name, d[name])
+        for name in ('window', 'full', 'short', 'changes'):
+            setattr(state, name, np.array(d[name], dtype=np.float64))
+        if len(state.window) < WINDOW_START:
+            state.window = np.concatenate([state.window, np.empty(WINDOW_START - len(state.window))])
+        return state
+
+
+class ForecastStateStore:
+    """SeriesStates by series key, an LRU bounded to `maxsize` series."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.days_added = self.stale_points = 0
+        # Whether anything changed since the last checkpoint
+        self.dirty = False
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def __len__(self):
+        return len(self._states)
+
+    def get(self, key):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def put(self, key, state: SeriesState):
+        with self._lock:
+            self._put(key, state)
+            self.dirty = True
+
+    def _put(self, key, state):
+        self._states[key] = state
+        self._states.move_to_end(key)
+        while len(self._states) > self.maxsize:
+            self._states.popitem(last=False)
+            self.evictions += 1
+
+    def observe(self, key, history) -> SeriesState:
+        """A copy of the state of `key` brought up to date with a posted
+        history ([{date, price}, ...] as for /predict); None for an empty
+        history of an unknown series.
+
+        A known series only takes the days after its newest one, so a client
+        can send the whole history every time or just the new points.
+        """
+        with self._lock:
+            state = self._states.get(key)
+        if state is not None and history:
+            # Points the state already has are only compared by their (ISO) date string
+            last = str(np.datetime64(state.last, 'D'))
+            try:
+                history = [p for p in history if str(p['date'])[:10] > last]
+            except (KeyError, TypeError) as e:
+                raise ForecastError(f'Every historical price must have a "date": {e}') from e
+        first, y = forecaster.daily_series(history) if history else (None, ())
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                if not len(y):
+                    self.misses += 1
+                    return None
+                state = SeriesState.from_daily(int(first.astype(np.int64)), y)
+                self.misses += 1
+                self.days_added += len(y)
+            else:
+                self.hits += 1
+                if len(y):
+                    self.days_added += state.extend(int(first.astype(np.int64)), y)
+            self._put(key, state)
+            self.dirty = True
+            return state.copy()
+
+    def add(self, key, day: int, price: float) -> bool:
+        """Add one price (day number since 1970-01-01) to a series, creating it if needed.
+        Returns False when it was older than the series' newest day and ignored."""
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = SeriesState(day, price)
+                self.days_added += 1
+            elif state.add(day, price):
+                self.days_added += 1
+            else:
+                self.stale_points += 1
+                return False
+            self._put(key, state)
+            self.dirty = True
+            return True
+
+    def add_many(self, keys, days, prices) -> int:
+        """add() of many prices under one lock; returns how many were not stale.
+
+        Prices of the same series and day are averaged first, so each day
+        updates the sums once however many markets reported it.
+        """
+        days_of = {}
+        for key, day, price in zip(keys, days, prices):
+            slot = days_of.get((key, day))
+            if slot is None:
+                days_of[key, day] = [price, 1]
+            else:
+                slot[0] += price
+                slot[1] += 1
+        added = new_days = 0
+        with self._lock:
+            for (key, day), (total, count) in days_of.items():
+                state = self._states.get(key)
+                if state is None:
+                    state = SeriesState(day, total / count)
+                    state.last_sum, state.last_count = total, count
+                    self._put(key, state)
+                    new_days += 1
+                else:
+                    new_days += day > state.last
+                    if not state.add(day, total / count, count):
+                        continue
+                    self._states.move_to_end(key)
+                added += count
+            self.days_added += new_days
+            self.stale_points += len(keys) - added
+            if added:
+                self.dirty = True
+        return added
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self.dirty = True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'series': len(self._states),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'days_added': self.days_added,
+            'stale_points': self.stale_points,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ── Checkpoints ──────────────────────────────────────────────────────────
+    def save(self, path: str) -> int:
+        """Write every state to `path` (atomically), least recently used first;
+        returns how many were written.
+
+        The series already in the file are kept, unless this store has the
+        same series up to a day at least as new, so workers that checkpoint
+        into one file keep each other's series.
+        """
+        with self._lock:
+            entries = OrderedDict((key, state.to_dict()) for key, state in self._states.items())
+            self.dirty = False
+        with _locked(path):
+            merged = OrderedDict()
+            for key, state in read_checkpoint(path):
+                if key not in entries or _last_day(state) > _last_day(entries[key]):
+                    merged[key] = state
+            for key, state in entries.items():
+                merged.setdefault(key, state)
+            merged = [{'key': key, 'state': state} for key, state in merged.items()][-self.maxsize:]
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(merged, f)
+            os.replace(tmp_path, path)
+        return len(merged)
+
+    def load(self, path: str) -> int:
+        """Add the states of a checkpoint; returns how many were loaded.
+        Raises ValueError, loading nothing, when an entry isn't a state."""
+        states = []
+        for i, (key, d) in enumerate(read_checkpoint(path)):
+            try:
+                states.append((key, SeriesState.from_dict(d)))
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f'{path}: entry {i} ({key}) is not a forecast state: {e!r}') from e
+        with self._lock:
+            for key, state in states:
+                self._put(key, state)
+        return min(len(states), self.maxsize)
+
+
+def read_checkpoint(path: str):
+    """(key, state dict) of every entry of a checkpoint file, [] when there is none.
+    Raises ValueError for a file that isn't a checkpoint."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError(f'{path} is not a forecast state checkpoint')
+    for i, entry in enumerate(entries):
+        state = entry.get('state') if isinstance(entry, dict) else None
+        if not isinstance(state, dict) or not isinstance(entry.get('key'), str) \
+                or any(name not in state for name in SeriesState.__slots__):
+            raise ValueError(f'{path}: entry {i} is not a forecast state')
+    return [(entry['key'], entry['state']) for entry in entries]
+
+
+def _last_day(state: dict) -> int:
+    return state['first'] + state['n'] - 1
+
+
+@contextmanager
+def _locked(path: str):
+    """Hold an exclusive lock on `path`.lock, so checkpoints of several
+    processes are merged one after the other."""
+    if fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,480 @@
+"""
+Crop price forecasting for /predict and /predict/batch, in NumPy.
+
+The backend posts a crop's daily price history (the last year of
+`historical_prices: [{date, price}, ...]`) and wants the next days' prices.
+Every series gets its own linear regression, fitted by least squares:
+
+    price[t] = level + slope·t + weekday[t] + a1·price[t-1] + a7·price[t-7]
+
+a trend, weekly seasonality and two lag features. Shorter histories drop
+the terms they can't support (model_terms); below MIN_MODEL_POINTS days the
+forecast is the mean of the last week. Forecasts beyond one day run the
+regression forward on its own predictions.
+
+Intervals come from the model's own multi-day errors: the fitted model is
+run forward from every day of the history at once and the RMS of its
+h-day-ahead errors sets the interval at horizon h. Each forecast is also
+backtested: the model is refitted without the last days, forecasts them,
+and its MAPE is reported next to that of repeating the last price.
+
+Series are fitted in panels: series with the same terms are right-aligned
+in one zero-padded matrix, and every step is an array operation over all
+of them (batched normal equations for the fits, one multiply-add per
+forecast day for the forecasts). A single /predict is a panel of one.
+Panels are cut so that their largest array stays near PANEL_BUDGET values;
+forecast_many can also spread a very large request over worker processes.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+WEEK = 7
+# Longest forecast and the history span used (older points are ignored)
+MAX_DAYS = 90
+MAX_HISTORY_DAYS = 3 * 365
+# Days of history needed for the regression, and for its weekday terms
+MIN_MODEL_POINTS = 14
+MIN_WEEKLY_POINTS = 4 * WEEK
+# Central probability of the lower/upper bounds (normal quantile below)
+INTERVAL = 0.9
+_Z = 1.6449
+# |change| of the forecast mean against the last week, in percent, below
+# which the trend is 'stable'
+STABLE_PCT = 2.0
+# Price and confidence answered without any history (as the mock did)
+DEFAULT_PRICE = 50.0
+# Values in the largest array of one panel (the multi-day error sweep)
+PANEL_BUDGET = 1 << 21
+
+
+class ForecastError(ValueError):
+    """The posted history can't be read as a price series."""
+
+
+def model_terms(n: int) -> tuple:
+    """Regression terms a history of n days supports."""
+    if n >= MIN_WEEKLY_POINTS:
+        return ('trend', 'weekly', 'lag1', 'lag7')
+    if n >= MIN_MODEL_POINTS:
+        return ('trend', 'lag1')
+    return ()
+
+
+def forecast_days(days) -> int:
+    """`days` of a request as a number of days to forecast (1 to MAX_DAYS)."""
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        raise ForecastError('days must be a whole number') from None
+    if not 1 <= days <= MAX_DAYS:
+        raise ForecastError(f'days must be between 1 and {MAX_DAYS}')
+    return days
+
+
+def daily_series(history):
+    """(first day, one price per day) from [{date, price}, ...].
+
+    Prices on the same day are averaged and missing days interpolated
+    linearly. Dates are ISO strings; anything after the date is ignored.
+    """
+    if not isinstance(history, list):
+        raise ForecastError('historical_prices must be a list of {"date", "price"} objects')
+    try:
+        days = np.array([str(point['date'])[:10] for point in history], dtype='datetime64[D]')
+        prices = np.array([point['price'] for point in history], dtype=np.float64)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ForecastError('Every historical price must be {"date": "YYYY-MM-DD...", "price": number}: '
+                            f'{e}') from e
+    if not len(days):
+        return None, np.empty(0)
+    if not np.isfinite(prices).all():
+        raise ForecastError('Historical prices must be finite numbers')
+
+    first = max(days.min(), days.max() - (MAX_HISTORY_DAYS - 1))
+    keep = days >= first
+    offsets = (days[keep] - first).astype(np.int64)
+    sums = np.bincount(offsets, weights=prices[keep])
+    counts = np.bincount(offsets)
+    seen = np.flatnonzero(counts)
+    grid = np.arange(len(counts))
+    return first, np.interp(grid, seen, sums[seen] / counts[seen])
+
+
+def _weekday(day) -> int:
+    """Monday = 0, like datetime.weekday()."""
+    return int((day.astype('datetime64[D]').astype(np.int64) - 4) % WEEK)
+
+
+# ── Panels ───────────────────────────────────────────────────────────────────
+
+class Panel:
+    """Daily series with the same terms, right-aligned in one matrix.
+
+    Row i of Y holds series i after `offset[i]` columns of padding, so day t
+    of series i is column t + offset[i] and every series ends in the last
+    column. dow0[i] is the weekday of its first day.
+    """
+
+    def __init__(self, ys, dow0, terms):
+        lengths = np.array([len(y) for y in ys])
+        width = int(lengths.max())
+        self.terms = terms
+        self.lags = WEEK if 'lag7' in terms else 1
+        self.offset = width - lengths
+        self.dow0 = np.asarray(dow0)
+        self.Y = np.zeros((len(ys), width))
+        for row, y, offset in zip(self.Y, ys, self.offset):
+            row[offset:] = y
+
+    def _dow(self, t):
+        return (self.dow0.reshape((-1,) + (1,) * (t.ndim - 1)) + t) % WEEK
+
+    def design(self, t, lag1, lag7):
+        """Regression inputs (series, ..., terms) for days t of shape (series, ...)."""
+        columns = [np.ones(t.shape)]
+        if 'trend' in self.terms:
+            columns.append(t / 365.0)
+        if 'weekly' in self.terms:
+            dow = self._dow(t)
+            columns.extend((dow == d).astype(np.float64) for d in range(1, WEEK))
+        if 'lag1' in self.terms:
+            columns.append(lag1)
+        if 'lag7' in self.terms:
+            columns.append(lag7)
+        return np.stack(columns, axis=-1)
+
+    def deterministic(self, coef, t):
+        """Level + trend + weekday part of each series' regression for days t."""
+        per_series = (-1,) + (1,) * (t.ndim - 1)
+        part = np.broadcast_to(coef[:, 0].reshape(per_series), t.shape).copy()
+        i = 1
+        if 'trend' in self.terms:
+            part += coef[:, i].reshape(per_series) * (t / 365.0)
+            i += 1
+        if 'weekly' in self.terms:
+            effects = np.concatenate([np.zeros((len(coef), 1)), coef[:, i:i + WEEK - 1]], axis=1)
+            dow = self._dow(t).reshape(len(coef), -1)
+            part += np.take_along_axis(effects, dow, axis=1).reshape(t.shape)
+        return part
+
+    def run_forward(self, coef, Z, origins, steps):
+        """Forecasts (series, origins, steps) of `steps` days from every origin at once.
+
+        Z is Y in model units. [i, o] forecasts columns origins[o] ..
+        origins[o]+steps-1 of series i knowing the columns before. The level,
+        trend and weekday part is computed for all days up front; only the
+        lag terms are stepped through.
+        """
+        lags = self.lags
+        origins = np.asarray(origins)
+        window = np.empty((len(Z), len(origins), lags + steps))
+        window[:, :, :lags] = Z[:, origins[:, None] - lags + np.arange(lags)]
+        t = origins[None, :, None] - self.offset[:, None, None] + np.arange(steps)
+        window[:, :, lags:] = self.deterministic(coef, t)
+        lag7 = 'lag7' in self.terms
+        a1 = coef[:, -2 if lag7 else -1, None]
+        a7 = coef[:, -1, None] if lag7 else None
+        for k in range(lags, lags + steps):
+            window[:, :, k] += a1 * window[:, :, k - 1]
+            if lag7:
+                window[:, :, k] += a7 * window[:, :, k - WEEK]
+        return window[:, :, lags:]
+
+    def fit(self, steps, errors=True):
+        """(coef, scale, sigma) per series.
+
+        coef are the coefficients on prices divided by `scale` (the mean
+        price); sigma the RMS error per forecast day 1..steps, in price
+        units, or None without `errors`.
+        """
+        width = self.Y.shape[1]
+        n = width - self.offset
+        scale = np.abs(self.Y.sum(axis=1) / n)
+        scale[scale == 0] = 1.0
+        Z = self.Y / scale[:, None]
+        columns = np.arange(self.lags, width)
+        t = columns - self.offset[:, None]
+        # Only targets whose lags all lie inside the series count
+        weight = (t >= self.lags).astype(np.float64)
+        X = self.design(t, Z[:, columns - 1], Z[:, columns - WEEK] if 'lag7' in self.terms else None)
+        Xw = X * weight[:, :, None]
+        Xt = Xw.transpose(0, 2, 1)
+        A = Xt @ X
+        b = Xt @ Z[:, columns, None]
+        # pinv keeps collinear inputs (a constant price, say) solvable, as lstsq did
+        coef = (np.linalg.pinv(A, rcond=1e-10) @ b)[:, :, 0]
+        if not errors:
+            return coef, scale, None
+
+        predicted = self.run_forward(coef, Z, columns, steps)
+        target = columns[:, None] + np.arange(steps)
+        known = (target < width) & (weight[:, :, None] > 0)
+        err = np.where(known, predicted - Z[:, np.minimum(target, width - 1)], 0.0)
+        counts = known.sum(axis=1)
+        sigma = np.sqrt((err ** 2).sum(axis=1) / np.maximum(counts, 1))
+        # Horizons with too few past errors grow from the last well-measured one
+        measured = counts >= 5
+        last = np.where(measured.any(axis=1), steps - 1 - np.argmax(measured[:, ::-1], axis=1), 0)
+        horizon = np.arange(steps)
+        grown = sigma[np.arange(len(sigma)), last][:, None] * np.sqrt((horizon + 1) / (last[:, None] + 1))
+        sigma = np.where(horizon > last[:, None], grown, sigma)
+        return coef, scale, sigma * scale[:, None]
+
+    def predict(self, coef, scale, steps):
+        """Point forecasts (series, steps) of the days after each series, in price units."""
+        Z = self.Y / scale[:, None]
+        return self.run_forward(coef, Z, [Z.shape[1]], steps)[:, 0] * scale[:, None]
+
+
+def _naive(y, steps):
+    """Last week's mean, with an error growing like a random walk's."""
+    spread = np.std(np.diff(y)) if len(y) >= 3 else 0.05 * abs(y[-WEEK:].mean())
+    return np.full(steps, y[-WEEK:].mean()), spread * np.sqrt(np.arange(1, steps + 1))
+
+
+def panels(ys, steps):
+    """Index lists of the series to fit together.
+
+    Series are grouped by terms, sorted by length within a group, and cut
+    where the next series would take the panel's error sweep, about
+    series × longest length × (lags + steps) values, past PANEL_BUDGET.
+    """
+    groups = {}
+    for i, y in enumerate(ys):
+        groups.setdefault(model_terms(len(y)), []).append(i)
+    for terms, members in groups.items():
+        if not terms:
+            yield terms, members
+            continue
+        members.sort(key=lambda i: len(ys[i]))
+        chunk, horizon = [], 0
+        for i in members:
+            wider = max(horizon, steps[i])
+            if chunk and (len(chunk) + 1) * len(ys[i]) * (WEEK + wider) > PANEL_BUDGET:
+                yield terms, chunk
+                chunk, wider = [], steps[i]
+            chunk.append(i)
+            horizon = wider
+        yield terms, chunk
+
+
+def fit_predict(ys, dow0, steps, errors=True):
+    """Point forecasts of the steps[i] days after each ys[i], and with `errors`
+    their RMS error per day. Returns (terms, points, sigmas), aligned with ys."""
+    terms, points, sigmas = [None] * len(ys), [None] * len(ys), [None] * len(ys)
+    for group_terms, chunk in panels(ys, steps):
+        for i in chunk:
+            terms[i] = group_terms
+        if not group_terms:
+            for i in chunk:
+                points[i], sigmas[i] = _naive(ys[i], steps[i])
+            continue
+        panel = Panel([ys[i] for i in chunk], [dow0[i] for i in chunk], group_terms)
+        horizon = max(steps[i] for i in chunk)
+        coef, scale, sigma = panel.fit(horizon, errors)
+        predicted = panel.predict(coef, scale, horizon)
+        for row, i in enumerate(chunk):
+            points[i] = predicted[row, :steps[i]]
+            if errors:
+                sigmas[i] = sigma[row, :steps[i]]
+    return terms, points, sigmas
+
+
+def backtest_many(ys, dow0, days):
+    """Per series: MAPE of forecasting its last days from the rest, and of
+    repeating the last known price; None when it is too short to hold days out.
+    Held-out days with a zero price have no percentage error and are left
+    out (None when every one is zero)."""
+    holds = [min(d, len(y) // 5) for y, d in zip(ys, days)]
+    usable = [i for i, (y, hold) in enumerate(zip(ys, holds)) if hold and model_terms(len(y) - hold)]
+    out = [None] * len(ys)
+    if not usable:
+        return out
+    train = [ys[i][:-holds[i]] for i in usable]
+    _, points, _ = fit_predict(train, [dow0[i] for i in usable], [holds[i] for i in usable], errors=False)
+    for i, y, point in zip(usable, train, points):
+        actual = ys[i][-holds[i]:]
+        priced = actual != 0
+        if not priced.any():
+            continue
+        point, actual = point[priced], actual[priced]
+        out[i] = {
+            'backtest_days': int(holds[i]),
+            'mape': round(float(np.mean(np.abs(point - actual) / np.abs(actual)) * 100), 2),
+            'naive_mape': round(float(np.mean(np.abs(y[-1] - actual) / np.abs(actual)) * 100), 2),
+        }
+    return out
+
+
+# ── Forecasts ────────────────────────────────────────────────────────────────
+
+def forecast(history, days: int = 7, holidays=(), today=None) -> dict:
+    """Forecast of the `days` days after today (or after the history, if later).
+
+    holidays: [{date, name}]; forecast days that fall on one are marked.
+    """
+    result = forecast_many([(history, days, holidays)], today)[0]
+    if isinstance(result, ForecastError):
+        raise result
+    return result
+
+
+def forecast_many(series, today=None, processes: int = 0) -> list:
+    """forecast() of every (history, days, holidays) in `series`, fitted together.
+
+    Returns, per series, its forecast or the ForecastError it raised. With
+    processes > 1 the series are split into that many shards, forecast in
+    worker processes. If a worker has died, the pool is replaced and this
+    call forecasts in process.
+    """
+    today = np.datetime64(today or 'today', 'D')
+    if processes > 1 and len(series) >= 2 * processes:
+        size = -(-len(series) // processes)
+        shards = [series[i:i + size] for i in range(0, len(series), size)]
+        pool = _pool(processes)
+        try:
+            return [result for part in pool.map(forecast_many, shards, [str(today)] * len(shards))
+                    for result in part]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+
+    results = [None] * len(series)
+    parsed = []   # (index, first day, daily prices, days, gap)
+    for i, (history, days, holidays) in enumerate(series):
+        try:
+            days = forecast_days(days)
+            if not isinstance(holidays, (list, tuple)):
+                raise ForecastError('market_holidays must be a list of {"date", "name"} objects')
+            first, y = daily_series(history)
+        except ForecastError as e:
+            results[i] = e
+            continue
+        if not len(y):
+            results[i] = _no_history(today, days)
+            continue
+        # Forecast through the gap between the last price and today, then report `days`
+        try:
+            gap = stale_gap(first + (len(y) - 1), today)
+        except ForecastError as e:
+            results[i] = e
+            continue
+        parsed.append((i, first, y, days, gap))
+    if not parsed:
+        return results
+
+    ys = [y for _, _, y, _, _ in parsed]
+    dow0 = [_weekday(first) for _, first, _, _, _ in parsed]
+    terms, points, sigmas = fit_predict(ys, dow0, [days + gap for _, _, _, days, gap in parsed])
+    metrics = backtest_many(ys, dow0, [days for _, _, _, days, _ in parsed])
+    for (i, first, y, days, gap), t, point, sigma, m in zip(parsed, terms, points, sigmas, metrics):
+        model = {'terms': list(t), 'history_days': len(y), 'interval': INTERVAL}
+        results[i] = result(first + (len(y) + gap), y[-WEEK:].mean(), point[gap:], sigma[gap:],
+                            model, m, series[i][2])
+    return results
+
+
+def stale_gap(last, today) -> int:
+    """Days from the last price to today (0 if it's today or later).
+
+    Raises ForecastError past MAX_DAYS: running the model that far ahead
+    says nothing about the days after today.
+    """
+    gap = max(int((np.datetime64(today, 'D') - np.datetime64(last, 'D')).astype(np.int64)), 0)
+    if gap > MAX_DAYS:
+        raise ForecastError(f'historical_prices end on {np.datetime64(last, "D")}, more than {MAX_DAYS} '
+                            f'days before {np.datetime64(today, "D")}; send recent prices')
+    return gap
+
+
+def result(start, recent, point, sigma, model, metrics, holidays) -> dict:
+    """forecast() response for forecasts `point` ± `sigma` (RMS) of the days
+    from `start` on; `recent` is the mean price of the last week."""
+    days = len(point)
+    point = np.maximum(point, 0.0)
+    half = _Z * sigma
+    dates = start + np.arange(days)
+
+    names = {str(h.get('date'))[:10]: h.get('name') for h in holidays or () if isinstance(h, dict)}
+    predictions = []
+    for date, price, width in zip(dates.astype(str), point.tolist(), half.tolist()):
+        prediction = {
+            'date': date,
+            'predicted_price': round(price, 2),
+            'lower': round(max(price - width, 0.0), 2),
+            'upper': round(price + width, 2),
+            'confidence': round(min(max(1 - width / price, 0.0), 1.0), 2) if price > 0 else 0.0,
+        }
+        if date in names:
+            prediction['holiday'] = names[date]
+        predictions.append(prediction)
+
+    change = float((point.mean() / recent - 1) * 100) if recent else 0.0
+    trend = 'up' if change > STABLE_PCT else 'down' if change < -STABLE_PCT else 'stable'
+    return {
+        'predictions': predictions,
+        'trend': trend,
+        'change_pct': round(change, 2),
+        'recommendation': _recommendation(trend, change, days),
+        'model': model,
+        'metrics': metrics,
+    }
+
+
+def _recommendation(trend, change, days):
+    if trend == 'up':
+        return f'Prices expected to rise {change:.1f}% over the next {days} days: consider waiting to sell'
+    if trend == 'down':
+        return f'Prices expected to fall {-change:.1f}% over the next {days} days: good time to sell'
+    return 'Prices expected to stay stable'
+
+
+def _no_history(today, days):
+    dates = (today + 1 + np.arange(days)).astype(str)
+    return {
+        'predictions': [{'date': d, 'predicted_price': DEFAULT_PRICE, 'lower': None, 'upper': None,
+                         'confidence': 0.5} for d in dates],
+        'trend': 'stable',
+        'change_pct': 0.0,
+        'recommendation': 'Limited data available',
+        'model': {'terms': [], 'history_days': 0, 'interval': INTERVAL},
+        'metrics': None,
+    }
+
+
+# ── Process pool ─────────────────────────────────────────────────────────────
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _pool(processes: int) -> ProcessPoolExecutor:
+    """This process's forecasting workers, started on first use.
+
+    Workers come from a fork server (or are spawned) rather than forked
+    from the service, whose request and loader threads a fork would copy
+    mid-flight. A process forked after the pool started (a gunicorn
+    worker) starts its own.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            _executor = ProcessPoolExecutor(processes, mp_context=context)
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Forget a broken pool, so the next call to _pool starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,103 @@
+"""
+Production launcher for the ml-service:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app — and with it every model artifact — is loaded once in the master
+process (preload_app) and the workers are forked from it, so they share the
+model memory copy-on-write instead of each unpickling their own copy.
+
+Tuning (environment variables):
+
+  PORT                port to bind (default 5001)
+  ML_WORKERS          worker processes (default: number of CPUs); streaming
+                      ingestion (/ingest/prices) needs ML_WORKERS=1
+  ML_THREADS          request threads per worker (default: ML_MAX_CONCURRENCY +
+                      ML_MAX_QUEUE + 2, so the admission queue fills up and
+                      rejects before connections pile up unseen in gunicorn)
+  ML_XGB_THREADS      XGBoost threads per worker (default: CPUs / workers, at least 1)
+  ML_MAX_CONCURRENCY  inference requests run at once per worker (default:
+                      that worker's share of the CPUs / ML_XGB_THREADS, doubled
+                      and at least 2 with ML_COALESCE_WAIT_MS set, so the
+                      micro-batching queue gets concurrent calls to batch)
+  ML_PIN_WORKERS=1    pin each worker to its own slice of the CPUs (a
+                      restarted worker takes the slice its predecessor freed)
+  ML_PRELOAD=0        load the models in every worker instead (for comparison;
+                      ML_LOAD_MODE then applies per worker)
+"""
+import gc
+import multiprocessing
+import os
+
+_cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5001)}"
+workers = int(os.getenv('ML_WORKERS', _cpus))
+# The app refuses /ingest/prices with more than one worker (per-worker state)
+os.environ['ML_WORKERS'] = str(workers)
+worker_class = 'gthread'
+preload_app = os.getenv('ML_PRELOAD', '1') != '0'
+timeout = int(os.getenv('ML_WORKER_TIMEOUT', 30))
+keepalive = 5
+
+# Split the cores between workers so their XGBoost/OpenMP pools don't
+# oversubscribe the machine. Set before the app (and xgboost) is imported.
+xgb_threads = int(os.getenv('ML_XGB_THREADS') or max(1, _cpus // workers))
+os.environ['ML_XGB_THREADS'] = str(xgb_threads)
+os.environ.setdefault('OMP_NUM_THREADS', str(xgb_threads))
+
+# Admission control (admission.py) works per worker: give each its share of
+# the cores, and enough threads to hold the running and queued requests.
+# With micro-batching, one slot per core would leave the coalescer a single
+# call at a time: let in twice as many (at least 2) so a batch can fill while
+# the previous one is scored.
+max_concurrency = max(1, _cpus // (workers * xgb_threads))
+if float(os.getenv('ML_COALESCE_WAIT_MS', 0)) > 0:
+    max_concurrency = max(2, 2 * max_concurrency)
+max_concurrency = int(os.getenv('ML_MAX_CONCURRENCY') or max_concurrency)
+os.environ['ML_MAX_CONCURRENCY'] = str(max_concurrency)
+threads = int(os.getenv('ML_THREADS')
+              or (max_concurrency + int(os.getenv('ML_MAX_QUEUE', 16)) + 2 if max_concurrency else 4))
+
+# With preloading the models must be fully loaded before the fork: a
+# background loader thread wouldn't survive it.
+if preload_app:
+    os.environ['ML_LOAD_MODE'] = 'eager'
+
+
+def when_ready(server):
+    # Models are loaded by now. Move everything into the permanent GC
+    # generation so collections in the workers don't touch (and copy) the
+    # shared pages.
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Thread pools (XGBoost's, OpenMP's) don't survive the fork: warm every
+    # model up again before this worker accepts a request
+    from app import warm_up
+    warm_up()
+
+
+def pre_fork(server, worker):
+    # In the master: give the new worker the CPU slot the fewest live workers
+    # hold. Dead workers are already reaped from server.WORKERS, so a
+    # replacement takes the slot its predecessor had.
+    taken = [getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()]
+    worker.cpu_slot = min(range(max(server.num_workers, 1)), key=taken.count)
+
+
+def post_fork(server, worker):
+    if os.getenv('ML_PIN_WORKERS') != '1' or not hasattr(os, 'sched_setaffinity'):
+        return
+    cpus = sorted(os.sched_getaffinity(0))
+    slot = worker.cpu_slot
+    mine = {cpus[(slot * xgb_threads + i) % len(cpus)] for i in range(xgb_threads)}
+    os.sched_setaffinity(0, mine)
+    server.log.info(f"[ML] Worker {worker.pid} pinned to CPUs {sorted(mine)}")
+
+
+def worker_exit(server, worker):
+    from app import save_cache_snapshot
+    save_cache_snapshot()
@@ -0,0 +1,171 @@
+"""
+Counters, gauges and latency histograms rendered in the Prometheus text format.
+
+Recording is lock-free: every thread writes to its own shard (a dict of plain
+lists, found through a threading.local), so request threads never contend
+with each other or with a scrape. The only lock guards the list of shards
+and is taken once per thread, when it records its first value, and on scrape.
+A scrape sums the shards; shards of threads that have exited are folded into
+one so per-connection threads (Flask's dev server) don't pile up.
+
+    metrics = Metrics()
+    metrics.describe('ml_requests_total', 'counter', 'Requests handled')
+    metrics.inc('ml_requests_total', (('route', '/health'),))
+    with metrics.timer('ml_stage_seconds', (('stage', 'encode'),)):
+        ...
+    text = metrics.render()
+"""
+import bisect
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Shard:
+    __slots__ = ('thread', 'values', 'histograms')
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.values = {}       # (name, labels) → [value]
+        self.histograms = {}   # (name, labels) → [bucket counts..., +Inf count, sum]
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, self.labels, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Registry of labelled metrics; labels are tuples of (name, value) pairs."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._meta = {}   # name → (type, help)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help_text: str):
+        """Declare a metric: kind is 'counter', 'gauge' or 'histogram'."""
+        self._meta[name] = (kind, help_text)
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def inc(self, name: str, labels=(), value: float = 1):
+        """Add to a counter or gauge (gauges go down with a negative value)."""
+        values = self._shard().values
+        slot = values.get((name, labels))
+        if slot is None:
+            values[(name, labels)] = [value]
+        else:
+            slot[0] += value
+
+    def observe(self, name: str, labels, seconds: float):
+        """Record one value in a histogram."""
+        histograms = self._shard().histograms
+        slot = histograms.get((name, labels))
+        if slot is None:
+            slot = histograms[(name, labels)] = [0] * (len(self.buckets) + 1) + [0.0]
+        slot[bisect.bisect_left(self.buckets, seconds)] += 1
+        slot[-1] += seconds
+
+    def timer(self, name: str, labels=()):
+        """Context manager observing the seconds spent inside it."""
+        return _Timer(self, name, labels)
+
+    # ── Scraping ─────────────────────────────────────────────────────────────
+    def _collect(self):
+        """Sum all shards → (values, histograms), folding in finished threads."""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    _fold(self._retired, shard)
+            self._shards = live
+            shards = [self._retired] + live
+        values, histograms = {}, {}
+        for shard in shards:
+            # list() copies: the owning thread may add keys while we read
+            for key, slot in list(shard.values.items()):
+                values[key] = values.get(key, 0) + slot[0]
+            for key, slot in list(shard.histograms.items()):
+                total = histograms.get(key)
+                histograms[key] = list(slot) if total is None else [a + b for a, b in zip(total, slot)]
+        return values, histograms
+
+    def snapshot(self) -> dict:
+        """{name: {labels: value}} for counters and gauges, mostly for tests."""
+        out = {}
+        for (name, labels), value in self._collect()[0].items():
+            out.setdefault(name, {})[labels] = value
+        return out
+
+    def render(self) -> str:
+        values, histograms = self._collect()
+        by_name = {}
+        for (name, labels), value in values.items():
+            by_name.setdefault(name, []).append((labels, value))
+        for (name, labels), slot in histograms.items():
+            by_name.setdefault(name, []).append((labels, slot))
+
+        lines = []
+        for name in sorted(by_name):
+            default = 'histogram' if isinstance(by_name[name][0][1], list) else 'untyped'
+            kind, help_text = self._meta.get(name, (default, ''))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(by_name[name]):
+                if not isinstance(value, list):
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), value):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _fold(into: _Shard, shard: _Shard):
+    for key, slot in shard.values.items():
+        into.values.setdefault(key, [0])[0] += slot[0]
+    for key, slot in shard.histograms.items():
+        total = into.histograms.get(key)
+        into.histograms[key] = list(slot) if total is None else [a + b for a, b in zip(total, slot)]
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+
+def _number(value) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
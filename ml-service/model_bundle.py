@@ -0,0 +1,189 @@
+"""
+Versioned on-disk bundle of one trained model.
+
+A bundle is a directory (`models/<name>.bundle/`) holding everything the
+service needs to serve a model, with nothing unpickled on load:
+
+  manifest.json  format version, feature order, encoder classes as plain
+                 arrays, content hash and per-file hashes
+  booster.ubj    the classifier in XGBoost's native UBJSON format (saved via
+                 XGBClassifier.save_model, so the sklearn attributes survive)
+  trees/*.npy    the trees compiled by tree_ensemble.py, opened memory-mapped
+
+The trees are stored twice, as the booster and compiled: a bundle is a bit
+larger than the pickle it replaces, but the numpy backend can serve it
+from the compiled trees alone, without reading the booster or importing
+xgboost (`load_bundle(path, booster=False)`).
+
+The content hash covers every payload file and the manifest's model fields;
+its first 12 hex digits are the model version used in cache keys and
+responses. `load_bundle` recomputes it and refuses a bundle that doesn't
+match.
+
+Written by train_model.py / train_crop_model.py (or compress_model.py --save), or converted from the old
+joblib pickles with convert_models.py.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from tree_ensemble import TreeEnsemble, compile_booster
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = 'manifest.json'
+BOOSTER_FILE = 'booster.ubj'
+TREES_DIR = 'trees'
+
+# Manifest fields covered by the content hash
+_HASHED_FIELDS = ('format', 'name', 'feature_names', 'classes', 'categories', 'n_features', 'files')
+
+
+class BundleError(ValueError):
+    """A bundle is missing, from an unknown format version, or corrupt."""
+
+
+def bundle_path(models_dir: str, name: str) -> str:
+    return os.path.join(models_dir, f'{name}.bundle')
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _content_hash(manifest: dict) -> str:
+    fields = {key: manifest[key] for key in _HASHED_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def _payload_files(path: str):
+    """Relative paths of every payload file in a bundle directory, sorted."""
+    files = [BOOSTER_FILE]
+    files += sorted(f'{TREES_DIR}/{f}' for f in os.listdir(os.path.join(path, TREES_DIR)))
+    return files
+
+
+def write_bundle(path: str, name: str, model, feature_names, classes, categories=None) -> dict:
+    """Write a fitted XGBClassifier and its encoders as a bundle; returns the manifest.
+
+    classes:    target labels in class-index order
+    categories: {dataset column: labels in code order} per categorical feature
+    The bundle is written next to `path` and renamed into place.
+    """
+    tmp = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(os.path.join(tmp, TREES_DIR))
+
+    model.save_model(os.path.join(tmp, BOOSTER_FILE))
+    try:
+        n_rounds = model.best_iteration + 1
+    except AttributeError:
+        n_rounds = None
+    ensemble = compile_booster(model.get_booster(), n_rounds=n_rounds)
+    for array in TreeEnsemble.ARRAYS:
+        np.save(os.path.join(tmp, TREES_DIR, f'{array}.npy'), getattr(ensemble, array))
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'name': name,
+        'feature_names': [str(f) for f in feature_names],
+        'classes': np.asarray(classes).tolist(),
+        'categories': {col: np.asarray(values).tolist() for col, values in (categories or {}).items()},
+        'n_features': ensemble.n_features,
+        'files': {f: _file_hash(os.path.join(tmp, f)) for f in _payload_files(tmp)},
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    }
+    manifest['sha256'] = _content_hash(manifest)
+    manifest['version'] = manifest['sha256'][:12]
+    with open(os.path.join(tmp, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # A directory can't be os.replace()d over a non-empty one: move the old
+    # bundle aside first so `path` is only ever missing for an instant.
+    old = f'{path}.{os.getpid()}.old'
+    if os.path.exists(path):
+        os.rename(path, old)
+    os.rename(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+class ModelBundle:
+    """A loaded bundle: the classifier (None when it wasn't read), its
+    compiled trees and its encoders."""
+
+    def __init__(self, path: str, manifest: dict, model, ensemble: TreeEnsemble):
+        self.path = path
+        self.manifest = manifest
+        self.model = model
+        self.ensemble = ensemble
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    @property
+    def feature_names(self) -> list:
+        return self.manifest['feature_names']
+
+    @property
+    def classes(self) -> list:
+        return self.manifest['classes']
+
+    @property
+    def categories(self) -> dict:
+        return self.manifest['categories']
+
+
+def read_manifest(path: str) -> dict:
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise BundleError(f'No model bundle at {path}')
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f'{path}: unsupported bundle format {manifest.get("format")!r} '
+                          f'(expected {BUNDLE_FORMAT})')
+    return manifest
+
+
+def verify_bundle(path: str, manifest: dict):
+    """Raise BundleError unless every file and the manifest match their hashes."""
+    if set(_payload_files(path)) != set(manifest['files']):
+        raise BundleError(f'{path}: files differ from the manifest')
+    for name, expected in manifest['files'].items():
+        if _file_hash(os.path.join(path, name)) != expected:
+            raise BundleError(f'{path}: {name} does not match its hash')
+    if _content_hash(manifest) != manifest['sha256']:
+        raise BundleError(f'{path}: manifest does not match its hash')
+
+
+def load_bundle(path: str, verify: bool = True, booster: bool = True) -> ModelBundle:
+    """Load a bundle, checking its hashes first unless `verify` is False.
+
+    With `booster` False the classifier isn't read and xgboost isn't
+    imported: `model` is None and only the compiled trees can score.
+    """
+    manifest = read_manifest(path)
+    if verify:
+        verify_bundle(path, manifest)
+
+    model = None
+    if booster:
+        # Deferred so importing this module (and the app) doesn't pay for xgboost
+        import xgboost as xgb
+        model = xgb.XGBClassifier()
+        model.load_model(os.path.join(path, BOOSTER_FILE))
+    arrays = {
+        array: np.load(os.path.join(path, TREES_DIR, f'{array}.npy'), mmap_mode='r', allow_pickle=False)
+        for array in TreeEnsemble.ARRAYS
+    }
+    ensemble = TreeEnsemble(**arrays, n_features=manifest['n_features'])
+    return ModelBundle(path, manifest, model, ensemble)
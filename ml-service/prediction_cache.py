@@ -0,0 +1,135 @@
+"""
+In-process cache of top-k recommendations keyed by encoded feature vector.
+
+Keys are `<namespace>|<encoded row bytes>`, where the namespace names the model
+and its version (e.g. `fertilizer:3f9a...`), so answers from an older model
+can never be served after a reload. Rows can optionally be quantized first so
+near-identical soil readings share an entry.
+
+The cache is an LRU bounded to `maxsize` entries, each living at most `ttl`
+seconds, and counts hits, misses, evictions and expirations. It can write a
+snapshot to disk and warm itself from one on restart.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 600.0, quantum: float = 0.0,
+                 clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.quantum = quantum
+        self._clock = clock
+        self._entries = OrderedDict()   # key → (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def quantize(self, X: np.ndarray, numeric_mask) -> np.ndarray:
+        """Round the numeric columns of X to multiples of `quantum` (no-op when 0)."""
+        if not self.quantum:
+            return X
+        X = X.copy()
+        X[:, numeric_mask] = np.round(X[:, numeric_mask] / self.quantum) * self.quantum
+        return X
+
+    @staticmethod
+    def keys(namespace: str, X: np.ndarray) -> list:
+        """One cache key per row of X."""
+        prefix = namespace.encode() + b'|'
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        return [prefix + row.tobytes() for row in X]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'quantum': self.quantum,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    # ── Snapshots ────────────────────────────────────────────────────────────
+    def save(self, path: str) -> int:
+        """Write live entries to `path` (atomically); returns how many were written."""
+        now, wall = self._clock(), time.time()
+        with self._lock:
+            entries = [
+                {'key': key.hex(), 'expires': wall + (expires_at - now), 'value': value}
+                for key, (expires_at, value) in self._entries.items()
+                if expires_at > now
+            ]
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+        return len(entries)
+
+    def load(self, path: str, namespaces) -> int:
+        """Warm from a snapshot, keeping only unexpired entries of the given
+        namespaces (i.e. the models currently loaded). Returns entries loaded."""
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            entries = json.load(f)
+        prefixes = tuple(ns.encode() + b'|' for ns in namespaces)
+        now, wall = self._clock(), time.time()
+        loaded = 0
+        with self._lock:
+            for entry in entries:
+                key = bytes.fromhex(entry['key'])
+                remaining = entry['expires'] - wall
+                if remaining <= 0 or not key.startswith(prefixes):
+                    continue
+                self._entries[key] = (now + min(remaining, self.ttl), entry['value'])
+                loaded += 1
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return loaded
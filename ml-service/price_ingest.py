@@ -0,0 +1,176 @@
+"""
+Streaming ingestion of price history as newline-delimited JSON, into the
+incremental forecast state (forecast_state.py).
+
+One record per line, as the backend's PriceHistory documents:
+
+    {"cropName": "tomato", "region": "Pune", "market_name": "APMC", "price": 42.5, "date": "2024-01-05"}
+
+The body is read in CHUNK_BYTES pieces and split into lines as it comes,
+so only one chunk and the current batch are ever held. Lines are parsed
+and coerced BATCH_ROWS at a time (dates in one NumPy call), and each batch
+is added to the state before the next chunk is read. A client sending
+faster than that is held back by TCP, because nothing reads its socket in
+the meantime. ingest() yields one acknowledgement per batch and a summary.
+
+Records go to the series "<cropName>:<region>" (series_key), the one
+/predict forecasts for crop and location. Prices for one day, from any
+market of the region, are averaged. A record needs a non-empty cropName,
+a positive finite price (numbers or numeric strings) and an ISO date
+(a string, or mongoexport's {"$date": "..."}); the region may be left out.
+"""
+import json
+import math
+import time
+
+import numpy as np
+
+from forecast_state import series_key
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+CHUNK_BYTES = 1 << 16
+BATCH_ROWS = 5000
+MAX_LINE_BYTES = 1 << 16
+# Errors listed per acknowledgement (all of them are counted)
+MAX_ERRORS_LISTED = 10
+
+
+class IngestError(ValueError):
+    """The body can't be read as NDJSON at all (as opposed to a bad record)."""
+
+
+def ndjson_lines(read, chunk_bytes: int = CHUNK_BYTES, max_line: int = MAX_LINE_BYTES):
+    """(line number, bytes) of every non-empty line of a stream read with read(n)."""
+    number, tail = 0, b''
+    while True:
+        chunk = read(chunk_bytes)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        if len(tail) > max_line:
+            raise IngestError(f'Line {number + len(lines) + 1} is longer than {max_line} bytes')
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, line
+    if tail.strip():
+        yield number + 1, tail
+
+
+def _date_text(value):
+    if isinstance(value, dict):
+        value = value.get('$date')
+    if not isinstance(value, str):
+        raise ValueError('date must be an ISO date string')
+    return value[:10]
+
+
+def _price(value):
+    if isinstance(value, bool):
+        raise ValueError('price must be a number')
+    price = float(value)
+    if not math.isfinite(price) or price <= 0:
+        raise ValueError('price must be a positive number')
+    return price
+
+
+def coerce(lines):
+    """Parsed and checked records of (line number, bytes) lines.
+
+    Returns (keys, day numbers, prices, errors), the first three aligned;
+    errors are (line number, message) of the lines left out.
+    """
+    keys, dates, prices, numbers, errors = [], [], [], [], []
+    for number, line in lines:
+        try:
+            record = loads(line)
+            crop = record['cropName']
+            if not isinstance(crop, str) or not crop.strip():
+                raise ValueError('cropName must be a non-empty string')
+            price = _price(record['price'])
+            date = _date_text(record['date'])
+        except KeyError as e:
+            errors.append((number, f'missing {e}'))
+            continue
+        except (TypeError, ValueError) as e:   # includes JSON decoding errors
+            errors.append((number, str(e) or type(e).__name__))
+            continue
+        keys.append(series_key(crop, record.get('region')))
+        dates.append(date)
+        prices.append(price)
+        numbers.append(number)
+
+    try:
+        days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    except ValueError:
+        # Find the bad dates one by one
+        days, good = [], []
+        for i, (date, number) in enumerate(zip(dates, numbers)):
+            try:
+                days.append(np.datetime64(date, 'D').astype(np.int64))
+                good.append(i)
+            except ValueError:
+                errors.append((number, f'unreadable date {date!r}'))
+        keys = [keys[i] for i in good]
+        prices = [prices[i] for i in good]
+        days = np.array(days, dtype=np.int64)
+    return keys, days, np.array(prices), errors
+
+
+def ingest(read, store, batch_rows: int = BATCH_ROWS, chunk_bytes: int = CHUNK_BYTES):
+    """Add the NDJSON records of a stream to `store`, yielding one
+    acknowledgement per batch and then a summary (see the module docstring)."""
+    start = time.perf_counter()
+    totals = {'rows': 0, 'accepted': 0, 'stale': 0, 'rejected': 0}
+    batch, number = [], 0
+    try:
+        for line in ndjson_lines(read, chunk_bytes):
+            batch.append(line)
+            if len(batch) >= batch_rows:
+                number += 1
+                yield _apply(number, batch, store, totals)
+                batch = []
+    except IngestError as e:
+        yield {'error': str(e), **totals}
+        return
+    if batch:
+        number += 1
+        yield _apply(number, batch, store, totals)
+
+    seconds = time.perf_counter() - start
+    yield {
+        'done': True,
+        **totals,
+        'batches': number,
+        'series': len(store),
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(totals['rows'] / seconds) if seconds else None,
+    }
+
+
+def _apply(number, batch, store, totals):
+    start = time.perf_counter()
+    keys, days, prices, errors = coerce(batch)
+    # Oldest first, so a batch that isn't in date order isn't mostly stale
+    order = np.argsort(days, kind='stable')
+    added = store.add_many([keys[i] for i in order], days[order].tolist(), prices[order].tolist())
+    ack = {
+        'batch': number,
+        'rows': len(batch),
+        'accepted': added,
+        'stale': len(keys) - added,
+        'rejected': len(errors),
+    }
+    for key in ('rows', 'accepted', 'stale', 'rejected'):
+        totals[key] += ack[key]
+    if errors:
+        ack['errors'] = [{'line': line, 'error': message}
+                         for line, message in sorted(errors)[:MAX_ERRORS_LISTED]]
+    ack['seconds'] = round(time.perf_counter() - start, 4)
+    return ack
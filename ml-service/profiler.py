@@ -0,0 +1,102 @@
+"""
+Low-overhead profiling of a live service.
+
+Two tools, both behind the /admin endpoints in app.py:
+
+  sample_stacks   a wall-clock stack sampler: every `interval` seconds it
+                  reads the Python stack of each selected thread from
+                  sys._current_frames() and counts identical stacks. The
+                  result formats as collapsed stacks ("a;b;c <count>" per
+                  line), the input format of flamegraph.pl and speedscope.
+                  Nothing runs in the sampled threads, so when no profile is
+                  being taken there is no cost at all.
+  profile_report  turns a cProfile.Profile of one request into a text
+                  report; used for per-request profiling, where a sampler
+                  would catch only a handful of stacks.
+
+Reports of profiled requests are kept in a small ProfileStore so they can be
+fetched after the response has gone out.
+"""
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+# Deepest stack recorded; deeper frames (closest to the thread's start) are cut
+MAX_DEPTH = 128
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+def _stack(frame) -> list:
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def sample_stacks(seconds: float, interval: float = 0.005, threads=None):
+    """Sample thread stacks for `seconds`, from the calling thread.
+
+    threads: callable returning the set of thread idents to sample at each
+             tick, or None for every thread except the sampler itself.
+    Returns (Counter of stack tuples, number of ticks).
+    """
+    me = threading.get_ident()
+    names = {}
+    stacks = Counter()
+    ticks = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        wanted = threads() if threads is not None else None
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (wanted is not None and ident not in wanted):
+                continue
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stacks[(names.get(ident, str(ident)), *_stack(frame))] += 1
+        ticks += 1
+        time.sleep(interval)
+    return stacks, ticks
+
+
+def format_collapsed(stacks: Counter) -> str:
+    """Collapsed-stack text: one `frame;frame;...;frame count` line per stack."""
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+def profile_report(profile, limit: int = 40) -> str:
+    """Functions of a cProfile.Profile sorted by cumulative time, as text."""
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+class ProfileStore:
+    """The last `maxsize` per-request profile reports, by id."""
+
+    def __init__(self, maxsize: int = 20):
+        self.maxsize = maxsize
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, report: str) -> str:
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._reports[profile_id] = report
+            while len(self._reports) > self.maxsize:
+                self._reports.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str):
+        with self._lock:
+            return self._reports.get(profile_id)
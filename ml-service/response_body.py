@@ -0,0 +1,81 @@
+"""
+JSON bodies of the recommendation routes, assembled from precomputed bytes.
+
+Most of a recommendation response is the same for every request served by
+one model version: the soil/crop type lists of /recommend-fertilizer, the
+model version, and the JSON of every class label. ResponseFragments encodes
+those once, when the model loads; a request then only serializes what is its
+own (the echoed input and the confidences) and joins the pieces:
+
+    fragments = ResponseFragments('fertilizer', labels, {'available_soil_types': [...]}, version)
+    body = fragments.body(input_json, fragments.recommendations(idx, conf))
+
+`lean=True` leaves the static lists out (the model version stays); clients
+fetch them once from `metadata`, which is what /<route>/metadata serves.
+
+`dumps` uses orjson when it is installed and the json module with compact
+separators otherwise. The bytes are the same JSON document `jsonify` would
+produce, without its key sorting.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+if orjson is not None:
+    def dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:   # e.g. integers beyond 64 bits echoed from a request
+            return stdlib_dumps(obj)
+else:
+    dumps = stdlib_dumps
+
+_RANKS = (b'{"rank":1,', b'{"rank":2,', b'{"rank":3,')
+
+
+class ResponseFragments:
+    """Encoded parts of one model version's responses.
+
+    label_key: key of the label in each recommendation ('fertilizer', 'crop')
+    labels:    display label per class index
+    static:    fields sent with every full response, e.g. the category lists
+    """
+
+    def __init__(self, label_key: str, labels, static: dict, version: str, encode=None):
+        encode = encode or dumps
+        self.version = version
+        # '"fertilizer":"Urea","confidence":' per class index
+        self._labels = [b'"%s":%s,"confidence":' % (label_key.encode(), encode(str(label)))
+                        for label in labels]
+        tail = b'"model_version":%s}' % encode(version)
+        static_json = b''.join(b'%s:%s,' % (encode(key), encode(value)) for key, value in static.items())
+        self._tail = b',' + static_json + tail
+        self._lean_tail = b',' + tail
+        self.labels = [str(label) for label in labels]
+        self.metadata = encode({'model_version': version, 'labels': self.labels, **static})
+
+    def recommendations(self, idx, conf) -> bytes:
+        """`[{"rank": 1, <label_key>: ..., "confidence": ...}, ...]` for one row."""
+        labels = self._labels
+        return b'[' + b','.join(
+            rank + labels[i] + repr(c).encode() + b'}'
+            for rank, i, c in zip(_RANKS, idx, conf)
+        ) + b']'
+
+    def body(self, input_json: bytes, recommendations: bytes, lean: bool = False) -> bytes:
+        """One row's full response body."""
+        return (b'{"success":true,"input":' + input_json + b',"recommendations":' + recommendations
+                + (self._lean_tail if lean else self._tail))
+
+
+def batch_body(bodies) -> bytes:
+    """Response of a /batch route around the bodies of its rows."""
+    return b'{"success":true,"count":%d,"results":[%s]}' % (len(bodies), b','.join(bodies))
@@ -0,0 +1,159 @@
+"""
+Precomputed top-3 response table for the fertilizer model.
+
+Every feature the model sees is either a categorical code or a reading farmers
+report as an integer in a narrow range, and a tree ensemble is piecewise
+constant: its output only changes where an input crosses a split threshold.
+So the table gives each feature an axis over its configured integer range,
+merges neighbouring values that no split threshold separates into one cell,
+and stores the model's top-3 classes and confidences once per cell.
+
+An input is "on the grid" when every numeric feature is an integer inside its
+range; for those rows the table answers with a lookup, everything else falls
+back to the model. A table directory holds:
+
+  meta.json    axes, model version, build report
+  top3.npy     uint8  (cells, 3)  class indices, best first
+  conf.npy     uint16 (cells, 3)  confidences in tenths of a percent
+
+Both arrays are opened memory-mapped, so only the pages that are hit get read.
+"""
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+META_FILE = 'meta.json'
+TOP3_FILE = 'top3.npy'
+CONF_FILE = 'conf.npy'
+
+# Rows scored per model call while building
+BUILD_CHUNK = 1 << 18
+
+
+class ResponseTable:
+    """Memory-mapped lookup of the top-3 answer for on-grid inputs."""
+
+    def __init__(self, meta: dict, top3: np.ndarray, conf: np.ndarray):
+        self.meta = meta
+        self.model_version = meta['model_version']
+        self.top3 = top3
+        self.conf = conf
+        # Per feature (in model order): lowest value and value → cell-class map
+        self._axes = [(axis['lo'], np.asarray(axis['cells'], dtype=np.int64)) for axis in meta['axes']]
+        self._axis_lists = [(lo, cells.tolist()) for lo, cells in self._axes]
+        self._strides = np.asarray(meta['strides'], dtype=np.int64)
+        self._stride_list = self._strides.tolist()
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        top3 = np.load(os.path.join(path, TOP3_FILE), mmap_mode='r')
+        conf = np.load(os.path.join(path, CONF_FILE), mmap_mode='r')
+        return cls(meta, top3, conf)
+
+    @property
+    def n_cells(self):
+        return len(self.top3)
+
+    @property
+    def nbytes(self):
+        return self.top3.nbytes + self.conf.nbytes
+
+    def _cell(self, row):
+        """Cell index of one feature row, or None when it's off the grid."""
+        cell = 0
+        for value, (lo, cells), stride in zip(row, self._axis_lists, self._stride_list):
+            offset = value - lo
+            # NaN and inf are off the grid, as in the batch lookup
+            if not math.isfinite(offset) or offset != int(offset) or not 0 <= offset < len(cells):
+                return None
+            cell += cells[int(offset)] * stride
+        return cell
+
+    def lookup(self, X: np.ndarray):
+        """Answer the on-grid rows of X.
+
+        Returns (hit, idx, conf): a boolean mask over the rows, then the top-3
+        class indices (list of lists) and confidences in percent (list of
+        lists) for the rows where hit is True, in order.
+        """
+        if len(X) == 1:
+            cell = self._cell(X[0].tolist())
+            if cell is None:
+                return np.zeros(1, dtype=bool), [], []
+            return np.ones(1, dtype=bool), [self.top3[cell].tolist()], [(self.conf[cell] / 10).tolist()]
+
+        hit = np.ones(len(X), dtype=bool)
+        cell = np.zeros(len(X), dtype=np.int64)
+        for j, (lo, cells) in enumerate(self._axes):
+            offset = X[:, j] - lo
+            on_axis = (offset == np.floor(offset)) & (offset >= 0) & (offset < len(cells))
+            hit &= on_axis
+            cell += cells[np.where(on_axis, offset, 0).astype(np.int64)] * self._strides[j]
+        cell = cell[hit]
+        return hit, self.top3[cell].tolist(), (self.conf[cell] / 10).tolist()
+
+
+def _axis(thresholds, lo: int, hi: int):
+    """Map each integer in [lo, hi] to a cell class: values no threshold
+    separates share a class. Returns (value → class list, representative value per class)."""
+    values = np.arange(lo, hi + 1)
+    side = np.searchsorted(np.unique(thresholds), values, side='right')
+    _, first, cells = np.unique(side, return_index=True, return_inverse=True)
+    return cells.tolist(), values[first].astype(np.float64)
+
+
+def build_table(ensemble, scorer, feature_ranges, model_version: str, path: str,
+                log=print) -> ResponseTable:
+    """Evaluate `scorer` once per table cell and write the table to `path`.
+
+    ensemble:      the model compiled by tree_ensemble (source of split thresholds)
+    scorer:        anything with predict_proba(X), normally the serving scorer
+    feature_ranges: (lo, hi) integer range per feature in model order
+    """
+    split = ~np.isnan(ensemble.threshold)
+    axes, representatives = [], []
+    for j, (lo, hi) in enumerate(feature_ranges):
+        thresholds = ensemble.threshold[split & (ensemble.feature == j)]
+        cells, reps = _axis(thresholds, lo, hi)
+        axes.append({'lo': lo, 'hi': hi, 'cells': cells})
+        representatives.append(reps)
+
+    shape = [len(r) for r in representatives]
+    n_cells = int(np.prod(shape))
+    strides = [int(s) for s in np.cumprod([1] + shape[::-1][:-1])[::-1]]
+    log(f"[table] {n_cells:,} cells (axis sizes {shape})")
+
+    os.makedirs(path, exist_ok=True)
+    top3 = np.lib.format.open_memmap(os.path.join(path, TOP3_FILE), mode='w+', dtype=np.uint8, shape=(n_cells, 3))
+    conf = np.lib.format.open_memmap(os.path.join(path, CONF_FILE), mode='w+', dtype=np.uint16, shape=(n_cells, 3))
+
+    start = time.perf_counter()
+    for lo in range(0, n_cells, BUILD_CHUNK):
+        ids = np.arange(lo, min(lo + BUILD_CHUNK, n_cells))
+        coords = np.unravel_index(ids, shape)
+        X = np.column_stack([reps[c] for reps, c in zip(representatives, coords)])
+        proba = scorer.predict_proba(X)
+        idx = np.argsort(proba, axis=1)[:, ::-1][:, :3]
+        top3[ids] = idx
+        conf[ids] = np.round(np.take_along_axis(proba, idx, axis=1).astype(np.float64) * 1000)
+    top3.flush()
+    conf.flush()
+    build_seconds = time.perf_counter() - start
+
+    meta = {
+        'model_version': model_version,
+        'shape': shape,
+        'strides': strides,
+        'axes': axes,
+        'build_seconds': round(build_seconds, 2),
+        'bytes': int(top3.nbytes + conf.nbytes),
+    }
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    del top3, conf
+    return ResponseTable.load(path)
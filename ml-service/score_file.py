@@ -0,0 +1,264 @@
+"""
+Score a whole CSV or Parquet file of soil tests offline, without the service.
+
+    python score_file.py crop soil_tests.csv recommendations.csv [--workers 8]
+    python score_file.py fertilizer tests.parquet out.parquet --keep sample_id --top-k 3
+
+Input columns are read by request key (`nitrogen`, `soilType`, ...), dataset
+column (`N`, `Soil Type`, ...) or feature name, so the training datasets
+score as they are. Missing features get the same defaults as a JSON request,
+and unknown soil or crop types the first code, as in the service.
+
+The models are the service's bundles (models/<name>.bundle), loaded once
+per worker process and scored with its backend (ML_SCORING_BACKEND,
+ML_XGB_THREADS per worker). The input is read --chunk-rows at a time and
+the chunks are scored in parallel by --workers processes. At most two
+chunks per worker are in flight and results are written in input order as
+they arrive, so memory stays bounded whatever the size of the file.
+
+Each output row holds `row` (the input row number, from 0), the --keep
+columns, then `<crop|fertilizer>_<i>` and `confidence_<i>` (percent, one
+decimal) for the top --top-k classes. The output is CSV, or Parquet when
+its name ends in .parquet. Parquet needs pyarrow (`pip install pyarrow`).
+A JSON report with the rows per second goes to stdout when done.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from feature_codec import CROP_FIELDS, FERTILIZER_FIELDS, FeatureCodec
+from model_bundle import bundle_path, load_bundle, read_manifest
+from scoring import make_scorer, needs_booster, top_k_arrays
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), 'models')
+FIELDS = {'fertilizer': FERTILIZER_FIELDS, 'crop': CROP_FIELDS}
+CHUNK_ROWS = 20000
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+
+# (model name, codec, scorer, display labels, top-k, output format) of this process
+_worker = None
+
+
+def _parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError('Parquet files need pyarrow (pip install pyarrow)') from None
+    return pyarrow
+
+
+def is_parquet(path: str) -> bool:
+    return path.lower().endswith(PARQUET_SUFFIXES)
+
+
+def load_model(name: str, models_dir: str = MODELS_DIR, backend: str = None):
+    """(codec, scorer, display labels) of model `name`, as the service loads it."""
+    bundle = load_bundle(bundle_path(models_dir, name), booster=needs_booster(backend))
+    codec = FeatureCodec.from_bundle(FIELDS[name], bundle)
+    labels = codec.classes.astype(str)
+    if name == 'crop':
+        # As /recommend-crop shows them
+        labels = np.char.capitalize(labels)
+    return codec, make_scorer(bundle.model, backend, ensemble=bundle.ensemble), labels
+
+
+def input_columns(codec, header) -> dict:
+    """Input column read for each dataset column of the model (absent: default)."""
+    header = list(header)
+    found = {}
+    for f in codec.fields:
+        for candidate in (f.key, f.column, f.name):
+            if candidate in header:
+                found[f.column] = candidate
+                break
+    return found
+
+
+def output_columns(name: str, keep, k: int) -> list:
+    return ['row', *keep, *(f'{label}_{i}' for i in range(1, k + 1) for label in (name, 'confidence'))]
+
+
+def read_chunks(path: str, columns, chunk_rows: int = CHUNK_ROWS):
+    """DataFrames of `columns` of a CSV or Parquet file, chunk_rows rows at a time."""
+    if is_parquet(path):
+        parquet = _parquet().parquet.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=list(columns)):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=list(columns), chunksize=chunk_rows)
+
+
+def read_header(path: str) -> list:
+    if is_parquet(path):
+        return _parquet().parquet.ParquetFile(path).schema_arrow.names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _init_worker(name, models_dir, backend, k, output_format):
+    global _worker
+    _worker = (name, *load_model(name, models_dir, backend), k, output_format)
+
+
+def score_chunk(start: int, n: int, columns: dict, keep: dict):
+    """Top-k of the n rows of one chunk: (n, CSV text), or (n, output
+    columns) for Parquet.
+
+    `columns` holds the model's inputs by dataset column, `keep` the input
+    columns copied to the output.
+    """
+    name, codec, scorer, labels, k, output_format = _worker
+    full = {f.column: columns[f.column] if f.column in columns else np.full(n, f.default, dtype=object)
+            for f in codec.fields}
+    idx, top = top_k_arrays(scorer.predict_proba(codec.encode_columns(full)), k)
+    conf = np.round(top, 1)
+
+    out = {'row': np.arange(start, start + n), **keep}
+    for i in range(k):
+        out[f'{name}_{i + 1}'] = labels[idx[:, i]]
+        out[f'confidence_{i + 1}'] = conf[:, i]
+    if output_format == 'csv':
+        return n, pd.DataFrame(out).to_csv(header=False, index=False)
+    return n, out
+
+
+class _Writer:
+    """Appends scored chunks to a CSV or Parquet file."""
+
+    def __init__(self, path: str, columns: list):
+        self.path = path
+        self.parquet = is_parquet(path)
+        self._writer = None
+        if not self.parquet:
+            self._file = open(path, 'w', newline='')
+            self._file.write(','.join(columns) + '\n')
+
+    def write(self, part):
+        if not self.parquet:
+            self._file.write(part)
+            return
+        pyarrow = _parquet()
+        table = pyarrow.table(part)
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self.parquet:
+            if self._writer is not None:
+                self._writer.close()
+        else:
+            self._file.close()
+
+
+def _in_order(executor, chunks, window: int):
+    """Results of score_chunk over `chunks`, in order, with at most `window` in flight."""
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(score_chunk, *chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _pool(processes: int, initargs) -> ProcessPoolExecutor:
+    # Fresh interpreters rather than forks of this one (as forecaster.py)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker, initargs=initargs)
+
+
+def score_file(name: str, source: str, target: str, workers: int = None, chunk_rows: int = CHUNK_ROWS,
+               k: int = 3, keep=(), models_dir: str = MODELS_DIR, backend: str = None) -> dict:
+    """Score every row of `source` with model `name` into `target` (see the
+    module docstring). workers=0 scores in this process; None uses every CPU.
+
+    Returns a report with the rows scored and rows per second.
+    """
+    if workers is None:
+        workers = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    start = time.perf_counter()
+    header = read_header(source)
+    missing = [c for c in keep if c not in header]
+    if missing:
+        raise ValueError(f'--keep columns not in {source}: {missing}')
+    initargs = (name, models_dir, backend, k, 'parquet' if is_parquet(target) else 'csv')
+    # The columns to read only need the manifest; the model loads in the workers
+    manifest = read_manifest(bundle_path(models_dir, name))
+    codec = FeatureCodec(FIELDS[name], manifest['feature_names'], manifest['categories'], manifest['classes'])
+    found = input_columns(codec, header)
+    if not found:
+        raise ValueError(f'{source} has none of the {name} model\'s input columns')
+
+    def chunks():
+        offset = 0
+        for frame in read_chunks(source, dict.fromkeys([*found.values(), *keep]), chunk_rows):
+            columns = {column: frame[source_column].to_numpy() for column, source_column in found.items()}
+            yield offset, len(frame), columns, {c: frame[c].to_numpy() for c in keep}
+            offset += len(frame)
+
+    writer = _Writer(target, output_columns(name, keep, k))
+    rows = n_chunks = 0
+    try:
+        if workers:
+            with _pool(workers, initargs) as executor:
+                for n, part in _in_order(executor, chunks(), 2 * workers):
+                    writer.write(part)
+                    rows += n
+                    n_chunks += 1
+        else:
+            _init_worker(*initargs)
+            for chunk in chunks():
+                n, part = score_chunk(*chunk)
+                writer.write(part)
+                rows += n
+                n_chunks += 1
+    finally:
+        writer.close()
+    seconds = time.perf_counter() - start
+    return {
+        'model': name,
+        'rows': rows,
+        'chunks': n_chunks,
+        'workers': workers,
+        'inputs': found,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds) if seconds else None,
+        'output': target,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('model', choices=sorted(FIELDS))
+    parser.add_argument('input', help='CSV or Parquet file of soil tests')
+    parser.add_argument('output', help='CSV file, or Parquet when it ends in .parquet')
+    parser.add_argument('--workers', type=int, help='scoring processes (default: every CPU; 0 scores in process)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--keep', nargs='+', default=[], metavar='COLUMN', help='input columns copied to the output')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--backend', help='scoring backend (default: ML_SCORING_BACKEND)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(bundle_path(args.models_dir, args.model)):
+        raise SystemExit(f'No {args.model} model bundle in {args.models_dir}. Train it first.')
+    try:
+        report = score_file(args.model, args.input, args.output, args.workers, args.chunk_rows,
+                            args.top_k, args.keep, args.models_dir, args.backend)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+Scoring backends for the recommendation models.
+
+Every scorer exposes `predict_proba(X) -> (n, n_classes)` so routes don't care
+which runtime evaluates the trees. The backend is picked with
+ML_SCORING_BACKEND:
+
+  booster  (default) the model's XGBoost Booster, called through
+           `inplace_predict` on a contiguous float32 matrix with a fixed
+           thread count — no sklearn-wrapper validation or DMatrix build
+  sklearn  the original `XGBClassifier.predict_proba` path
+  numpy    the trees compiled into flat arrays and walked with NumPy
+           (tree_ensemble.py) — with model bundles, xgboost isn't even imported
+
+If the configured backend can't be built for a model, the service falls back
+to the numpy engine rather than refusing to serve.
+
+ML_XGB_THREADS sets the Booster's thread count (default 1: requests are
+already served concurrently, so per-call parallelism only oversubscribes).
+"""
+import os
+
+import numpy as np
+
+from tree_ensemble import compile_booster
+
+SCORING_BACKEND = os.getenv('ML_SCORING_BACKEND', 'booster')
+XGB_THREADS = int(os.getenv('ML_XGB_THREADS', 1))
+
+
+class SklearnScorer:
+    """Scores through the sklearn wrapper exactly as the service always did."""
+
+    backend = 'sklearn'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.model.predict_proba(X)
+
+
+class BoosterScorer:
+    """Scores with the underlying Booster via `inplace_predict`.
+
+    The Booster is copied out of the wrapper so pinning its thread count
+    doesn't change the wrapper's behaviour.
+    """
+
+    backend = 'booster'
+
+    def __init__(self, model, n_threads: int = XGB_THREADS):
+        if model.objective != 'multi:softprob':
+            raise ValueError(f'BoosterScorer needs a multi:softprob model, got {model.objective!r}')
+        self.booster = model.get_booster().copy()
+        self.booster.set_param({'nthread': n_threads})
+        self.n_threads = n_threads
+        # Honour early stopping the same way XGBClassifier.predict_proba does
+        try:
+            self.iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            self.iteration_range = (0, 0)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.booster.inplace_predict(
+            X, iteration_range=self.iteration_range, validate_features=False
+        )
+
+
+class NumpyScorer:
+    """Scores with the model compiled into a TreeEnsemble (or a precompiled
+    one, e.g. the memory-mapped trees of a model bundle)."""
+
+    backend = 'numpy'
+
+    def __init__(self, model, ensemble=None):
+        if ensemble is not None:
+            self.ensemble = ensemble
+            return
+        try:
+            n_rounds = model.best_iteration + 1
+        except AttributeError:
+            n_rounds = None
+        self.ensemble = compile_booster(model.get_booster(), n_rounds=n_rounds)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.ensemble.predict_proba(X)
+
+
+SCORERS = {
+    'booster': BoosterScorer,
+    'sklearn': SklearnScorer,
+    'numpy': NumpyScorer,
+}
+
+
+def make_scorer(model, backend: str = None, ensemble=None):
+    """Wrap a fitted XGBClassifier in the configured scoring backend.
+
+    `ensemble` is the model's already compiled TreeEnsemble, if there is one.
+    """
+    backend = backend or SCORING_BACKEND
+    if backend not in SCORERS:
+        raise ValueError(f'Unknown scoring backend {backend!r} (expected one of {sorted(SCORERS)})')
+    try:
+        if backend == 'numpy':
+            return NumpyScorer(model, ensemble)
+        return SCORERS[backend](model)
+    except Exception as e:
+        if backend == 'numpy':
+            raise
+        print(f"[ML] WARNING: {backend} scorer unavailable ({e}); falling back to numpy.")
+        return NumpyScorer(model, ensemble)
+
+
+def needs_booster(backend: str = None) -> bool:
+    """Whether `backend` (default: the configured one) scores with the XGBoost
+    model rather than only its compiled trees."""
+    return (backend or SCORING_BACKEND) != 'numpy'
+
+
+def top_k_arrays(proba: np.ndarray, k: int = 3):
+    """Row-wise top-k of a (n, n_classes) probability matrix, as (n, k)
+    arrays of indices and unrounded percentages."""
+    idx = np.argsort(proba, axis=1)[:, ::-1][:, :k]
+    return idx, np.take_along_axis(proba, idx, axis=1).astype(np.float64) * 100
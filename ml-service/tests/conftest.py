@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Tests inspect the loaded models directly, so load them at import
+os.environ.setdefault('ML_LOAD_MODE', 'eager')
+
+
+@pytest.fixture(scope='session')
+def client():
+    import app
+    return app.app.test_client()
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+import app
+from admission import AdmissionGate, Rejected, deadline_from_headers
+
+
+def test_waiters_get_slots_in_arrival_order():
+    gate = AdmissionGate(concurrency=1, max_queue=3, max_wait=5)
+    gate.acquire()
+    order = []
+
+    def wait(n):
+        with gate.slot():
+            order.append(n)
+
+    threads = []
+    for n in range(3):
+        threads.append(threading.Thread(target=wait, args=(n,)))
+        threads[-1].start()
+        while gate.stats()['waiting'] < n + 1:
+            time.sleep(0.001)
+    with pytest.raises(Rejected) as e:
+        gate.acquire()
+    assert e.value.status == 429 and e.value.retry_after >= 1
+
+    gate.release()
+    for t in threads:
+        t.join()
+    assert order == [0, 1, 2]
+    assert gate.stats()['running'] == 0 and gate.stats()['admitted'] == 4
+
+
+def test_deadlines_drop_requests_instead_of_running_them():
+    gate = AdmissionGate(concurrency=1, max_queue=5, max_wait=5)
+    with pytest.raises(Rejected) as e:
+        gate.acquire(deadline=time.monotonic() - 1)
+    assert e.value.status == 503
+
+    gate.acquire()
+    start = time.monotonic()
+    with pytest.raises(Rejected) as e:
+        gate.acquire(deadline=start + 0.05)
+    assert e.value.status == 503 and time.monotonic() - start < 1
+    assert gate.stats()['waiting'] == 0 and gate.stats()['expired'] == 2
+    gate.release()
+    assert gate.stats()['running'] == 0
+
+
+def test_deadline_headers():
+    assert deadline_from_headers({}) is None
+    assert deadline_from_headers({'X-Request-Timeout-Ms': '250'}, now=10.0) == 10.25
+    remaining = deadline_from_headers({'X-Request-Deadline': str((time.time() + 2) * 1000)}, now=0.0)
+    assert 1.5 < remaining <= 2
+
+
+def test_saturated_routes_answer_fast_with_retry_after(client, monkeypatch):
+    gate = AdmissionGate(concurrency=1, max_queue=0)
+    monkeypatch.setattr(app, '_admission', gate)
+    body = {'ph': 6.5}
+    assert client.post('/recommend-crop', json=body).status_code == 200
+
+    gate.acquire()   # someone else is scoring
+    res = client.post('/recommend-crop', json=body)
+    assert res.status_code == 429 and int(res.headers['Retry-After']) >= 1
+    # Only the inference routes are gated
+    assert client.get('/health').status_code == 200
+    gate.release()
+
+    res = client.post('/recommend-crop', json=body, headers={'X-Request-Timeout-Ms': '0'})
+    assert res.status_code == 503 and 'Retry-After' in res.headers
+    assert client.post('/recommend-crop', json=body, headers={'X-Request-Timeout-Ms': '5000'}).status_code == 200
+    assert client.get('/admission/stats').get_json()['running'] == 0
@@ -0,0 +1,47 @@
+import pytest
+
+FERTILIZER_INPUTS = [
+    {'temperature': 26, 'humidity': 52, 'moisture': 38, 'nitrogen': 37, 'potassium': 0,
+     'phosphorous': 0, 'soilType': 'Sandy', 'cropType': 'Maize'},
+    {'temperature': 34, 'humidity': 65, 'moisture': 62, 'nitrogen': 7, 'potassium': 9,
+     'phosphorous': 30, 'soilType': 'Black', 'cropType': 'Cotton'},
+    {'nitrogen': 12, 'soilType': 'Peat', 'cropType': 'Rice'},
+]
+
+CROP_INPUTS = [
+    {'nitrogen': 90, 'phosphorous': 42, 'potassium': 43, 'temperature': 20.9,
+     'humidity': 82, 'ph': 6.5, 'rainfall': 203},
+    {'nitrogen': 20, 'phosphorous': 130, 'potassium': 200, 'temperature': 22,
+     'humidity': 92, 'ph': 5.9, 'rainfall': 110},
+    {'ph': 7.2},
+]
+
+
+@pytest.mark.parametrize('route, inputs', [
+    ('/recommend-fertilizer', FERTILIZER_INPUTS),
+    ('/recommend-crop', CROP_INPUTS),
+])
+def test_batch_matches_single_row_responses(client, route, inputs):
+    res = client.post(f'{route}/batch', json={'inputs': inputs})
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['count'] == len(inputs)
+    for data, result in zip(inputs, body['results']):
+        assert result == client.post(route, json=data).get_json()
+
+
+def test_batch_accepts_bare_list(client):
+    res = client.post('/recommend-crop/batch', json=CROP_INPUTS)
+    assert res.status_code == 200
+    assert len(res.get_json()['results']) == len(CROP_INPUTS)
+
+
+@pytest.mark.parametrize('body', [{'inputs': []}, {'rows': CROP_INPUTS}, {'inputs': [1, 2]}])
+def test_batch_rejects_malformed_bodies(client, body):
+    assert client.post('/recommend-crop/batch', json=body).status_code == 400
+
+
+def test_batch_rejects_oversized_batches(client, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'MAX_BATCH_ROWS', 2)
+    assert client.post('/recommend-crop/batch', json={'inputs': CROP_INPUTS}).status_code == 413
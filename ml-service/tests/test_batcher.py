@@ -0,0 +1,76 @@
+import threading
+
+import numpy as np
+import pytest
+
+from batcher import CoalescingScorer
+
+
+class RecordingScorer:
+    backend = 'fake'
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        return np.column_stack([X[:, 0], -X[:, 0]])
+
+
+def run_concurrently(scorer, n):
+    results = [None] * n
+    start = threading.Barrier(n)
+
+    def worker(i):
+        start.wait()
+        results[i] = scorer.predict_proba(np.array([[float(i)]]))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_calls_are_scored_together_and_sliced_back():
+    inner = RecordingScorer()
+    scorer = CoalescingScorer(inner, max_wait_ms=50, max_rows=64)
+    results = run_concurrently(scorer, 16)
+    for i, proba in enumerate(results):
+        assert proba.tolist() == [[i, -i]]
+    assert sum(inner.calls) == 16
+    assert len(inner.calls) < 16
+    stats = scorer.stats()
+    assert stats['rows'] == 16 and stats['batches'] == len(inner.calls)
+    scorer.close()
+
+
+def test_large_calls_bypass_the_queue():
+    inner = RecordingScorer()
+    scorer = CoalescingScorer(inner, max_wait_ms=50, max_rows=4)
+    assert scorer.predict_proba(np.zeros((8, 1))).shape == (8, 2)
+    assert scorer.stats()['batch_size_histogram'] == {'<=8': 1}
+    scorer.close()
+
+
+def test_errors_reach_every_caller_in_the_batch():
+    class Failing:
+        backend = 'fake'
+
+        def predict_proba(self, X):
+            raise RuntimeError('boom')
+
+    scorer = CoalescingScorer(Failing(), max_wait_ms=1)
+    with pytest.raises(RuntimeError):
+        scorer.predict_proba(np.zeros((1, 1)))
+    scorer.close()
+
+
+def test_closed_scorer_scores_directly():
+    inner = RecordingScorer()
+    scorer = CoalescingScorer(inner, max_wait_ms=1)
+    scorer.close()
+    scorer._worker.join(timeout=1)
+    assert not scorer._worker.is_alive()
+    assert scorer.predict_proba(np.ones((1, 1))).tolist() == [[1, -1]]
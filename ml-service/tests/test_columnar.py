@@ -0,0 +1,104 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+import app
+from columnar import PayloadError, PayloadTooLarge, feature_matrix, input_rows, read_body, read_npy, read_raw
+
+from test_batch_endpoints import CROP_INPUTS, FERTILIZER_INPUTS
+
+
+def npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def test_npy_and_raw_bodies_are_read_without_copying():
+    M = np.arange(12, dtype=np.float32).reshape(4, 3)
+    body = npy(M)
+    view = read_npy(body)
+    assert np.array_equal(view, M) and not view.flags.owndata and view.base is not None
+
+    assert np.array_equal(read_npy(npy(np.asfortranarray(M))), M)
+    raw = read_raw(M.T.tobytes(), 3)
+    assert np.array_equal(raw, M) and not raw.flags.owndata
+    with pytest.raises(PayloadError):
+        read_raw(M.tobytes()[:-4], 3)
+    with pytest.raises(PayloadError):
+        read_npy(body[:-4])
+
+
+def test_feature_matrix_orders_columns_and_fills_defaults():
+    codec = app.ensure_loaded('crop').codec
+    keys = [f.key for f in codec.fields]
+    X = np.ones((2, len(keys)), dtype=np.float32)
+    assert feature_matrix(codec, None, X) is X
+
+    M = np.array([[7.2], [5.5]], dtype=np.float32)
+    expected = codec.encode_rows([{'ph': 7.2}, {'ph': 5.5}]).astype(np.float32)
+    assert np.array_equal(feature_matrix(codec, ['ph'], M), expected)
+    with pytest.raises(PayloadError):
+        feature_matrix(codec, ['ph', 'colour'], np.ones((1, 2), dtype=np.float32))
+
+
+def test_categorical_codes_are_checked_and_decoded():
+    codec = app.ensure_loaded('fertilizer').codec
+    names = ['soilType', 'nitrogen']
+    with pytest.raises(PayloadError):
+        feature_matrix(codec, names, np.array([[99, 10]], dtype=np.float32))
+    X = feature_matrix(codec, names, np.array([[1, 10]], dtype=np.float32))
+    row = input_rows(codec, X)[0]
+    assert row['soilType'] == codec.categories['Soil Type'][1] and row['nitrogen'] == 10
+
+
+@pytest.mark.parametrize('route, inputs', [
+    ('/recommend-fertilizer', FERTILIZER_INPUTS),
+    ('/recommend-crop', CROP_INPUTS),
+])
+def test_binary_batches_score_like_json_ones(client, route, inputs):
+    served = app.ensure_loaded(route.split('-')[1])
+    X = served.codec.encode_rows(inputs).astype(np.float32)
+    expected = client.post(f'{route}/batch', json={'inputs': inputs}).get_json()['results']
+    keys = ','.join(f.key for f in served.codec.fields)
+
+    for body, content_type in ((npy(X), 'application/x-npy'), (X.T.tobytes(), 'application/octet-stream')):
+        res = client.post(f'{route}/batch', data=body, content_type=content_type, headers={'X-Features': keys})
+        assert res.status_code == 200
+        results = res.get_json()['results']
+        assert [r['recommendations'] for r in results] == [r['recommendations'] for r in expected]
+
+    res = client.post(f'{route}/batch', data=npy(X), content_type='application/x-npy',
+                      headers={'Accept': 'application/x-npy'})
+    assert res.status_code == 200 and res.mimetype == 'application/x-npy'
+    labels = json.loads(res.headers['X-Classes'])
+    top = np.load(io.BytesIO(res.data))
+    label_key = 'fertilizer' if 'fertilizer' in route else 'crop'
+    for row, result in zip(top, expected):
+        assert [labels[i] for i in row['class']] == [r[label_key] for r in result['recommendations']]
+        assert np.allclose(row['confidence'], [r['confidence'] for r in result['recommendations']])
+
+
+def test_bad_binary_bodies(client, monkeypatch):
+    post = lambda body, **kw: client.post('/recommend-crop/batch', data=body, **kw).status_code
+    X = np.ones((3, 7), dtype=np.float32)
+    assert post(b'not npy', content_type='application/x-npy') == 400
+    assert post(X.tobytes(), content_type='application/octet-stream') == 400   # no X-Features
+    assert post(npy(X), content_type='application/x-npy', headers={'X-Features': 'ph'}) == 400
+    monkeypatch.setattr(app, 'MAX_BINARY_ROWS', 2)
+    assert post(npy(X), content_type='application/x-npy') == 413
+    res = client.post('/recommend-crop/batch', data=b'\0' * (1 << 17), content_type='application/x-npy')
+    assert res.status_code == 413 and 'Body too large' in res.get_json()['error']
+
+
+def test_oversized_bodies_are_refused_without_reading_them():
+    stream = io.BytesIO(b'x' * 1000)
+    with pytest.raises(PayloadTooLarge):
+        read_body(stream, 100, length=1000)
+    assert stream.tell() == 0
+    with pytest.raises(PayloadTooLarge):
+        read_body(stream, 100)   # chunked: no Content-Length
+    assert stream.tell() == 101
+    assert read_body(io.BytesIO(b'x' * 100), 100) == b'x' * 100
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from compress_model import (distill, early_stopping_rounds, fit, map_at_3, pareto_front, prune, quality,
+                            size)
+from train_model import encode_dataset, load_data, xgb_params
+
+
+@pytest.fixture(scope='module')
+def fertilizer_data():
+    X, y, codec, _, _ = encode_dataset(load_data(), verbose=False)
+    return X, y, codec
+
+
+def test_map_at_3_and_quality():
+    proba = np.array([[0.5, 0.3, 0.2, 0.0], [0.1, 0.2, 0.3, 0.4], [0.4, 0.3, 0.2, 0.1]])
+    y = np.array([0, 2, 3])
+    assert map_at_3(y, proba) == pytest.approx((1 + 1 / 2 + 0) / 3)
+    scores = quality(y, proba.astype(np.float32) + 0.01)
+    assert scores['accuracy'] == pytest.approx(1 / 3) and scores['map3'] == pytest.approx(0.5)
+
+
+def test_early_stopping_rounds():
+    curve = [1.0, 0.8, 0.7, 0.72, 0.71, 0.69, 0.75, 0.8, 0.9, 1.0]
+    assert early_stopping_rounds(curve, patience=3) == 6
+    # The search stops before a later, better point
+    assert early_stopping_rounds(curve[:6] + [0.8] * 5 + [0.1], patience=3) == 6
+    assert early_stopping_rounds([3, 2, 1], patience=3) == 3
+
+
+def test_pareto_front():
+    rows = [
+        {'name': 'big', 'map3': 0.70, 'log_loss': 1.2, 'us_per_row': 400},
+        {'name': 'same_but_slower', 'map3': 0.70, 'log_loss': 1.2, 'us_per_row': 450},
+        {'name': 'small', 'map3': 0.69, 'log_loss': 1.3, 'us_per_row': 150},
+        {'name': 'worse_and_slower', 'map3': 0.60, 'log_loss': 1.5, 'us_per_row': 200},
+    ]
+    assert pareto_front(rows) == {'big', 'small'}
+
+
+def test_pruning_and_distillation_shrink_the_model(fertilizer_data):
+    X, y, codec = fertilizer_data
+    params = xgb_params(int(y.max()) + 1)
+    teacher = fit(params, X, y, 60)
+    teacher_proba = teacher.predict_proba(X)
+
+    pruned = prune(teacher, X, y, gamma=2)
+    assert pruned.get_booster().num_boosted_rounds() == 60
+    assert size(pruned)[1] < size(teacher)[1]
+    assert pruned.predict_proba(X).shape == teacher_proba.shape
+
+    student = distill(teacher, params, X, depth=2, n_rounds=10, augment=2, numeric_mask=codec.numeric_mask, seed=0)
+    assert size(student)[0] == 10 * teacher.n_classes_
+    agree = (student.predict_proba(X).argmax(axis=1) == teacher_proba.argmax(axis=1)).mean()
+    assert agree > 0.8
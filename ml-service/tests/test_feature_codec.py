@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from feature_codec import CROP_FIELDS, FERTILIZER_FIELDS, FeatureCodec
+
+
+class Encoder:
+    def __init__(self, classes):
+        self.classes_ = np.array(classes)
+
+
+FEATURES = [f.name for f in FERTILIZER_FIELDS]
+ENCODERS = {
+    'Soil Type': Encoder(['Black', 'Clayey', 'Loamy', 'Red', 'Sandy']),
+    'Crop Type': Encoder(['Barley', 'Cotton', 'Maize', 'Wheat']),
+}
+TARGET = Encoder(['10-26-26', 'DAP', 'Urea'])
+
+
+@pytest.fixture
+def codec():
+    return FeatureCodec.from_encoders(FERTILIZER_FIELDS, FEATURES, ENCODERS, TARGET)
+
+
+def test_encode_row_uses_feature_order_and_lookup_tables(codec):
+    row = codec.encode({'temperature': 30, 'nitrogen': 37, 'soilType': 'Red', 'cropType': 'Wheat'})
+    assert row.tolist() == [[30, 55, 45, 37, 10, 15, 3, 3]]
+
+
+def test_unseen_labels_fall_back_to_first_class(codec):
+    row = codec.encode({'soilType': 'Peat', 'cropType': None})
+    assert row[0, 6:].tolist() == [0, 0]
+
+
+def test_rows_and_columns_encode_identically(codec):
+    items = [
+        {'temperature': 26, 'humidity': 52, 'moisture': 38, 'nitrogen': 37, 'potassium': 0,
+         'phosphorous': 0, 'soilType': 'Sandy', 'cropType': 'Maize'},
+        {'temperature': 34, 'humidity': 65, 'moisture': 62, 'nitrogen': 7, 'potassium': 9,
+         'phosphorous': 30, 'soilType': 'Black', 'cropType': 'Cotton'},
+    ]
+    columns = {f.column: [d[f.key] for d in items] for f in FERTILIZER_FIELDS}
+    assert np.array_equal(codec.encode_rows(items), codec.encode_columns(columns))
+
+
+def test_saved_feature_order_drives_encoding():
+    reordered = list(reversed([f.name for f in CROP_FIELDS]))
+    codec = FeatureCodec.from_encoders(CROP_FIELDS, reordered, None, TARGET)
+    assert codec.encode({'nitrogen': 1, 'rainfall': 7}).tolist() == [[7, 6.5, 60, 25, 50, 50, 1]]
+
+
+def test_unknown_feature_name_is_rejected():
+    with pytest.raises(ValueError):
+        FeatureCodec.from_encoders(CROP_FIELDS, ['N', 'soil_moisture'], None, TARGET)
+
+
+def test_decode_keeps_shape(codec):
+    assert codec.decode(np.array([[2, 0], [1, 2]])).tolist() == [['Urea', '10-26-26'], ['DAP', 'Urea']]
@@ -0,0 +1,176 @@
+import json
+
+import numpy as np
+import pytest
+
+import app
+from forecast_state import ForecastStateStore, SeriesState
+from forecaster import MAX_HISTORY_DAYS, WEEK, ForecastError, daily_series, forecast
+
+from test_forecaster import TODAY, history
+
+
+def day_number(date):
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def prices(result):
+    return [p['predicted_price'] for p in result['predictions']]
+
+
+def test_building_at_once_matches_adding_day_by_day():
+    first, y = daily_series(history(60))
+    together = SeriesState.from_daily(day_number(first), y)
+    one_by_one = SeriesState(day_number(first), y[0])
+    for k in range(1, len(y)):
+        one_by_one.add(day_number(first) + k, y[k])
+    for name in ('full', 'short', 'changes'):
+        np.testing.assert_allclose(getattr(together, name), getattr(one_by_one, name))
+    assert together.recent == pytest.approx(one_by_one.recent)
+
+
+@pytest.mark.parametrize('n', [5, 20, 60, 365])
+@pytest.mark.parametrize('end', ['2025-12-20', TODAY])
+def test_forecasts_match_refitting_the_whole_history(n, end):
+    points = history(n, end=end)
+    first, y = daily_series(points)
+    result = SeriesState.from_daily(day_number(first), y).forecast(10, today=TODAY)
+    refit = forecast(points, 10, today=TODAY)
+    assert prices(result) == prices(refit)
+    assert [p['date'] for p in result['predictions']] == [p['date'] for p in refit['predictions']]
+    assert result['model']['terms'] == refit['model']['terms'] and result['metrics'] is None
+    if end == TODAY:
+        # The one-day interval is the refit's; later ones are derived rather than measured
+        assert result['predictions'][0]['upper'] == pytest.approx(refit['predictions'][0]['upper'], abs=0.011)
+
+
+def test_days_leaving_the_window_are_dropped_as_a_refit_drops_them(tmp_path):
+    points = history(MAX_HISTORY_DAYS + 200, seed=3)
+    first, y = daily_series(points[:400])
+    store = ForecastStateStore()
+    store.observe('tomato:Pune', points[:400])
+    checks = [MAX_HISTORY_DAYS - 1, MAX_HISTORY_DAYS, MAX_HISTORY_DAYS + 1, len(points)]
+    for end in range(401, len(points) + 1):
+        p = points[end - 1]
+        store.add('tomato:Pune', day_number(p['date'][:10]), p['price'])
+        if end in checks:
+            state = store.get('tomato:Pune')
+            today = p['date'][:10]
+            refit = forecast(points[:end], 10, today=today)
+            assert prices(state.forecast(10, today=today)) == pytest.approx(prices(refit), abs=0.011)
+            assert state.forecast(10, today=today)['model']['history_days'] == refit['model']['history_days']
+    # As many regression rows as a refit of the window has
+    state = store.get('tomato:Pune')
+    assert state.short[0, 0] == MAX_HISTORY_DAYS - 1 and state.full[0, 0] == MAX_HISTORY_DAYS - WEEK
+
+    path = str(tmp_path / 'state.json')
+    store.save(path)
+    restored = ForecastStateStore()
+    restored.load(path)
+    extra = history(1, end=str(np.datetime64(TODAY) + 1))[0]
+    for s in (store, restored):
+        s.add('tomato:Pune', day_number(extra['date'][:10]), extra['price'])
+    assert (restored.get('tomato:Pune').forecast(7, today=TODAY) == store.get('tomato:Pune').forecast(7, today=TODAY))
+
+
+def test_stale_series_are_rejected():
+    first, y = daily_series(history(60, end='2020-06-30'))
+    with pytest.raises(ForecastError, match='more than 90 days'):
+        SeriesState.from_daily(day_number(first), y).forecast(7, today=TODAY)
+
+
+def test_gaps_and_repeated_days_are_read_like_a_full_history():
+    points = history(40) + [{'date': '2026-01-03', 'price': 49.0},
+                            {'date': '2026-01-04', 'price': 50.0}, {'date': '2026-01-04', 'price': 52.0}]
+    store = ForecastStateStore()
+    store.observe('tomato:Pune', points[:40])
+    for p in points[40:]:
+        store.add('tomato:Pune', day_number(p['date']), p['price'])
+    state = store.get('tomato:Pune')
+    assert state.n == len(daily_series(points)[1])
+    assert state.recent[-1] * state.scale == pytest.approx(51.0)
+    assert prices(state.forecast(7, today=TODAY)) == prices(forecast(points, 7, today=TODAY))
+
+    assert not store.add('tomato:Pune', day_number('2025-12-01'), 10.0)
+    assert store.stats()['stale_points'] == 1
+
+
+def test_resent_histories_only_add_new_days():
+    store = ForecastStateStore()
+    store.observe('onion:Nashik', history(100, end='2025-12-30'))
+    assert store.observe('onion:Nashik', history(101)).n == 101
+    assert store.observe('onion:Nashik', history(101)[-1:]).n == 101
+    assert store.observe('onion:Nashik', []).n == 101
+    assert store.observe('rice:Nashik', []) is None
+    stats = store.stats()
+    assert (stats['hits'], stats['misses'], stats['days_added']) == (3, 2, 101)
+
+
+def test_least_recently_used_series_are_evicted():
+    store = ForecastStateStore(maxsize=2)
+    for key in ('a', 'b', 'a', 'c'):
+        store.add(key, day_number(TODAY), 10.0)
+    assert store.get('b') is None and store.get('a') is not None
+    assert store.stats()['evictions'] == 1
+
+
+def test_checkpoints_restore_the_same_forecasts(tmp_path):
+    store = ForecastStateStore()
+    store.observe('tomato:Pune', history(200))
+    store.observe('onion:Pune', history(10))
+    path = str(tmp_path / 'state.json')
+    assert store.save(path) == 2 and not store.dirty
+
+    restored = ForecastStateStore()
+    assert restored.load(path) == 2
+    for key in ('tomato:Pune', 'onion:Pune'):
+        assert restored.get(key).forecast(7, today=TODAY) == store.get(key).forecast(7, today=TODAY)
+
+
+def test_checkpoints_of_several_workers_are_merged(tmp_path):
+    path = str(tmp_path / 'state.json')
+    one, two = ForecastStateStore(), ForecastStateStore()
+    one.observe('tomato:Pune', history(100, end='2025-12-30'))
+    one.observe('onion:Pune', history(30))
+    two.observe('tomato:Pune', history(101))
+    two.observe('rice:Pune', history(30))
+    one.save(path)
+    assert two.save(path) == 3
+    one.save(path)   # its older tomato:Pune doesn't replace the newer one
+
+    restored = ForecastStateStore()
+    assert restored.load(path) == 3
+    assert restored.get('tomato:Pune').n == 101
+    assert restored.get('onion:Pune').forecast(7, today=TODAY) == one.get('onion:Pune').forecast(7, today=TODAY)
+
+
+def test_malformed_checkpoints_are_rejected(tmp_path):
+    store = ForecastStateStore()
+    store.observe('tomato:Pune', history(30))
+    path = tmp_path / 'state.json'
+    store.save(str(path))
+    entries = json.loads(path.read_text())
+    del entries[0]['state']['window']
+    path.write_text(json.dumps(entries))
+    restored = ForecastStateStore()
+    with pytest.raises(ValueError, match='entry 0 is not a forecast state'):
+        restored.load(str(path))
+    with pytest.raises(ValueError):
+        store.save(str(path))
+    assert len(restored) == 0
+
+
+def test_predict_endpoint_keeps_state_per_series(client, monkeypatch):
+    monkeypatch.setattr(app, '_forecast_state', ForecastStateStore(maxsize=10))
+    yesterday = np.datetime64('today') - 1
+    points = history(365, end=str(yesterday))
+    body = {'crop': 'tomato', 'location': 'Pune', 'days': 3, 'historical_prices': points}
+    first = client.post('/predict', json=body).get_json()
+    assert first['model']['incremental'] and first['model']['history_days'] == 365
+
+    again = client.post('/predict', json={**body, 'historical_prices': []}).get_json()
+    assert prices(again) == prices(first)
+    today = history(1, end=str(yesterday + 1))
+    newer = client.post('/predict', json={**body, 'historical_prices': today}).get_json()
+    assert newer['model']['history_days'] == 366
+    assert client.get('/forecast-state/stats').get_json()['series'] == 1
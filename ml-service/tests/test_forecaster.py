@@ -0,0 +1,189 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import forecaster
+from forecaster import ForecastError, Panel, daily_series, forecast, forecast_many, model_terms
+
+TODAY = '2025-12-31'
+# Histories posted to the routes end on the real today
+NOW = str(np.datetime64('today', 'D'))
+
+
+def history(n, noise=0.5, seed=0, end=TODAY):
+    """n daily prices ending at `end`: trend, a weekday bump and noise."""
+    rng = np.random.default_rng(seed)
+    days = np.datetime64(end) - np.arange(n)[::-1]
+    t = np.arange(n)
+    weekday = (days.astype(np.int64) - 4) % 7
+    prices = 40 + 0.02 * t + np.where(weekday == 5, 3.0, 0.0) + rng.normal(0, noise, n)
+    return [{'date': f'{d}T08:30:00.000Z', 'price': float(p)} for d, p in zip(days, prices)]
+
+
+def test_daily_series_averages_duplicates_and_fills_gaps():
+    first, y = daily_series([
+        {'date': '2024-01-03', 'price': 30},
+        {'date': '2024-01-01', 'price': 10},
+        {'date': '2024-01-01T18:00:00Z', 'price': 14},
+    ])
+    assert first == np.datetime64('2024-01-01')
+    assert y.tolist() == [12.0, 21.0, 30.0]
+
+
+@pytest.mark.parametrize('bad', [[{'price': 1}], [{'date': 'soon', 'price': 1}],
+                                 [{'date': '2024-01-01', 'price': 'n/a'}], [{'date': '2024-01-01', 'price': None}],
+                                 'prices'])
+def test_unreadable_history_is_rejected(bad):
+    with pytest.raises(ForecastError):
+        forecast(bad)
+
+
+def test_forecast_learns_trend_and_weekday_pattern():
+    result = forecast(history(365), days=14, today=TODAY)
+    assert result['model']['terms'] == ['trend', 'weekly', 'lag1', 'lag7']
+    prices = {p['date']: p['predicted_price'] for p in result['predictions']}
+    saturdays = [d for d in prices if np.datetime64(d).astype(np.int64) % 7 == 2]
+    others = [d for d in prices if d not in saturdays]
+    assert min(prices[d] for d in saturdays) > max(prices[d] for d in others)
+    assert result['metrics']['mape'] < result['metrics']['naive_mape']
+    for p in result['predictions']:
+        assert p['lower'] < p['predicted_price'] < p['upper']
+        assert 0 < p['confidence'] <= 1
+
+
+def test_zero_prices_are_left_out_of_the_backtest():
+    points = history(60)
+    for p in points[-3:]:
+        p['price'] = 0.0
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        metrics = forecast(points, days=7, today=TODAY)['metrics']
+        assert np.isfinite([metrics['mape'], metrics['naive_mape']]).all()
+        for p in points[-7:]:
+            p['price'] = 0.0
+        assert forecast(points, days=7, today=TODAY)['metrics'] is None
+
+
+def test_forecast_starts_after_today_when_history_is_stale():
+    result = forecast(history(100, end='2025-12-20'), days=3, today=TODAY)
+    assert [p['date'] for p in result['predictions']] == ['2026-01-01', '2026-01-02', '2026-01-03']
+
+
+def test_histories_older_than_the_longest_forecast_are_rejected():
+    assert forecast(history(100, end='2025-10-02'), days=3, today=TODAY)['predictions']   # 90 days
+    with pytest.raises(ForecastError, match='more than 90 days'):
+        forecast(history(100, end='2025-10-01'), days=3, today=TODAY)
+    with pytest.raises(ForecastError):
+        forecast(history(365, end='2020-06-30'), days=7, today=TODAY)
+    stale, recent = forecast_many([(history(50, end='2020-06-30'), 7, ()), (history(50), 7, ())], today=TODAY)
+    assert isinstance(stale, ForecastError) and recent['predictions'][0]['date'] == '2026-01-01'
+
+
+@pytest.mark.parametrize('n, terms', [(3, []), (20, ['trend', 'lag1']), (60, ['trend', 'weekly', 'lag1', 'lag7'])])
+def test_short_histories_use_fewer_terms(n, terms):
+    result = forecast(history(n), days=5, today=TODAY)
+    assert result['model']['terms'] == terms
+    assert len(result['predictions']) == 5
+
+
+def test_no_history_answers_the_default_price():
+    result = forecast([], days=2, today=TODAY)
+    assert [p['predicted_price'] for p in result['predictions']] == [forecaster.DEFAULT_PRICE] * 2
+    assert result['recommendation'] == 'Limited data available'
+
+
+def test_running_forward_from_all_origins_matches_each_origin_alone():
+    _, y = daily_series(history(120))
+    panel = Panel([y], [3], model_terms(len(y)))
+    coef, scale, _ = panel.fit(5)
+    origins = np.array([30, 61, 100])
+    together = panel.run_forward(coef, panel.Y / scale[:, None], origins, 5)[0]
+    for row, origin in zip(together, origins):
+        alone = Panel([y[:origin]], [3], panel.terms)
+        np.testing.assert_allclose(row * scale[0], alone.predict(coef, scale, 5)[0])
+
+
+def test_forecasting_many_series_matches_forecasting_each():
+    series = [(history(n, seed=n, end=end), days, ())
+              for n in (5, 20, 45, 365, 800) for days in (1, 30) for end in (TODAY, '2025-11-02')]
+    series.append(([{'price': 1}], 7, ()))
+    together = forecast_many(series, today=TODAY)
+    for (points, days, holidays), result in zip(series[:-1], together):
+        assert result == forecast(points, days, holidays, today=TODAY)
+    assert isinstance(together[-1], ForecastError)
+
+
+def test_worker_processes_give_the_same_forecasts():
+    series = [(history(n, seed=n), 7, ()) for n in (10, 20, 60, 365)]
+    assert forecast_many(series, today=TODAY, processes=2) == forecast_many(series, today=TODAY)
+
+
+def test_a_dead_worker_is_replaced():
+    series = [(history(n, seed=n), 7, ()) for n in (10, 20, 60, 365)]
+    expected = forecast_many(series, today=TODAY)
+    pool = forecaster._pool(2)
+    assert forecast_many(series, today=TODAY, processes=2) == expected
+    worker = next(iter(pool._processes.values()))
+    worker.kill()
+    worker.join()
+    # The call that finds the pool broken answers in process, the next one gets new workers
+    assert forecast_many(series, today=TODAY, processes=2) == expected
+    assert forecaster._pool(2) is not pool
+    assert forecast_many(series, today=TODAY, processes=2) == expected
+
+
+def test_panels_are_cut_to_the_budget(monkeypatch):
+    monkeypatch.setattr(forecaster, 'PANEL_BUDGET', 20_000)
+    ys = [daily_series(history(n, seed=n))[1] for n in range(30, 330, 10)]
+    chunks = list(forecaster.panels(ys, [7] * len(ys)))
+    assert len(chunks) > 1
+    assert sorted(i for _, chunk in chunks for i in chunk) == list(range(len(ys)))
+    together = forecaster.fit_predict(ys, [0] * len(ys), [7] * len(ys))
+    monkeypatch.setattr(forecaster, 'PANEL_BUDGET', 1 << 30)
+    for a, b in zip(together[1], forecaster.fit_predict(ys, [0] * len(ys), [7] * len(ys))[1]):
+        np.testing.assert_allclose(a, b)
+
+
+def test_predict_endpoint_keeps_the_legacy_keys(client):
+    body = {'crop': 'tomato', 'location': 'Pune', 'days': 7, 'historical_prices': history(365, end=NOW),
+            'market_holidays': [{'date': '2024-01-26', 'name': 'Republic Day'}]}
+    res = client.post('/predict', json=body)
+    assert res.status_code == 200
+    data = res.get_json()
+    assert data['crop'] == 'tomato'
+    assert len(data['predictions']) == 7
+    assert data['predicted_price'] == data['predictions'][0]['predicted_price']
+    assert data['confidence'] == data['predictions'][0]['confidence']
+    assert data['trend'] in ('up', 'down', 'stable') and data['recommendation']
+
+    assert client.post('/predict', json={'crop': 'tomato'}).get_json()['predicted_price'] == 50.0
+    assert client.post('/predict', json={'historical_prices': [{'price': 1}]}).status_code == 400
+    assert client.post('/predict', json={'days': 1000}).status_code == 400
+
+
+def test_batch_endpoint_keys_results_per_series(client):
+    body = {'days': 5, 'inputs': [
+        {'crop': 'tomato', 'location': 'Pune', 'historical_prices': history(365, end=NOW)},
+        {'crop': 'onion', 'location': 'Pune', 'days': 3, 'historical_prices': history(60, seed=1, end=NOW)},
+        {'id': 'bad', 'historical_prices': [{'price': 1}]},
+    ]}
+    res = client.post('/predict/batch', json=body)
+    assert res.status_code == 200
+    data = res.get_json()
+    assert sorted(data['results']) == ['onion:Pune', 'tomato:Pune'] and data['count'] == 2
+    assert list(data['errors']) == ['bad']
+    single = client.post('/predict', json=body['inputs'][1]).get_json()
+    assert data['results']['onion:Pune'] == single
+
+    body['inputs'] += [{'id': 'days', 'days': 'soon', 'historical_prices': history(60, end=NOW)},
+                       {'id': 'far', 'days': 500}, {'id': 'holidays', 'market_holidays': 5},
+                       {'id': 'stale', 'historical_prices': history(60, end='2020-06-30')}]
+    data = client.post('/predict/batch', json=body).get_json()
+    assert sorted(data['results']) == ['onion:Pune', 'tomato:Pune']
+    assert sorted(data['errors']) == ['bad', 'days', 'far', 'holidays', 'stale']
+    assert data['errors']['days'] == 'days must be a whole number'
+
+    twice = {'inputs': [{'crop': 'tomato', 'location': 'Pune'}] * 2}
+    assert client.post('/predict/batch', json=twice).status_code == 400
+    assert client.post('/predict/batch', json={'inputs': []}).status_code == 400
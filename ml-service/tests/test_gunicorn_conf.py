@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+ML_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_conf_script(code, **env):
+    """Run `code` after executing gunicorn.conf.py (as `conf`) in a fresh process."""
+    env = {k: v for k, v in os.environ.items() if not k.startswith(('ML_', 'OMP_'))} | env
+    return subprocess.run(
+        [sys.executable, '-c', 'import runpy\nconf = runpy.run_path("gunicorn.conf.py")\n' + code],
+        cwd=ML_SERVICE_DIR, capture_output=True, text=True, env=env, timeout=60,
+    )
+
+
+def test_the_coalescer_gets_concurrent_calls_by_default():
+    result = run_conf_script(
+        'assert conf["max_concurrency"] == 1, conf["max_concurrency"]\n', ML_WORKERS='4')
+    assert result.returncode == 0, result.stderr
+    result = run_conf_script(
+        'import os\n'
+        'assert conf["max_concurrency"] == 2, conf["max_concurrency"]\n'
+        'assert os.environ["ML_MAX_CONCURRENCY"] == "2"\n', ML_WORKERS='4', ML_COALESCE_WAIT_MS='2')
+    assert result.returncode == 0, result.stderr
+
+
+def test_restarted_workers_take_the_free_cpu_slot():
+    result = run_conf_script(
+        'from types import SimpleNamespace as Worker\n'
+        'server = Worker(WORKERS={}, num_workers=3)\n'
+        'def spawn(pid):\n'
+        '    worker = Worker()\n'
+        '    conf["pre_fork"](server, worker)\n'
+        '    server.WORKERS[pid] = worker\n'
+        '    return worker.cpu_slot\n'
+        'assert [spawn(pid) for pid in (10, 11, 12)] == [0, 1, 2]\n'
+        'del server.WORKERS[11]\n'
+        'assert spawn(13) == 1\n'
+        'del server.WORKERS[10]\n'
+        'assert spawn(14) == 0\n'
+        'assert spawn(15) == 0   # more workers than slots (e.g. a graceful reload): least shared first\n',
+        ML_WORKERS='3')
+    assert result.returncode == 0, result.stderr
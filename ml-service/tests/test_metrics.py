@@ -0,0 +1,51 @@
+import threading
+
+from metrics import Metrics
+
+
+def test_counts_from_many_threads_add_up():
+    metrics = Metrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.inc('hits', (('route', '/x'),))
+            metrics.observe('latency', (), 0.002)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert metrics.snapshot()['hits'] == {(('route', '/x'),): 8000}
+    assert 'latency_count 8000' in metrics.render()
+    # Shards of finished threads are folded together on scrape
+    assert metrics._shards == []
+
+
+def test_histogram_renders_cumulative_buckets():
+    metrics = Metrics(buckets=(0.01, 0.1))
+    metrics.describe('latency', 'histogram', 'Latency')
+    for seconds in (0.005, 0.05, 0.05, 3.0):
+        metrics.observe('latency', (('stage', 'predict'),), seconds)
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ['# HELP latency Latency', '# TYPE latency histogram']
+    assert lines[2:] == [
+        'latency_bucket{stage="predict",le="0.01"} 1',
+        'latency_bucket{stage="predict",le="0.1"} 3',
+        'latency_bucket{stage="predict",le="+Inf"} 4',
+        'latency_sum{stage="predict"} 3.105',
+        'latency_count{stage="predict"} 4',
+    ]
+
+
+def test_metrics_endpoint_reports_requests_and_stages(client):
+    client.post('/recommend-crop', json={'ph': 5.5, 'rainfall': 301})
+    client.post('/recommend-crop', json={})
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'ml_requests_total{route="/recommend-crop",method="POST",status="200"}' in text
+    assert 'ml_requests_total{route="/recommend-crop",method="POST",status="400"}' in text
+    for step in ('parse', 'encode', 'decode', 'serialize'):
+        assert f'ml_stage_seconds_count{{route="/recommend-crop",stage="{step}"}}' in text
+    assert 'ml_predictions_total{model="crop",source="model"}' in text
+    assert 'ml_requests_in_flight{route="/recommend-crop"} 0' in text
+    assert 'ml_model_info{model="crop",version=' in text
@@ -0,0 +1,57 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import app
+from model_bundle import MANIFEST_FILE, BundleError, load_bundle, write_bundle
+from test_scoring import crop_matrix
+
+
+@pytest.fixture
+def bundle_dir(tmp_path):
+    path = str(tmp_path / 'crop.bundle')
+    crop = app._models.crop
+    write_bundle(path, 'crop', crop.model, crop.codec.feature_names, crop.codec.classes)
+    return path
+
+
+def test_round_trip_predicts_identically(bundle_dir):
+    bundle, crop = load_bundle(bundle_dir), app._models.crop
+    X = crop_matrix()
+    np.testing.assert_array_equal(bundle.model.predict_proba(X), crop.model.predict_proba(X))
+    np.testing.assert_allclose(bundle.ensemble.predict_proba(X), crop.model.predict_proba(X), atol=2e-6)
+    assert bundle.classes == crop.codec.classes.tolist()
+    assert bundle.version == bundle.manifest['sha256'][:12]
+
+
+def test_trees_are_memory_mapped(bundle_dir):
+    assert isinstance(load_bundle(bundle_dir).ensemble.value.base, np.memmap)
+
+
+def test_tampered_file_is_rejected(bundle_dir):
+    with open(os.path.join(bundle_dir, 'trees', 'threshold.npy'), 'r+b') as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b'\x00\x00\x80\x7f')
+    with pytest.raises(BundleError, match='threshold.npy'):
+        load_bundle(bundle_dir)
+
+
+def test_tampered_manifest_is_rejected(bundle_dir):
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['classes'][0], manifest['classes'][1] = manifest['classes'][1], manifest['classes'][0]
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    with pytest.raises(BundleError, match='manifest'):
+        load_bundle(bundle_dir)
+
+
+def test_rewriting_replaces_the_bundle(bundle_dir):
+    before = load_bundle(bundle_dir).manifest['created_at']
+    crop = app._models.crop
+    write_bundle(bundle_dir, 'crop', crop.model, crop.codec.feature_names, crop.codec.classes)
+    assert os.listdir(os.path.dirname(bundle_dir)) == ['crop.bundle']
+    assert load_bundle(bundle_dir).manifest['created_at'] >= before
@@ -0,0 +1,76 @@
+import numpy as np
+
+import app
+from prediction_cache import PredictionCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    cache = PredictionCache(maxsize=2)
+    cache.put(b'a', 1)
+    cache.put(b'b', 2)
+    assert cache.get(b'a') == 1
+    cache.put(b'c', 3)
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') == 1 and cache.get(b'c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = Clock()
+    cache = PredictionCache(ttl=10, clock=clock)
+    cache.put(b'a', 1)
+    clock.now = 9.9
+    assert cache.get(b'a') == 1
+    clock.now = 10
+    assert cache.get(b'a') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_keys_include_namespace_and_quantized_row():
+    cache = PredictionCache(quantum=0.5)
+    mask = np.array([True, True, False])
+    X = cache.quantize(np.array([[1.1, 2.3, 4.0], [0.9, 2.4, 4.0]]), mask)
+    a, b = cache.keys('crop:v1', X)
+    assert a == b
+    assert cache.keys('crop:v2', X)[0] != a
+    assert cache.quantize(np.array([[1.0, 1.0, 3.0]]), mask)[0, 2] == 3.0
+
+
+def test_snapshot_round_trip_drops_other_model_versions(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = PredictionCache()
+    cache.put(b'crop:v1|x', [[1, 2, 3], [50.0, 20.0, 10.0]])
+    cache.put(b'crop:v0|y', [[0, 1, 2], [40.0, 30.0, 20.0]])
+    assert cache.save(path) == 2
+
+    warm = PredictionCache()
+    assert warm.load(path, ['crop:v1']) == 1
+    assert warm.get(b'crop:v1|x') == [[1, 2, 3], [50.0, 20.0, 10.0]]
+
+
+def test_repeated_requests_are_served_from_cache(client):
+    body = {'nitrogen': 61, 'phosphorous': 44, 'potassium': 17, 'temperature': 26.1,
+            'humidity': 71.6, 'ph': 6.9, 'rainfall': 88.5}
+    before = app._cache.stats()
+    first = client.post('/recommend-crop', json=body).get_json()
+    second = client.post('/recommend-crop', json=body).get_json()
+    after = client.get('/cache/stats').get_json()
+    assert first == second
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
+
+
+def test_reloading_artifacts_invalidates_cache(client):
+    client.post('/recommend-crop', json={'nitrogen': 12})
+    assert len(app._cache) > 0
+    app.load_artifacts()
+    assert len(app._cache) == 0
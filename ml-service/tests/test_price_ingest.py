@@ -0,0 +1,95 @@
+import io
+import json
+
+import numpy as np
+
+import app
+from forecast_state import ForecastStateStore
+from forecaster import forecast
+from price_ingest import coerce, ingest, ndjson_lines
+
+from test_forecaster import TODAY, history
+
+
+def ndjson(records):
+    return b''.join(json.dumps(r).encode() + b'\n' for r in records)
+
+
+def price_history(points, crop='Tomato', region='Pune'):
+    """PriceHistory records of /predict-style points."""
+    return [{'cropName': crop, 'region': region, 'market_name': 'APMC', 'price': p['price'], 'date': p['date']}
+            for p in points]
+
+
+def test_lines_are_split_across_chunks():
+    body = b'{"a": 1}\n\n{"b": 2}\r\n{"c": 3}'
+    lines = list(ndjson_lines(io.BytesIO(body).read, chunk_bytes=3))
+    assert [n for n, _ in lines] == [1, 3, 4]
+    assert [json.loads(line) for _, line in lines] == [{'a': 1}, {'b': 2}, {'c': 3}]
+
+
+def test_bad_records_are_reported_by_line():
+    lines = [
+        (1, b'{"cropName": "Onion ", "price": "21.5", "date": {"$date": "2025-01-02T00:00:00Z"}}'),
+        (2, b'{"cropName": "onion", "price": -1, "date": "2025-01-02"}'),
+        (3, b'{"cropName": "onion", "date": "2025-01-02"}'),
+        (4, b'not json'),
+        (5, b'{"cropName": "onion", "price": 3, "date": "yesterday"}'),
+        (6, b'[1, 2]'),
+    ]
+    keys, days, prices, errors = coerce(lines)
+    assert keys == ['onion:'] and prices.tolist() == [21.5]
+    assert days.tolist() == [np.datetime64('2025-01-02', 'D').astype(np.int64)]
+    assert sorted(n for n, _ in errors) == [2, 3, 4, 5, 6]
+
+
+def test_ingested_history_forecasts_like_a_posted_one():
+    points = history(200)
+    records = price_history(points)
+    # Out of order within a batch, and two markets on the last day
+    records.append({**records[-1], 'market_name': 'Other', 'price': records[-1]['price'] + 2})
+    records[-4:] = records[-4:][::-1]
+    store = ForecastStateStore()
+    acks = list(ingest(io.BytesIO(ndjson(records)).read, store, batch_rows=64))
+    assert [a['batch'] for a in acks[:-1]] == [1, 2, 3, 4]
+    summary = acks[-1]
+    assert summary['done'] and (summary['rows'], summary['accepted'], summary['rejected']) == (201, 201, 0)
+
+    points[-1] = {**points[-1], 'price': points[-1]['price'] + 1}
+    result = store.get('tomato:Pune').forecast(7, today=TODAY)
+    assert ([p['predicted_price'] for p in result['predictions']]
+            == [p['predicted_price'] for p in forecast(points, 7, today=TODAY)['predictions']])
+
+
+def test_records_older_than_a_series_are_stale():
+    store = ForecastStateStore()
+    records = price_history(history(20))
+    acks = list(ingest(io.BytesIO(ndjson(records[10:] + records[:10])).read, store, batch_rows=10))
+    assert acks[-1]['stale'] == 10 and acks[-1]['accepted'] == 10
+
+
+def test_overlong_lines_stop_the_stream():
+    store = ForecastStateStore()
+    acks = list(ingest(io.BytesIO(b'x' * (1 << 17)).read, store))
+    assert 'error' in acks[-1] and len(store) == 0
+
+
+def test_ingest_endpoint_streams_acknowledgements(client, monkeypatch):
+    assert client.post('/ingest/prices', data=b'').status_code == 503
+    monkeypatch.setattr(app, '_forecast_state', ForecastStateStore(maxsize=10))
+
+    yesterday = np.datetime64('today') - 1
+    body = ndjson(price_history(history(100, end=str(yesterday)))) + b'{"cropName": ""}\n'
+    res = client.post('/ingest/prices?batch=40', data=body, content_type='application/x-ndjson')
+    assert res.status_code == 200 and res.mimetype == 'application/x-ndjson'
+    acks = [json.loads(line) for line in res.data.splitlines()]
+    assert [a.get('batch') for a in acks] == [1, 2, 3, None]
+    assert acks[-1]['accepted'] == 100 and acks[-1]['rejected'] == 1 and acks[2]['errors'][0]['line'] == 101
+
+    result = client.post('/predict', json={'crop': 'tomato', 'location': 'Pune', 'days': 2}).get_json()
+    assert result['model']['incremental'] and result['model']['history_days'] == 100
+
+    # Other workers would never see the prices
+    monkeypatch.setattr(app, 'WORKERS', 2)
+    res = client.post('/ingest/prices', data=body, content_type='application/x-ndjson')
+    assert res.status_code == 503 and 'ML_WORKERS=1' in res.get_json()['error']
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import app
+from profiler import format_collapsed, sample_stacks
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampler_catches_a_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name='busy')
+    worker.start()
+    try:
+        stacks, ticks = sample_stacks(0.2, interval=0.002, threads=lambda: {worker.ident})
+    finally:
+        stop.set()
+        worker.join()
+    assert ticks > 0
+    lines = format_collapsed(stacks).splitlines()
+    assert all(line.startswith('busy;') for line in lines)
+    assert any('test_profiler.py:busy_loop' in line for line in lines)
+
+
+def test_profile_endpoint_samples_request_threads(client):
+    results = []
+    stop = threading.Event()
+
+    def traffic():
+        c = app.app.test_client()
+        while not stop.is_set():
+            results.append(c.post('/recommend-crop', json={'ph': 6.4}).status_code)
+
+    worker = threading.Thread(target=traffic)
+    worker.start()
+    try:
+        time.sleep(0.05)
+        res = client.get('/admin/profile?seconds=0.5&interval_ms=1')
+    finally:
+        stop.set()
+        worker.join()
+    assert res.status_code == 200
+    assert int(res.headers['X-Profile-Ticks']) > 0
+    assert 'app.py:recommend_crop' in res.get_data(as_text=True)
+    assert set(results) == {200}
+
+
+def test_profile_endpoint_validates_arguments(client):
+    assert client.get('/admin/profile?seconds=0').status_code == 400
+    assert client.get('/admin/profile?seconds=abc').status_code == 400
+
+
+def test_profile_header_records_a_request_report(client):
+    res = client.post('/recommend-crop', json={'ph': 6.4}, headers={'X-Profile': '1'})
+    assert res.status_code == 200
+    report = client.get(f"/admin/profile/requests/{res.headers['X-Profile-Id']}")
+    assert report.status_code == 200
+    assert 'predict_top3' in report.get_data(as_text=True)
+    assert 'X-Profile-Id' not in client.post('/recommend-crop', json={'ph': 6.4}).headers
+    assert client.get('/admin/profile/requests/nope').status_code == 404
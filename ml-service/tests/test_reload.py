@@ -0,0 +1,78 @@
+import shutil
+
+import pytest
+
+import app
+from model_bundle import bundle_path, write_bundle
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    """A copy of models/ the test can retrain into; the served models are restored afterwards."""
+    for name in app.LOADERS:
+        shutil.copytree(bundle_path(app.MODELS_DIR, name), bundle_path(str(tmp_path), name))
+    monkeypatch.setattr(app, 'MODELS_DIR', str(tmp_path))
+    monkeypatch.setattr(app, '_models', app._models)
+    return str(tmp_path)
+
+
+def retrain_crop(models_dir, classes):
+    crop = app._models.crop
+    return write_bundle(bundle_path(models_dir, 'crop'), 'crop', crop.model,
+                        crop.codec.feature_names, classes)['version']
+
+
+def test_responses_carry_the_model_version(client):
+    body = client.post('/recommend-crop', json={'ph': 6.1}).get_json()
+    assert body['model_version'] == app._models.crop.version
+
+
+def test_unchanged_bundles_are_not_reloaded(models_dir):
+    before = app._models
+    assert app.reload_models() == {'fertilizer': 'unchanged', 'crop': 'unchanged'}
+    assert app._models is before
+
+
+def test_changed_bundle_is_swapped_in(client, models_dir):
+    old = app._models.crop
+    classes = [c.upper() for c in old.codec.classes.tolist()]
+    version = retrain_crop(models_dir, classes)
+
+    res = client.post('/admin/reload?wait=1')
+    assert res.get_json()['models'] == {'fertilizer': 'unchanged', 'crop': 'reloaded'}
+    assert app._models.crop.version == version != old.version
+
+    body = client.post('/recommend-crop', json={'ph': 6.1}).get_json()
+    assert body['model_version'] == version
+    assert body['recommendations'][0]['crop'].upper() in classes
+    # A request that started on the old model still completes on it
+    assert app.predict_top3(old.codec.encode({'ph': 6.1}), old)
+
+
+def test_failed_reload_keeps_serving_the_old_model(client, models_dir):
+    before = app._models.crop
+    with open(f"{bundle_path(models_dir, 'crop')}/booster.ubj", 'ab') as f:
+        f.write(b'corrupt')
+    assert app.reload_models(force=True)['crop'] == 'failed'
+    assert app._models.crop is before
+    assert client.post('/recommend-crop', json={'ph': 6.1}).status_code == 200
+
+
+def test_admin_endpoints_require_the_token_when_set(client, monkeypatch):
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', 'secret')
+    monkeypatch.setattr(app, 'reload_models', lambda force=False: {})
+    assert client.post('/admin/reload?wait=1').status_code == 403
+    assert client.post('/admin/reload?wait=1', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.post('/admin/reload?wait=1', headers={'X-Admin-Token': 'secret'}).status_code == 200
+
+
+@pytest.mark.parametrize('header', ['X-Forwarded-For', 'X-Real-IP', 'Forwarded'])
+def test_forwarded_requests_are_not_local(client, monkeypatch, header):
+    monkeypatch.setattr(app, 'reload_models', lambda force=False: {})
+    assert client.post('/admin/reload?wait=1').status_code == 200
+    assert client.post('/admin/reload?wait=1', headers={header: '203.0.113.7'}).status_code == 403
+
+    monkeypatch.setattr(app, 'ADMIN_LOCAL', False)
+    assert client.post('/admin/reload?wait=1').status_code == 403
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', 'secret')
+    assert client.post('/admin/reload?wait=1', headers={'X-Admin-Token': 'secret', header: '203.0.113.7'}).status_code == 200
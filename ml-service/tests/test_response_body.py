@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import response_body
+from response_body import ResponseFragments, batch_body, stdlib_dumps
+
+FERTILIZER_INPUT = {'temperature': 26, 'humidity': 52, 'moisture': 38, 'nitrogen': 37, 'potassium': 0,
+                    'phosphorous': 0, 'soilType': 'Sandy', 'cropType': 'Maize'}
+
+
+@pytest.mark.parametrize('encode', [response_body.dumps, stdlib_dumps])
+def test_fragments_build_the_same_document_as_a_dict(encode):
+    fragments = ResponseFragments('crop', ['Rice', 'Maize', 'Jute'], {'available': ['a', 'é']}, 'abc123',
+                                  encode=encode)
+    body = fragments.body(encode({'ph': 6.5}), fragments.recommendations([2, 0, 1], [71.5, 20.0, 8.5]))
+    assert json.loads(body) == {
+        'success': True,
+        'input': {'ph': 6.5},
+        'recommendations': [
+            {'rank': 1, 'crop': 'Jute', 'confidence': 71.5},
+            {'rank': 2, 'crop': 'Rice', 'confidence': 20.0},
+            {'rank': 3, 'crop': 'Maize', 'confidence': 8.5},
+        ],
+        'available': ['a', 'é'],
+        'model_version': 'abc123',
+    }
+    lean = json.loads(fragments.body(b'{}', b'[]', lean=True))
+    assert 'available' not in lean and lean['model_version'] == 'abc123'
+    assert json.loads(batch_body([body, body])) == {
+        'success': True, 'count': 2, 'results': [json.loads(body)] * 2}
+
+
+def test_dumps_falls_back_for_values_orjson_rejects():
+    assert json.loads(response_body.dumps({'n': 10 ** 30})) == {'n': 10 ** 30}
+
+
+def test_fertilizer_response_fields(client):
+    import app
+    codec = app._models.fertilizer.codec
+    body = client.post('/recommend-fertilizer', json=FERTILIZER_INPUT).get_json()
+    assert body['input'] == {k: FERTILIZER_INPUT[k] for k in ('soilType', 'cropType', 'nitrogen',
+                                                              'phosphorous', 'potassium')}
+    assert [r['rank'] for r in body['recommendations']] == [1, 2, 3]
+    assert all(r['fertilizer'] in codec.classes.tolist() for r in body['recommendations'])
+    assert body['available_soil_types'] == codec.categories['Soil Type'].tolist()
+    assert body['available_crop_types'] == codec.categories['Crop Type'].tolist()
+    assert body['model_version'] == app._models.fertilizer.version
+
+
+def test_lean_responses_drop_the_static_lists(client, monkeypatch):
+    import app
+    full = client.post('/recommend-fertilizer', json=FERTILIZER_INPUT).get_json()
+    lean = client.post('/recommend-fertilizer?lean=1', json=FERTILIZER_INPUT).get_json()
+    assert lean == {k: v for k, v in full.items() if not k.startswith('available_')}
+
+    monkeypatch.setattr(app, 'LEAN_RESPONSES', True)
+    batch = client.post('/recommend-fertilizer/batch', json={'inputs': [FERTILIZER_INPUT]}).get_json()
+    assert batch['results'] == [lean]
+    assert client.post('/recommend-fertilizer?lean=0', json=FERTILIZER_INPUT).get_json() == full
+
+
+def test_metadata_is_served_with_an_etag(client):
+    import app
+    full = client.post('/recommend-fertilizer', json=FERTILIZER_INPUT).get_json()
+    res = client.get('/recommend-fertilizer/metadata')
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body['available_soil_types'] == full['available_soil_types']
+    assert body['available_crop_types'] == full['available_crop_types']
+    assert body['labels'] == app._models.fertilizer.codec.classes.tolist()
+    assert res.headers['ETag'] == f'"fertilizer-{app._models.fertilizer.version}"'
+
+    again = client.get('/recommend-fertilizer/metadata', headers={'If-None-Match': res.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+    crop = client.get('/recommend-crop/metadata').get_json()
+    assert 'Rice' in crop['labels'] and crop['model_version'] == app._models.crop.version
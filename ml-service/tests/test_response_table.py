@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import app
+from build_fertilizer_table import feature_ranges, sample_grid
+from response_table import build_table
+from tree_ensemble import compile_booster
+
+RANGES = {
+    'temperature': (27, 31),
+    'humidity': (58, 61),
+    'moisture': (50, 56),
+    'nitrogen': (8, 12),
+    'potassium': (14, 18),
+    'phosphorous': (20, 24),
+}
+
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('fertilizer_table'))
+    ranges = feature_ranges(app._models.fertilizer.codec, RANGES)
+    ensemble = compile_booster(app._models.fertilizer.model.get_booster())
+    fertilizer = app._models.fertilizer
+    return build_table(ensemble, fertilizer.scorer, ranges, fertilizer.version, path, log=lambda *_: None)
+
+
+def test_on_grid_rows_match_the_model(table):
+    X = sample_grid(feature_ranges(app._models.fertilizer.codec, RANGES), 2000, np.random.default_rng(1))
+    hit, idx, conf = table.lookup(X)
+    assert hit.all()
+    live_idx, live_conf = app.top_k(app._models.fertilizer.scorer.predict_proba(X))
+    assert idx == live_idx.tolist()
+    assert conf == live_conf
+
+
+def test_off_grid_rows_miss(table):
+    on_grid = app._models.fertilizer.codec.encode({'temperature': 29, 'humidity': 60, 'moisture': 52,
+                                                   'nitrogen': 10, 'potassium': 15, 'phosphorous': 22})
+    fractional = on_grid.copy()
+    fractional[0, 0] = 29.5
+    out_of_range = on_grid.copy()
+    out_of_range[0, 3] = 40
+    hit, _, _ = table.lookup(np.vstack([on_grid, fractional, out_of_range]))
+    assert hit.tolist() == [True, False, False]
+    assert table.lookup(fractional)[0].tolist() == [False]
+
+
+def test_route_answers_from_table_and_falls_back(client, table, monkeypatch):
+    bodies = [
+        {'temperature': 29, 'humidity': 60, 'moisture': 52, 'nitrogen': 10, 'potassium': 15,
+         'phosphorous': 22, 'soilType': 'Red', 'cropType': 'Paddy'},
+        {'temperature': 29.4, 'humidity': 60, 'soilType': 'Black', 'cropType': 'Cotton'},
+    ]
+    def serve_with(table):
+        fertilizer = app._models.fertilizer._replace(table=table)
+        monkeypatch.setattr(app, '_models', app._models._replace(fertilizer=fertilizer))
+
+    serve_with(None)
+    expected = client.post('/recommend-fertilizer/batch', json={'inputs': bodies}).get_json()
+
+    serve_with(table)
+    app._cache.clear()
+    assert client.post('/recommend-fertilizer/batch', json={'inputs': bodies}).get_json() == expected
+    assert client.post('/recommend-fertilizer', json=bodies[0]).get_json() == expected['results'][0]
+
+
+def test_non_finite_readings_miss_and_reach_the_model(client, table, monkeypatch):
+    on_grid = {'temperature': 29, 'humidity': 60, 'moisture': 52, 'nitrogen': 10, 'potassium': 15,
+               'phosphorous': 22, 'soilType': 'Red', 'cropType': 'Paddy'}
+    codec = app._models.fertilizer.codec
+    for reading in ('nan', 'inf', '-inf'):
+        X = codec.encode({**on_grid, 'nitrogen': reading})
+        assert table.lookup(X)[0].tolist() == [False]
+        assert table.lookup(np.vstack([X, X]))[0].tolist() == [False, False]
+
+    fertilizer = app._models.fertilizer._replace(table=table)
+    monkeypatch.setattr(app, '_models', app._models._replace(fertilizer=fertilizer))
+    app._cache.clear()
+    for reading in ('nan', 'inf'):
+        res = client.post('/recommend-fertilizer', json={**on_grid, 'nitrogen': reading})
+        assert res.status_code == 200 and len(res.get_json()['recommendations']) == 3
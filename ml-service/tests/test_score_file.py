@@ -0,0 +1,64 @@
+import csv
+import os
+
+import pytest
+
+from score_file import score_file
+
+from test_batch_endpoints import FERTILIZER_INPUTS
+
+CROP_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Crop_recommendation.csv')
+
+
+def read(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_scores_match_the_service_in_input_order(client, tmp_path):
+    out = tmp_path / 'out.csv'
+    report = score_file('crop', CROP_CSV, str(out), workers=0, chunk_rows=300, keep=['label'])
+    rows = read(out)
+    assert report['rows'] == len(rows) == 2200 and report['chunks'] == 8
+    assert [int(r['row']) for r in rows] == list(range(2200))
+
+    source = read(CROP_CSV)
+    for i in (0, 299, 300, 2199):
+        body = {'nitrogen': source[i]['N'], 'phosphorous': source[i]['P'], 'potassium': source[i]['K'],
+                **{key: source[i][key] for key in ('temperature', 'humidity', 'ph', 'rainfall')}}
+        expected = client.post('/recommend-crop', json=body).get_json()['recommendations']
+        assert rows[i]['label'] == source[i]['label']
+        assert [(rows[i][f'crop_{n}'], float(rows[i][f'confidence_{n}'])) for n in (1, 2, 3)] == \
+            [(r['crop'], r['confidence']) for r in expected]
+
+
+def test_worker_processes_write_the_same_file(tmp_path):
+    score_file('crop', CROP_CSV, str(tmp_path / 'local.csv'), workers=0, chunk_rows=500)
+    report = score_file('crop', CROP_CSV, str(tmp_path / 'pool.csv'), workers=2, chunk_rows=500)
+    assert report['workers'] == 2 and report['rows'] == 2200
+    assert (tmp_path / 'pool.csv').read_bytes() == (tmp_path / 'local.csv').read_bytes()
+
+
+def test_request_keys_and_defaults(client, tmp_path):
+    source = tmp_path / 'tests.csv'
+    keys = ['nitrogen', 'soilType', 'cropType']
+    with open(source, 'w', newline='') as f:
+        writer = csv.DictWriter(f, keys, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(FERTILIZER_INPUTS)
+    report = score_file('fertilizer', str(source), str(tmp_path / 'out.csv'), workers=0, k=2)
+    assert sorted(report['inputs'].values()) == sorted(keys)
+
+    rows = read(tmp_path / 'out.csv')
+    for data, row in zip(FERTILIZER_INPUTS, rows):
+        expected = client.post('/recommend-fertilizer', json={key: data[key] for key in keys}).get_json()
+        assert [row['fertilizer_1'], row['fertilizer_2']] == \
+            [r['fertilizer'] for r in expected['recommendations'][:2]]
+        assert 'fertilizer_3' not in row
+
+
+def test_files_without_model_inputs_are_refused(tmp_path):
+    source = tmp_path / 'other.csv'
+    source.write_text('a,b\n1,2\n')
+    with pytest.raises(ValueError):
+        score_file('crop', str(source), str(tmp_path / 'out.csv'), workers=0)
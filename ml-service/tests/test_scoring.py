@@ -0,0 +1,56 @@
+import csv
+import json
+import os
+from io import StringIO
+
+import numpy as np
+import pytest
+
+import app
+from scoring import BoosterScorer, SklearnScorer, make_scorer
+from train_model import EMBEDDED_DATA
+
+ML_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fertilizer_matrix():
+    rows = list(csv.DictReader(StringIO(EMBEDDED_DATA)))
+    return app._models.fertilizer.codec.encode_columns({col: [r[col] for r in rows] for col in rows[0]})
+
+
+def crop_matrix():
+    with open(os.path.join(ML_SERVICE_DIR, 'Crop_recommendation.csv'), newline='') as f:
+        rows = list(csv.DictReader(f))
+    return app._models.crop.codec.encode_columns({col: [r[col] for r in rows] for col in rows[0]})
+
+
+@pytest.mark.parametrize('model, matrix', [
+    (lambda: app._models.fertilizer.model, fertilizer_matrix),
+    (lambda: app._models.crop.model, crop_matrix),
+])
+def test_booster_matches_sklearn_wrapper(model, matrix):
+    X = matrix()
+    expected = SklearnScorer(model()).predict_proba(X)
+    actual = BoosterScorer(model()).predict_proba(X)
+    assert actual.shape == expected.shape
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-6)
+    # Single rows go through the same path
+    np.testing.assert_allclose(BoosterScorer(model()).predict_proba(X[:1]), expected[:1], rtol=0, atol=1e-6)
+
+
+def test_make_scorer_honours_backend_switch():
+    assert make_scorer(app._models.fertilizer.model, 'sklearn').backend == 'sklearn'
+    assert make_scorer(app._models.fertilizer.model, 'booster').backend == 'booster'
+    with pytest.raises(ValueError):
+        make_scorer(app._models.fertilizer.model, 'onnx')
+
+
+def nthread(booster):
+    return json.loads(booster.save_config())['learner']['generic_param']['nthread']
+
+
+def test_booster_thread_pinning_leaves_wrapper_untouched():
+    before = nthread(app._models.fertilizer.model.get_booster())
+    scorer = BoosterScorer(app._models.fertilizer.model, n_threads=3)
+    assert nthread(scorer.booster) == '3'
+    assert nthread(app._models.fertilizer.model.get_booster()) == before
@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+
+ML_SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_app_script(code, mode):
+    return subprocess.run(
+        [sys.executable, '-c', code], cwd=ML_SERVICE_DIR, capture_output=True, text=True,
+        env={**os.environ, 'ML_LOAD_MODE': mode}, timeout=120,
+    )
+
+
+def test_lazy_import_defers_heavy_modules_and_models():
+    result = run_app_script(
+        'import sys, app\n'
+        'heavy = [m for m in ("pandas", "xgboost", "sklearn") if m in sys.modules]\n'
+        'assert not heavy, heavy\n'
+        'assert app._load_state == {"fertilizer": "not_loaded", "crop": "not_loaded"}\n'
+        'res = app.app.test_client().post("/recommend-crop", json={"ph": 6.8})\n'
+        'assert res.status_code == 200, res.status_code\n'
+        'assert app._load_state == {"fertilizer": "not_loaded", "crop": "ready"}\n',
+        'lazy',
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_numpy_backend_serves_without_xgboost():
+    result = run_app_script(
+        'import os, sys\n'
+        'os.environ["ML_SCORING_BACKEND"] = "numpy"\n'
+        'import app\n'
+        'assert app._load_state == {"fertilizer": "ready", "crop": "ready"}, app._load_state\n'
+        'res = app.app.test_client().post("/recommend-crop", json={"ph": 6.8})\n'
+        'assert res.status_code == 200, res.status_code\n'
+        'assert "xgboost" not in sys.modules and app._models.crop.model is None\n',
+        'eager',
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_background_loading_serves_once_ready():
+    result = run_app_script(
+        'import app\n'
+        'res = app.app.test_client().post("/recommend-fertilizer", json={"nitrogen": 10})\n'
+        'assert res.status_code == 200, res.status_code\n',
+        'background',
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_health_reports_each_model(client):
+    models = client.get('/health').get_json()['models']
+    assert set(models) == {'fertilizer', 'crop'}
+    for status in models.values():
+        assert status['status'] == 'ready'
+        assert len(status['version']) == 12
+        assert status['load_seconds'] >= 0
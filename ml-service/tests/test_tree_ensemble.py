@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import app
+from scoring import NumpyScorer, make_scorer
+from test_scoring import crop_matrix, fertilizer_matrix
+from tree_ensemble import TreeEnsemble, compile_booster
+
+
+@pytest.mark.parametrize('model, matrix', [
+    (lambda: app._models.fertilizer.model, fertilizer_matrix),
+    (lambda: app._models.crop.model, crop_matrix),
+])
+def test_compiled_ensemble_matches_predict_proba(model, matrix):
+    X = matrix()
+    expected = model().predict_proba(X)
+    actual = NumpyScorer(model()).predict_proba(X)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=2e-6)
+    assert np.array_equal(actual.argmax(axis=1), expected.argmax(axis=1))
+
+
+def test_missing_values_follow_default_direction():
+    X = crop_matrix()[:200].copy()
+    X[::2, 3] = np.nan
+    X[::3, 0] = np.nan
+    expected = app._models.crop.model.predict_proba(X)
+    actual = NumpyScorer(app._models.crop.model).predict_proba(X)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=2e-6)
+
+
+def test_truncated_rounds_match_iteration_range():
+    X = fertilizer_matrix()
+    expected = app._models.fertilizer.model.predict_proba(X, iteration_range=(0, 40))
+    actual = compile_booster(app._models.fertilizer.model.get_booster(), n_rounds=40).predict_proba(X)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=2e-6)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    ensemble = compile_booster(app._models.crop.model.get_booster())
+    ensemble.save(tmp_path / 'crop.npz')
+    loaded = TreeEnsemble.load(tmp_path / 'crop.npz')
+    X = crop_matrix()[:50]
+    assert np.array_equal(loaded.predict_proba(X), ensemble.predict_proba(X))
+
+
+def test_unbuildable_backend_falls_back_to_numpy():
+    class Unsupported:
+        objective = 'binary:logistic'
+
+        def __init__(self, model):
+            self._model = model
+
+        def get_booster(self):
+            return self._model.get_booster()
+
+    assert make_scorer(Unsupported(app._models.fertilizer.model), 'booster').backend == 'numpy'
@@ -0,0 +1,55 @@
+import numpy as np
+
+import app
+from batcher import CoalescingScorer
+from warmup import synthetic_rows, touch_pages
+
+
+def test_synthetic_rows_are_valid_model_inputs():
+    codec = app.ensure_loaded('fertilizer').codec
+    X = synthetic_rows(codec, 64)
+    assert X.shape == (64, codec.n_features) and X.dtype == np.float32
+    for i, f in enumerate(codec.fields):
+        values = codec.categories.get(f.column)
+        if values is not None:
+            assert set(np.unique(X[:, i])) <= set(range(len(values)))
+    assert np.array_equal(X, synthetic_rows(codec, 64))
+    assert touch_pages(X, None, np.empty(0)) == X.nbytes
+
+
+def test_warm_up_runs_every_path_without_caching_or_counting(client):
+    stats = client.get('/cache/stats').get_json()
+    app.warm_up()
+    assert client.get('/cache/stats').get_json() == stats
+    for name in ('fertilizer', 'crop', 'forecaster'):
+        assert app._warmup_seconds[name] > 0
+
+
+def test_warm_up_bypasses_the_coalescer():
+    served = app.ensure_loaded('crop')
+    coalescing = CoalescingScorer(served.scorer, max_wait_ms=1)
+    try:
+        app.warm(served._replace(scorer=coalescing))
+        assert coalescing.stats()['batches'] == 0
+    finally:
+        coalescing.close()
+
+
+def test_liveness_and_readiness(client, monkeypatch):
+    live = client.get('/health/live').get_json()
+    assert live['status'] == 'alive'
+    assert {name: len(version) for name, version in live['models'].items()} == {'fertilizer': 12, 'crop': 12}
+
+    res = client.get('/health/ready')
+    assert res.status_code == 200 and res.get_json()['status'] == 'ready'
+    assert res.get_json()['models']['crop']['version'] == live['models']['crop']
+
+    monkeypatch.setitem(app._load_state, 'crop', 'loading')
+    res = client.get('/health/ready')
+    assert res.status_code == 503 and res.get_json()['status'] == 'starting'
+    # Alive all the same, so an orchestrator doesn't restart a loading worker
+    assert client.get('/health/live').status_code == 200
+    assert client.get('/health').get_json()['ready'] is False
+
+    monkeypatch.setitem(app._load_state, 'crop', 'failed')
+    assert client.get('/health/ready').get_json()['status'] == 'unavailable'
@@ -3,9 +3,11 @@ import numpy as np
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-import joblib
 import os
 
+from feature_codec import CROP_FIELDS
+from model_bundle import bundle_path, write_bundle
+
 print("Loading dataset...")
 data_path = "Crop_recommendation.csv"
 if not os.path.exists(data_path):
@@ -16,8 +18,8 @@ df = pd.read_csv(data_path)
 print(f"Loaded {len(df)} rows.")
 
 # Features and target
-# Dataset features: N, P, K, temperature, humidity, ph, rainfall
-X = df[['N', 'P', 'K', 'temperature', 'humidity', 'ph', 'rainfall']]
+# Dataset features: N, P, K, temperature, humidity, ph, rainfall (same order the service encodes)
+X = df[[f.column for f in CROP_FIELDS]]
 y = df['label']
 
 print("Encoding target labels...")
@@ -42,9 +44,9 @@ model.fit(X_train, y_train)
 accuracy = model.score(X_test, y_test)
 print(f"Model trained successfully. Accuracy on test set: {accuracy*100:.2f}%")
 
-print("Saving model and encoders...")
+print("Saving model bundle...")
 os.makedirs('models', exist_ok=True)
-joblib.dump(model, 'models/crop_model.pkl')
-joblib.dump(label_encoder, 'models/crop_label_encoder.pkl')
+manifest = write_bundle(bundle_path('models', 'crop'), 'crop', model,
+                        [f.name for f in CROP_FIELDS], label_encoder.classes_)
 
-print("Done! Model artifacts saved to ml-service/models/")
+print(f"Done! Model bundle (version {manifest['version']}) saved to ml-service/models/crop.bundle/")
@@ -4,9 +4,11 @@ from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import StratifiedKFold, cross_val_score
 from sklearn.metrics import log_loss
 import xgboost as xgb
-import joblib
 import os
 
+from feature_codec import FERTILIZER_FIELDS, FeatureCodec
+from model_bundle import bundle_path, write_bundle
+
 """
 Fertilizer Recommendation Model
 Trained from: smart-fertilizer-ranker-map-3-xgboost (Kaggle)
@@ -143,49 +145,40 @@ def load_data():
     return df
 
 
-def train_model():
-    print("=" * 60)
-    print("  Fertilizer Recommendation Model Training")
-    print("=" * 60)
-
-    # ── Load data ─────────────────────────────────────────────────
-    df = load_data()
-
-    # ── Feature Engineering ───────────────────────────────────────
+def encode_dataset(df, verbose=True):
+    """Fit the encoders on `df`; returns (X, y, codec, label_encoders, target_le)."""
     categorical_features = ['Soil Type', 'Crop Type']
     target_variable = 'Fertilizer Name'
 
     label_encoders = {}
     for col in categorical_features:
         le = LabelEncoder()
-        df[col + '_Encoded'] = le.fit_transform(df[col])
+        le.fit(df[col])
         label_encoders[col] = le
-        print(f"\n{col} encoding:")
-        for val, code in zip(le.classes_, le.transform(le.classes_)):
-            print(f"  {val} → {code}")
+        if verbose:
+            print(f"\n{col} encoding:")
+            for val, code in zip(le.classes_, le.transform(le.classes_)):
+                print(f"  {val} → {code}")
 
     target_le = LabelEncoder()
-    df['Fertilizer_Encoded'] = target_le.fit_transform(df[target_variable])
-    print(f"\nFertilizer classes ({len(target_le.classes_)}):")
-    for val, code in zip(target_le.classes_, target_le.transform(target_le.classes_)):
-        print(f"  {code} → {val}")
+    y = target_le.fit_transform(df[target_variable])
+    if verbose:
+        print(f"\nFertilizer classes ({len(target_le.classes_)}):")
+        for val, code in zip(target_le.classes_, target_le.transform(target_le.classes_)):
+            print(f"  {code} → {val}")
 
     # ── Prepare features ──────────────────────────────────────────
-    feature_columns = [
-        'Temparature', 'Humidity', 'Moisture',
-        'Nitrogen', 'Potassium', 'Phosphorous',
-        'Soil Type_Encoded', 'Crop Type_Encoded'
-    ]
-
-    X = df[feature_columns].values
-    y = df['Fertilizer_Encoded'].values
-    n_classes = len(target_le.classes_)
+    # The service encodes requests with the same codec, so the two cannot drift
+    feature_columns = [f.name for f in FERTILIZER_FIELDS]
+    codec = FeatureCodec.from_encoders(FERTILIZER_FIELDS, feature_columns, label_encoders, target_le)
+
+    X = codec.encode_columns(df)
+    return X, y, codec, label_encoders, target_le
 
-    print(f"\nFeatures: {feature_columns}")
-    print(f"Samples: {len(X)}, Classes: {n_classes}")
 
-    # ── XGBoost with best params from Kaggle notebook ─────────────
-    best_params = {
+def xgb_params(n_classes):
+    """XGBoost with best params from the Kaggle notebook."""
+    return {
         'max_depth': 7,
         'learning_rate': 0.05635134330984224,
         'subsample': 0.5605235929333594,
@@ -204,6 +197,25 @@ def train_model():
         'random_state': 42,
     }
 
+
+def train_model():
+    print("=" * 60)
+    print("  Fertilizer Recommendation Model Training")
+    print("=" * 60)
+
+    # ── Load data ─────────────────────────────────────────────────
+    df = load_data()
+
+    # ── Feature Engineering ───────────────────────────────────────
+    X, y, codec, label_encoders, target_le = encode_dataset(df)
+    feature_columns = codec.feature_names
+    n_classes = len(target_le.classes_)
+
+    print(f"\nFeatures: {feature_columns}")
+    print(f"Samples: {len(X)}, Classes: {n_classes}")
+
+    best_params = xgb_params(n_classes)
+
     # ── 5-fold stratified cross-validation ────────────────────────
     skf = StratifiedKFold(n_splits=min(5, len(np.unique(y))), shuffle=True, random_state=42)
     fold_losses = []
@@ -236,39 +248,26 @@ def train_model():
     models_dir = os.path.join(os.path.dirname(__file__), 'models')
     os.makedirs(models_dir, exist_ok=True)
 
-    model_path = os.path.join(models_dir, 'fertilizer_model.pkl')
-    encoders_path = os.path.join(models_dir, 'label_encoders.pkl')
-    target_encoder_path = os.path.join(models_dir, 'target_encoder.pkl')
-    feature_names_path = os.path.join(models_dir, 'feature_names.pkl')
+    path = bundle_path(models_dir, 'fertilizer')
+    manifest = write_bundle(path, 'fertilizer', final_model, feature_columns, target_le.classes_,
+                            {col: le.classes_ for col, le in label_encoders.items()})
 
-    joblib.dump(final_model, model_path)
-    joblib.dump(label_encoders, encoders_path)
-    joblib.dump(target_le, target_encoder_path)
-    joblib.dump(feature_columns, feature_names_path)
-
-    print(f"\n✅ Model saved to:         {model_path}")
-    print(f"✅ Label encoders saved to: {encoders_path}")
-    print(f"✅ Target encoder saved to: {target_encoder_path}")
-    print(f"✅ Feature names saved to:  {feature_names_path}")
+    print(f"\n✅ Model bundle saved to: {path} (version {manifest['version']})")
 
     # ── Quick sanity check ────────────────────────────────────────
     print("\n--- Sanity check: sample prediction ---")
     sample = {
-        'Temparature': 30, 'Humidity': 60, 'Moisture': 50,
-        'Nitrogen': 37, 'Potassium': 0, 'Phosphorous': 0,
-        'Soil Type': 'Sandy', 'Crop Type': 'Maize'
+        'temperature': 30, 'humidity': 60, 'moisture': 50,
+        'nitrogen': 37, 'potassium': 0, 'phosphorous': 0,
+        'soilType': 'Sandy', 'cropType': 'Maize'
     }
-    sample_df = pd.DataFrame([sample])
-    for col in categorical_features:
-        le = label_encoders[col]
-        sample_df[col + '_Encoded'] = le.transform([sample[col]])
-    X_sample = sample_df[feature_columns].values
+    X_sample = codec.encode(sample)
     proba = final_model.predict_proba(X_sample)[0]
     top3_idx = np.argsort(proba)[::-1][:3]
     print(f"Input: Sandy soil, Maize crop, N=37, P=0, K=0, Temp=30°C")
     print("Top-3 Fertilizer Recommendations:")
     for rank, idx in enumerate(top3_idx):
-        print(f"  {rank+1}. {target_le.inverse_transform([idx])[0]} ({proba[idx]*100:.1f}%)")
+        print(f"  {rank+1}. {codec.decode(idx)} ({proba[idx]*100:.1f}%)")
 
     print("\nTraining complete!")
     return final_model, label_encoders, target_le
@@ -0,0 +1,210 @@
+"""
+Array-backed evaluator for XGBoost multi:softprob tree ensembles.
+
+`compile_model_json` flattens every tree of a saved XGBoost model (the JSON
+from `Booster.save_raw('json')`) into a handful of NumPy arrays:
+
+  feature[i]       split feature of node i
+  threshold[i]     split threshold (go left when x < threshold); NaN on leaves
+  left[i]          global index of the left child; the right child is left[i] + 1
+  default_left[i]  direction taken when x is missing (NaN)
+  value[i]         leaf value (0 on split nodes)
+  roots[t]         first node of tree t
+  tree_class[t]    output class tree t contributes to
+  active[d]        number of trees deeper than d (trees are sorted deepest first)
+
+Leaves point back at themselves (left = i - 1 and a NaN threshold, so they
+always "go right" to i), which lets the evaluator advance every (row, tree)
+pair one level per step with plain fancy indexing; at level d only the first
+active[d] trees still need stepping. Single-leaf trees don't depend on the
+input at all and are folded into the per-class base margin.
+
+Nothing here imports xgboost: a compiled ensemble saved with `save()` can be
+loaded and scored on a machine without it.
+"""
+import json
+
+import numpy as np
+
+# Rows scored per evaluation step; keeps the (rows × trees) working set cache-sized
+CHUNK_ROWS = 64
+
+
+class TreeEnsemble:
+    """Flat-array tree ensemble with a vectorized predict_proba."""
+
+    ARRAYS = ('feature', 'threshold', 'left', 'default_left', 'value', 'roots',
+              'tree_class', 'active', 'base_margin')
+
+    def __init__(self, feature, threshold, left, default_left, value, roots,
+                 tree_class, active, base_margin, n_features):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.tree_class = np.asarray(tree_class, dtype=np.int32)
+        self.active = np.asarray(active, dtype=np.int32)
+        self.base_margin = np.asarray(base_margin, dtype=np.float32)
+        self.n_features = int(n_features)
+        self.n_classes = len(self.base_margin)
+
+        # Sums leaf values per class with one matrix product
+        self._class_matrix = np.zeros((self.n_trees, self.n_classes), dtype=np.float32)
+        self._class_matrix[np.arange(self.n_trees), self.tree_class] = 1
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def max_depth(self):
+        return len(self.active)
+
+    def predict_margin(self, X: np.ndarray) -> np.ndarray:
+        """Raw per-class scores (before softmax) → (n, n_classes) float32."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'Expected a (n, {self.n_features}) matrix, got shape {X.shape}')
+        out = np.empty((len(X), self.n_classes), dtype=np.float32)
+        for start in range(0, len(X), CHUNK_ROWS):
+            chunk = X[start:start + CHUNK_ROWS]
+            out[start:start + len(chunk)] = self._margin_chunk(chunk)
+        return out
+
+    def _margin_chunk(self, X):
+        n = len(X)
+        flat = X.ravel()
+        row_offset = (np.arange(n, dtype=np.intp) * self.n_features)[:, None]
+        has_missing = bool(np.isnan(flat).any())
+
+        # np.take is markedly faster than fancy indexing for these gathers
+        node = np.tile(self.roots, (n, 1))
+        for k in self.active:
+            step = node[:, :k]
+            x = np.take(flat, row_offset + np.take(self.feature, step))
+            go_right = ~(x < np.take(self.threshold, step))
+            if has_missing:
+                go_right = np.where(np.isnan(x), ~np.take(self.default_left, step), go_right)
+            node[:, :k] = np.take(self.left, step) + go_right
+
+        return np.take(self.value, node) @ self._class_matrix + self.base_margin
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Softmax class probabilities → (n, n_classes) float32."""
+        margin = self.predict_margin(X)
+        margin -= margin.max(axis=1, keepdims=True)
+        np.exp(margin, out=margin)
+        margin /= margin.sum(axis=1, keepdims=True)
+        return margin
+
+    def save(self, path):
+        """Write the compiled arrays to an .npz file."""
+        np.savez(path, n_features=self.n_features,
+                 **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.ARRAYS},
+                       n_features=int(data['n_features']))
+
+
+def _parse_base_score(raw, n_classes):
+    """base_score is a scalar ('5E-1') in older models and a per-class vector in newer ones."""
+    values = json.loads(raw) if raw.startswith('[') else [float(raw)]
+    return np.broadcast_to(np.asarray(values, dtype=np.float32), (n_classes,)).copy()
+
+
+def compile_model_json(model_json, n_rounds: int = None) -> TreeEnsemble:
+    """Compile a saved XGBoost multi:softprob model (JSON bytes/str/dict).
+
+    `n_rounds` keeps only the first boosting rounds, like predicting with
+    `iteration_range=(0, n_rounds)`.
+    """
+    model = json.loads(model_json) if isinstance(model_json, (bytes, bytearray, str)) else model_json
+    learner = model['learner']
+    objective = learner['objective']['name']
+    if objective != 'multi:softprob':
+        raise ValueError(f'Only multi:softprob models can be compiled, got {objective!r}')
+    booster = learner['gradient_booster']
+    if booster['name'] != 'gbtree':
+        raise ValueError(f'Only gbtree boosters can be compiled, got {booster["name"]!r}')
+
+    params = learner['learner_model_param']
+    n_classes = int(params['num_class'])
+    n_features = int(params['num_feature'])
+    trees = booster['model']['trees']
+    tree_info = booster['model']['tree_info']
+    if n_rounds is not None:
+        n_trees = booster['model']['iteration_indptr'][n_rounds]
+        trees, tree_info = trees[:n_trees], tree_info[:n_trees]
+
+    base_margin = _parse_base_score(params['base_score'], n_classes)
+    # (depth, tree, class) for every tree that actually splits
+    split_trees = []
+    for tree, cls in zip(trees, tree_info):
+        if any(tree['split_type']):
+            raise ValueError('Categorical splits are not supported')
+        if tree['left_children'][0] == -1:
+            base_margin[cls] += tree['split_conditions'][0]
+        else:
+            split_trees.append((_depth(tree), tree, cls))
+    split_trees.sort(key=lambda t: -t[0])
+
+    feature, threshold, left, default_left, value, roots = [], [], [], [], [], []
+    for _, tree, _ in split_trees:
+        base = len(feature)
+        roots.append(base)
+        # Re-lay the tree breadth-first so each node's children are adjacent
+        order, slot = [0], {0: 0}
+        for node in order:
+            lc = tree['left_children'][node]
+            if lc != -1:
+                for child in (lc, tree['right_children'][node]):
+                    slot[child] = len(order)
+                    order.append(child)
+
+        for i, node in enumerate(order):
+            lc = tree['left_children'][node]
+            if lc == -1:
+                feature.append(0)
+                threshold.append(np.nan)
+                left.append(base + i - 1)
+                default_left.append(False)
+                value.append(tree['split_conditions'][node])
+            else:
+                feature.append(tree['split_indices'][node])
+                threshold.append(tree['split_conditions'][node])
+                left.append(base + slot[lc])
+                default_left.append(bool(tree['default_left'][node]))
+                value.append(0.0)
+
+    depths = [depth for depth, _, _ in split_trees]
+    max_depth = depths[0] if depths else 0
+    return TreeEnsemble(
+        feature=feature, threshold=threshold, left=left, default_left=default_left,
+        value=value, roots=roots, tree_class=[cls for _, _, cls in split_trees],
+        active=[sum(depth > d for depth in depths) for d in range(max_depth)],
+        base_margin=base_margin, n_features=n_features,
+    )
+
+
+def _depth(tree):
+    """Number of split levels on the longest root-to-leaf path."""
+    depth, level = 0, [0]
+    while True:
+        level = [c for n in level for c in (tree['left_children'][n], tree['right_children'][n]) if c != -1]
+        if not level:
+            return depth
+        depth += 1
+
+
+def compile_booster(booster, n_rounds: int = None) -> TreeEnsemble:
+    """Compile an in-memory xgboost.Booster."""
+    return compile_model_json(booster.save_raw('json'), n_rounds=n_rounds)
@@ -0,0 +1,49 @@
+"""
+Synthetic inputs and page touching for warming a model up before it serves.
+
+The first calls into a freshly loaded model are slow for reasons that have
+nothing to do with the request: XGBoost allocates its prediction buffers
+and starts its thread pool, NumPy's kernels for each batch shape run for the
+first time, and memory-mapped arrays (the numpy backend's trees, the
+fertilizer table) fault their pages in from disk. app.warm() runs each
+model through its scoring paths with these inputs before the model is
+installed, so the service reports ready only once those costs are paid.
+
+Configured in app.py with ML_WARMUP (0 keeps only a single-row warm-up).
+"""
+import numpy as np
+
+# Batch sizes run through each model (power-of-two buckets of the batch routes)
+WARMUP_BATCHES = (1, 8, 64, 512)
+PAGE_BYTES = 4096
+
+
+def synthetic_rows(codec, n: int, seed: int = 0) -> np.ndarray:
+    """(n, n_features) float32 rows around the codec's defaults.
+
+    Numeric features vary between half and one and a half times their
+    default, categorical features over all their codes.
+    """
+    rng = np.random.default_rng(seed)
+    defaults = codec.encode({})[0]
+    X = np.empty((n, codec.n_features), dtype=np.float32)
+    for i, f in enumerate(codec.fields):
+        values = codec.categories.get(f.column)
+        if values is not None:
+            X[:, i] = rng.integers(0, len(values), n)
+        else:
+            X[:, i] = np.round(defaults[i] * rng.uniform(0.5, 1.5, n))
+    return X
+
+
+def touch_pages(*arrays) -> int:
+    """Read one byte per page of each array so a memory-mapped file is paged
+    in now rather than on a request. Returns the bytes covered."""
+    covered = 0
+    for array in arrays:
+        if array is None or not array.size:
+            continue
+        flat = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+        int(flat[::PAGE_BYTES].sum())
+        covered += flat.nbytes
+    return covered